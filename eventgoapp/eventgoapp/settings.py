@@ -119,6 +119,16 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
+# Giới hạn số email mỗi giây theo từng SMTP host (mỗi process); 0 là không giới hạn
+EMAIL_RATE_LIMIT_PER_SECOND = float(os.getenv('EMAIL_RATE_LIMIT_PER_SECOND', '0'))
+EMAIL_RATE_LIMITS = {
+    'smtp.gmail.com': float(os.getenv('EMAIL_GMAIL_RATE_LIMIT_PER_SECOND', '10')),
+}
+EMAIL_SEND_MAX_RETRIES = int(os.getenv('EMAIL_SEND_MAX_RETRIES', '3'))
+EMAIL_RETRY_BACKOFF_SECONDS = float(os.getenv('EMAIL_RETRY_BACKOFF_SECONDS', '2'))
+# Số người nhận trong mỗi tác vụ gửi email hàng loạt
+MAIL_FANOUT_CHUNK_SIZE = int(os.getenv('MAIL_FANOUT_CHUNK_SIZE', '500'))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': ['oauth2_provider.contrib.rest_framework.OAuth2Authentication']
 }
@@ -177,6 +187,8 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
         'PORT': os.getenv('DB_PORT', '3306'),
+        # Tên DB khi chạy test; với SQLite đặt một file để các test nhiều luồng (giữ chỗ vé đồng thời) chạy được
+        'TEST': {'NAME': os.getenv('DB_TEST_NAME') or None},
     }
 }
 
@@ -237,6 +249,96 @@ CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+CELERY_BEAT_SCHEDULE = {
+    'release-expired-orders': {
+        'task': 'events.tasks.release_expired_orders',
+        'schedule': float(os.getenv('ORDER_SWEEP_INTERVAL_SECONDS', '60')),
+    },
+    'sync-event-statuses': {
+        'task': 'events.tasks.sync_event_statuses',
+        'schedule': float(os.getenv('EVENT_STATUS_SYNC_INTERVAL_SECONDS', '60')),
+    },
+    'flush-trend-counters': {
+        'task': 'events.tasks.flush_trend_counters',
+        'schedule': float(os.getenv('TREND_FLUSH_INTERVAL_SECONDS', '30')),
+    },
+    'roll-up-engagement': {
+        'task': 'events.tasks.roll_up_engagement',
+        'schedule': 3600.0,
+    },
+    'refresh-recommendation-model': {
+        'task': 'events.tasks.refresh_recommendation_model',
+        'schedule': float(os.getenv('RECOMMENDATION_REFRESH_INTERVAL_SECONDS', '300')),
+    },
+    'ensure-trending-boards': {
+        'task': 'events.tasks.ensure_trending_boards',
+        'schedule': 3600.0,
+    },
+    'precompute-recommendations': {
+        'task': 'events.tasks.precompute_recommendations',
+        'schedule': float(os.getenv('RECOMMENDATION_PRECOMPUTE_INTERVAL_SECONDS', '3600')),
+    },
+    'ensure-suggestion-index': {
+        'task': 'events.tasks.ensure_suggestion_index',
+        'schedule': 3600.0,
+    },
+}
+
+# Số đơn hết hạn xử lý trong mỗi lô của tác vụ nhả vé
+ORDER_SWEEP_BATCH_SIZE = int(os.getenv('ORDER_SWEEP_BATCH_SIZE', '500'))
+
+# Địa chỉ công khai của backend, dùng để tạo link tuyệt đối trong email gửi từ Celery
+BACKEND_BASE_URL = os.getenv('BACKEND_BASE_URL', 'http://localhost:8000')
+
+# Số người nhận trong mỗi lô khi tạo thông báo hàng loạt (mỗi lô là một subtask Celery)
+NOTIFICATION_FANOUT_CHUNK_SIZE = int(os.getenv('NOTIFICATION_FANOUT_CHUNK_SIZE', '1000'))
+
+# Expo push notification
+EXPO_PUSH_SEND_URL = os.getenv('EXPO_PUSH_SEND_URL', 'https://exp.host/--/api/v2/push/send')
+EXPO_PUSH_RECEIPTS_URL = os.getenv('EXPO_PUSH_RECEIPTS_URL', 'https://exp.host/--/api/v2/push/getReceipts')
+EXPO_ACCESS_TOKEN = os.getenv('EXPO_ACCESS_TOKEN', '')
+# Số lô (100 thông báo) gửi song song tới Expo
+EXPO_PUSH_CONCURRENCY = int(os.getenv('EXPO_PUSH_CONCURRENCY', '6'))
+EXPO_PUSH_TIMEOUT_SECONDS = float(os.getenv('EXPO_PUSH_TIMEOUT_SECONDS', '10'))
+EXPO_PUSH_MAX_RETRIES = int(os.getenv('EXPO_PUSH_MAX_RETRIES', '3'))
+EXPO_PUSH_RETRY_BACKOFF_SECONDS = float(os.getenv('EXPO_PUSH_RETRY_BACKOFF_SECONDS', '1'))
+# Expo khuyến nghị đợi khoảng 15 phút trước khi đọc receipt
+EXPO_RECEIPT_DELAY_SECONDS = int(os.getenv('EXPO_RECEIPT_DELAY_SECONDS', '900'))
+
+# Số ngày giữ dữ liệu tương tác theo giờ trước khi gộp thành theo ngày, và số ngày giữ dữ liệu theo ngày
+ENGAGEMENT_HOURLY_RETENTION_DAYS = int(os.getenv('ENGAGEMENT_HOURLY_RETENTION_DAYS', '7'))
+ENGAGEMENT_DAILY_RETENTION_DAYS = int(os.getenv('ENGAGEMENT_DAILY_RETENTION_DAYS', '400'))
+
+# Thời gian giữ ảnh QR của vé trong cache (giây)
+TICKET_QR_CACHE_TIMEOUT = int(os.getenv('TICKET_QR_CACHE_TIMEOUT', str(7 * 24 * 3600)))
+
+# Thời gian giữ hạng khách hàng trong cache (giây); cache bị xóa ngay khi khách có đơn mới được thanh toán
+LOYALTY_RANK_CACHE_TIMEOUT = int(os.getenv('LOYALTY_RANK_CACHE_TIMEOUT', '3600'))
+
+# Thời gian giữ response của các endpoint đọc công khai (giây); thay đổi dữ liệu làm mới cache ngay qua phiên bản,
+# riêng số vé còn lại (giữ chỗ/nhả vé) có thể chậm tối đa khoảng này
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '60'))
+
+# Chu kỳ bán rã của điểm xu hướng (giờ): lượt tương tác cũ hơn một chu kỳ chỉ còn nửa trọng số
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', '24'))
+
+# Tuổi tối đa của mô hình gợi ý trước khi dựng lại toàn bộ (giây); giữa các lần đó chỉ cập nhật sự kiện thay đổi
+RECOMMENDATION_MODEL_MAX_AGE_SECONDS = int(os.getenv('RECOMMENDATION_MODEL_MAX_AGE_SECONDS', str(6 * 3600)))
+# Số sự kiện tính sẵn cho mỗi người dùng và thời gian giữ danh sách trong cache (giây); nên dài hơn chu kỳ tính sẵn
+RECOMMENDATION_TOP_N = int(os.getenv('RECOMMENDATION_TOP_N', '10'))
+RECOMMENDATION_LIST_CACHE_TIMEOUT = int(os.getenv('RECOMMENDATION_LIST_CACHE_TIMEOUT', str(2 * 3600)))
+# Số người dùng mỗi lô (mỗi lô là một subtask Celery) và số process của lệnh precompute_recommendations
+# (0 = số CPU)
+RECOMMENDATION_PRECOMPUTE_WORKERS = int(os.getenv('RECOMMENDATION_PRECOMPUTE_WORKERS', '0'))
+RECOMMENDATION_PRECOMPUTE_CHUNK_SIZE = int(os.getenv('RECOMMENDATION_PRECOMPUTE_CHUNK_SIZE', '1000'))
+# Ưu tiên sự kiện gần người dùng có tọa độ: điểm tương đồng nhân (1 + WEIGHT x e^(-khoảng cách / SCALE_KM))
+RECOMMENDATION_DISTANCE_WEIGHT = float(os.getenv('RECOMMENDATION_DISTANCE_WEIGHT', '1.0'))
+RECOMMENDATION_DISTANCE_SCALE_KM = float(os.getenv('RECOMMENDATION_DISTANCE_SCALE_KM', '25'))
+
+# Số vị trí từ đầu tiên của mỗi tên được đánh chỉ mục gợi ý khi gõ ("nang" khớp "Đà Nẵng" khi >= 2);
+# bộ nhớ Redis của chỉ mục tăng tuyến tính theo giá trị này
+SUGGEST_MAX_WORDS = int(os.getenv('SUGGEST_MAX_WORDS', '3'))
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
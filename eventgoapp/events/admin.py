@@ -1,8 +1,7 @@
 from django.contrib import admin
-from django.db.models import Sum, Count
+from django.db.models import Sum
 from django.template.response import TemplateResponse
 from django.urls import path
-from django.db.models.functions import TruncMonth
 from django.utils.html import mark_safe
 from .models import *
 from django import forms
@@ -167,22 +166,27 @@ class MyAdminSite(admin.AdminSite):
             path('stats/', self.stats_view, name='stats'),
         ] + super().get_urls()
 
-    def stats_view(self, request):        # Số lượng vé bán ra theo sự kiện
-        tickets_sold = OrderDetail.objects.filter(
-            order__payment_status=Order.PaymentStatus.PAID
-        ).values('order__ticket__event__name').annotate(total=Count('id')).order_by('order__ticket__event__name')
+    def stats_view(self, request):        # Số lượng vé bán ra theo sự kiện (đọc từ bảng tổng hợp doanh số)
+        tickets_sold = EventSalesDaily.objects.values('event__name').annotate(total=Sum('tickets_sold')) \
+            .filter(total__gt=0).order_by('event__name')
 
-        tickets_sold_labels = [item['order__ticket__event__name'] for item in tickets_sold]
+        tickets_sold_labels = [item['event__name'] for item in tickets_sold]
         tickets_sold_data = [item['total'] for item in tickets_sold]
 
         # Doanh thu theo tháng
-        monthly_revenue = Order.objects.filter(
-            payment_status=Order.PaymentStatus.PAID
-        ).annotate(month=TruncMonth('created_at')).values('month').annotate(total=Sum('total_amount')).order_by('month')
+        monthly_revenue = OrganizerSalesMonthly.objects.values('month') \
+            .annotate(total=Sum('revenue'), paid=Sum('paid_orders')).filter(paid__gt=0).order_by('month')
 
         revenue_labels = [item['month'].strftime('%Y-%m') for item in monthly_revenue]
         revenue_data = [float(item['total']) for item in monthly_revenue]
 
+        # Doanh thu theo danh mục
+        category_revenue = CategorySalesMonthly.objects.values('category__name') \
+            .annotate(total=Sum('revenue')).filter(total__gt=0).order_by('category__name')
+
+        category_labels = [item['category__name'] for item in category_revenue]
+        category_data = [float(item['total']) for item in category_revenue]
+
         # Mức độ quan tâm (dựa trên views từ EventTrend)
         engagement = EventTrend.objects.values('event__name').annotate(total=Sum('views')).order_by('event__name')
 
@@ -196,6 +200,8 @@ class MyAdminSite(admin.AdminSite):
             'revenue_data': revenue_data,
             'engagement_labels': engagement_labels,
             'engagement_data': engagement_data,
+            'category_labels': category_labels,
+            'category_data': category_data,
         })
 
 # Khởi tạo AdminSite tùy chỉnh
@@ -211,3 +217,8 @@ admin_site.register(Review)
 admin_site.register(Notification)
 admin_site.register(Discount)
 admin_site.register(EventTrend)
+admin_site.register(EventEngagement)
+admin_site.register(EventSalesDaily)
+admin_site.register(OrganizerSalesMonthly)
+admin_site.register(CategorySalesMonthly)
+admin_site.register(CustomerLoyalty)
@@ -0,0 +1,73 @@
+import logging
+
+from django.db.models import F, Count, Sum, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import User, Event, Review
+
+logger = logging.getLogger(__name__)
+
+
+def apply_review_change(old, new):
+    """
+    Cập nhật review_count / rating_total của sự kiện khi một đánh giá được tạo, sửa hoặc xóa.
+
+    Args:
+        old, new: (event_id, active, rating) của đánh giá trước và sau khi ghi, None nếu không tồn tại.
+    """
+    deltas = {}
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        event_id, active, rating = state
+        if not active:
+            continue
+        count, total = deltas.get(event_id, (0, 0))
+        deltas[event_id] = (count + sign, total + sign * rating)
+
+    for event_id, (count, total) in deltas.items():
+        if count or total:
+            Event.objects.filter(id=event_id).update(
+                review_count=F('review_count') + count,
+                rating_total=F('rating_total') + total
+            )
+
+
+def apply_event_change(old, new):
+    """
+    Cập nhật số sự kiện đang hoạt động của nhà tổ chức khi sự kiện được tạo, xóa,
+    ẩn/hiện hoặc chuyển sang nhà tổ chức khác.
+
+    Args:
+        old, new: (organizer_id, active) của sự kiện trước và sau khi ghi, None nếu không tồn tại.
+    """
+    deltas = {}
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        organizer_id, active = state
+        if active and organizer_id:
+            deltas[organizer_id] = deltas.get(organizer_id, 0) + sign
+
+    for organizer_id, delta in deltas.items():
+        if delta:
+            User.objects.filter(id=organizer_id).update(organized_event_count=F('organized_event_count') + delta)
+
+
+def rebuild_event_aggregates():
+    """Tính lại toàn bộ cột tổng hợp từ dữ liệu gốc (sau khi ghi hàng loạt bằng queryset bỏ qua save())."""
+    review_stats = Review.objects.filter(event=OuterRef('pk'), active=True).order_by() \
+        .values('event').annotate(count=Count('id'), total=Sum('rating'))
+    events = Event.objects.update(
+        review_count=Coalesce(Subquery(review_stats.values('count')), Value(0)),
+        rating_total=Coalesce(Subquery(review_stats.values('total')), Value(0))
+    )
+
+    event_counts = Event.objects.filter(organizer=OuterRef('pk'), active=True).order_by() \
+        .values('organizer').annotate(count=Count('id'))
+    users = User.objects.update(
+        organized_event_count=Coalesce(Subquery(event_counts.values('count')), Value(0))
+    )
+
+    logger.info(f"Đã tính lại tổng hợp cho {events} sự kiện và {users} người dùng")
+    return {'events': events, 'users': users}
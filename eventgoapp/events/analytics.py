@@ -0,0 +1,239 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Sum, Count
+
+from . import engagement, trend_counters
+from .models import Order, TicketType, Review, EventTrend, EventSalesDaily
+
+logger = logging.getLogger(__name__)
+
+SALES_METRICS = ('paid_orders', 'failed_orders', 'tickets_sold', 'revenue', 'purchase_seconds')
+RATINGS = ('5', '4', '3', '2', '1')
+
+
+def _sales(event_ids):
+    """
+    Doanh số theo sự kiện và theo loại vé, đọc từ bảng tổng hợp EventSalesDaily (O(số dòng tổng hợp))
+    thay vì gộp lại toàn bộ Order/OrderDetail.
+
+    Returns:
+        ({event_id: tổng các chỉ số}, {ticket_id: số vé đã bán})
+    """
+    rows = EventSalesDaily.objects.filter(event_id__in=event_ids).order_by().values('event_id', 'ticket_id') \
+        .annotate(**{metric: Sum(metric) for metric in SALES_METRICS})
+
+    sales = defaultdict(lambda: dict.fromkeys(SALES_METRICS, 0))
+    sold_by_ticket = {}
+    for row in rows:
+        for metric in SALES_METRICS:
+            sales[row['event_id']][metric] += row[metric]
+        sold_by_ticket[row['ticket_id']] = row['tickets_sold']
+    return sales, sold_by_ticket
+
+
+def _pending_orders(event_ids):
+    """Số đơn PENDING (chưa có trong bảng tổng hợp); chỉ là các đơn còn trong 15 phút giữ chỗ."""
+    rows = Order.objects.filter(
+        payment_status=Order.PaymentStatus.PENDING, ticket__event_id__in=event_ids
+    ).order_by().values('ticket__event_id').annotate(count=Count('id'))
+    return {row['ticket__event_id']: row['count'] for row in rows}
+
+
+def _attendees(events):
+    """
+    Số người mua và số người mua quay lại (đã thanh toán vé một sự kiện khác của cùng nhà tổ chức)
+    của mỗi sự kiện: một truy vấn DISTINCT (nhà tổ chức, sự kiện, người mua) rồi đếm trong Python.
+
+    Returns:
+        ({event_id: số người mua}, {event_id: số người mua quay lại})
+    """
+    organizer_ids = {event.organizer_id for event in events}
+    rows = Order.objects.filter(
+        payment_status=Order.PaymentStatus.PAID, ticket__event__organizer_id__in=organizer_ids
+    ).order_by().values_list('ticket__event__organizer_id', 'ticket__event_id', 'user_id').distinct()
+
+    events_by_buyer = defaultdict(set)
+    for organizer_id, event_id, user_id in rows:
+        events_by_buyer[(organizer_id, user_id)].add(event_id)
+
+    total = defaultdict(int)
+    repeat = defaultdict(int)
+    for bought in events_by_buyer.values():
+        for event_id in bought:
+            total[event_id] += 1
+            if len(bought) > 1:
+                repeat[event_id] += 1
+    return total, repeat
+
+
+def _rating_counts(event_ids):
+    """Số đánh giá theo sự kiện và số sao: một truy vấn GROUP BY sự kiện, số sao."""
+    counts = defaultdict(dict)
+    rows = Review.objects.filter(event_id__in=event_ids).order_by().values('event_id', 'rating') \
+        .annotate(count=Count('id'))
+    for row in rows:
+        counts[row['event_id']][row['rating']] = row['count']
+    return counts
+
+
+def _tickets_by_event(event_ids):
+    tickets = defaultdict(list)
+    for ticket in TicketType.objects.filter(event_id__in=event_ids):
+        tickets[ticket.event_id].append(ticket)
+    return tickets
+
+
+def _trends(event_ids):
+    return {
+        trend['event_id']: trend
+        for trend in EventTrend.objects.filter(event_id__in=event_ids).values('event_id', 'views', 'interest_level')
+    }
+
+
+def event_analytics(events):
+    """
+    Báo cáo phân tích của nhiều sự kiện, mỗi chỉ số là một truy vấn gộp cho cả danh sách
+    thay vì một truy vấn cho mỗi sự kiện/loại vé/số sao.
+
+    Returns:
+        {event_id: dict báo cáo} theo đúng định dạng của endpoint /events/{id}/analytics/.
+    """
+    event_ids = [event.id for event in events]
+    sales, sold_by_ticket = _sales(event_ids)
+    pending_orders = _pending_orders(event_ids)
+    total_attendees, repeat_attendees = _attendees(events)
+    ratings_by_event = _rating_counts(event_ids)
+    tickets_by_event = _tickets_by_event(event_ids)
+    trends = _trends(event_ids)
+    pending = trend_counters.pending_counts_many(event_ids)
+    series = engagement.daily_series_many(event_ids, days=7, pending=pending)
+
+    results = {}
+    for event in events:
+        stats = sales[event.id]
+
+        tickets_breakdown = []
+        tickets_sold = 0
+        for ticket in tickets_by_event.get(event.id, []):
+            sold_count = sold_by_ticket.get(ticket.id, 0)
+            tickets_sold += sold_count
+            tickets_breakdown.append({
+                'ticket_id': ticket.id,
+                'ticket_type': ticket.type,
+                'ticket_price': ticket.price,
+                'quantity_sold': sold_count,
+                'revenue': ticket.price * sold_count
+            })
+
+        total_orders = stats['paid_orders'] + stats['failed_orders'] + pending_orders.get(event.id, 0)
+        cancellation_rate = (stats['failed_orders'] / total_orders * 100) if total_orders > 0 else 0
+        avg_purchase_time_minutes = stats['purchase_seconds'] / stats['paid_orders'] / 60 \
+            if stats['paid_orders'] > 0 else 0
+        attendees = total_attendees.get(event.id, 0)
+        repeat_attendee_rate = (repeat_attendees.get(event.id, 0) / attendees * 100) if attendees > 0 else 0
+
+        trend = trends.get(event.id, {})
+        pending_trend = pending[event.id]
+        event_views = trend.get('views', 0) + pending_trend['views']
+        event_interest_score = trend.get('interest_level', 0) + pending_trend['interest']
+        conversion_rate = (tickets_sold / event_views * 100) if event_views > 0 else 0
+
+        views_by_day = [
+            {
+                'date': day['date'].strftime('%Y-%m-%d'),
+                'count': day['views'],
+                'orders': day['orders'],
+                'conversion_rate': round(day['orders'] / day['views'] * 100, 2) if day['views'] > 0 else 0,
+            }
+            for day in series[event.id]
+        ]
+
+        rating_counts = ratings_by_event.get(event.id, {})
+        review_count = sum(rating_counts.values())
+        average_rating = sum(rating * count for rating, count in rating_counts.items()) / review_count \
+            if review_count > 0 else 0
+
+        result = {
+            "event_id": event.id,
+            "event_name": event.name,
+            "event_start_date": event.date,
+            "event_end_date": event.date + timedelta(hours=3),
+            "total_revenue": stats['revenue'] if stats['paid_orders'] > 0 else 0,
+            "tickets_sold": tickets_sold,
+            "average_rating": round(average_rating, 1),
+            "cancellation_rate": round(cancellation_rate, 2),
+            "avg_purchase_time_minutes": round(avg_purchase_time_minutes, 2),
+            "repeat_attendee_rate": round(repeat_attendee_rate, 2),
+            "event_views": event_views,
+            "event_interest_score": event_interest_score,
+            "conversion_rate": round(conversion_rate, 2),
+            "tickets_breakdown": tickets_breakdown,
+            "views_by_day": views_by_day,
+            "review_count": review_count,
+        }
+        result.update({
+            f'rating_{rating}_percent': (rating_counts.get(int(rating), 0) / review_count * 100) if review_count > 0 else 0
+            for rating in RATINGS
+        })
+        results[event.id] = result
+    return results
+
+
+def organizer_dashboard(events):
+    """Dashboard của nhà tổ chức: báo cáo đầy đủ của từng sự kiện, theo thứ tự của `events`."""
+    events = list(events)
+    results = event_analytics(events)
+    return [results[event.id] for event in events]
+
+
+def admin_dashboard(organizers, events):
+    """
+    Dashboard của quản trị viên: chỉ số gộp theo nhà tổ chức, tính từ một lần event_analytics cho
+    toàn bộ sự kiện thay vì gọi lại view phân tích cho từng sự kiện của từng nhà tổ chức.
+
+    Args:
+        organizers: các nhà tổ chức cần báo cáo (giữ nguyên thứ tự)
+        events: các sự kiện đang hoạt động của những nhà tổ chức đó
+    """
+    events = list(events)
+    results = event_analytics(events)
+    events_by_organizer = defaultdict(list)
+    for event in events:
+        events_by_organizer[event.organizer_id].append(results[event.id])
+
+    data = []
+    for organizer in organizers:
+        event_data = events_by_organizer.get(organizer.id)
+        if not event_data:
+            continue
+
+        ratings = [event["average_rating"] for event in event_data if event["average_rating"] > 0]
+        data.append({
+            "organizer_id": organizer.id,
+            "organizer_username": organizer.username,
+            "organizer_email": organizer.email,
+            "total_events": len(event_data),
+            "aggregated_total_revenue": sum(event["total_revenue"] for event in event_data),
+            "aggregated_total_tickets_sold": sum(event["tickets_sold"] for event in event_data),
+            "average_event_rating": round(sum(ratings) / len(ratings), 2) if ratings else 0,
+            "average_cancellation_rate": round(
+                sum(event["cancellation_rate"] for event in event_data) / len(event_data), 2
+            ),
+            "total_event_views": sum(event["event_views"] for event in event_data),
+            "total_event_interest_score": sum(event["event_interest_score"] for event in event_data),
+            "event_details": [
+                {
+                    "event_id": event["event_id"],
+                    "event_name": event["event_name"],
+                    "event_start_date": event["event_start_date"],
+                    "total_revenue": event["total_revenue"],
+                    "tickets_sold": event["tickets_sold"],
+                    "average_rating": event["average_rating"],
+                    "event_views": event["event_views"]
+                }
+                for event in event_data
+            ]
+        })
+    return data
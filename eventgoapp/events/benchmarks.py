@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+# Cache mặc định khi benchmark: trong bộ nhớ, các đường dẫn dùng Redis tự chuyển sang phương án SQL
+BENCH_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Lệnh benchmark chạy trên cơ sở dữ liệu test tạo mới (giống manage.py test) và hủy nó khi kết thúc,
+    nên dữ liệu giả không bao giờ được ghi vào cơ sở dữ liệu đang cấu hình.
+
+    Cache cũng được thay: mặc định là LocMemCache; với --redis-url là một Redis riêng, không được trùng
+    Redis cache đang cấu hình vì id của dữ liệu giả sẽ đè lên khóa cache của dữ liệu thật.
+    """
+    requires_redis = False
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument('--redis-url', required=self.requires_redis,
+                            help='Redis riêng cho benchmark (khác REDIS_CACHE_URL); mặc định dùng cache trong bộ nhớ')
+        return parser
+
+    def execute(self, *args, **options):
+        caches = BENCH_CACHES
+        redis_url = options.get('redis_url')
+        if redis_url:
+            if redis_url == settings.CACHES['default'].get('LOCATION'):
+                raise CommandError('--redis-url must not be the configured cache; use a separate Redis database')
+            caches = {'default': {
+                'BACKEND': 'django_redis.cache.RedisCache',
+                'LOCATION': redis_url,
+                'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+            }}
+
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS})
+        try:
+            with override_settings(CACHES=caches):
+                return super().execute(*args, **options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
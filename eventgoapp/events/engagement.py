@@ -0,0 +1,122 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum, Case, When, Value
+from django.db.models.functions import TruncDay, TruncDate
+from django.utils.timezone import localdate, localtime, make_aware
+
+from .models import EventEngagement
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('views', 'interest', 'orders', 'reviews')
+UPSERT_CHUNK_SIZE = 500
+
+
+def add_to_buckets(counts, period=EventEngagement.Period.HOUR):
+    """
+    Cộng dồn vào các bucket EventEngagement: tạo bucket còn thiếu bằng bulk_create(ignore_conflicts=True)
+    rồi tăng các chỉ số bằng một câu UPDATE F() + Case/When cho mỗi lô.
+
+    Args:
+        counts: {(event_id, bucket_start): {metric: n}}
+    """
+    keys = [key for key, bucket in counts.items() if any(bucket.values())]
+    EventEngagement.objects.bulk_create(
+        [EventEngagement(event_id=event_id, period=period, bucket_start=bucket_start)
+         for event_id, bucket_start in keys],
+        ignore_conflicts=True,
+        batch_size=UPSERT_CHUNK_SIZE
+    )
+
+    for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+        chunk = keys[start:start + UPSERT_CHUNK_SIZE]
+        match = Q()
+        for event_id, bucket_start in chunk:
+            match |= Q(event_id=event_id, bucket_start=bucket_start)
+
+        updates = {}
+        for metric in METRICS:
+            whens = [
+                When(event_id=event_id, bucket_start=bucket_start, then=Value(counts[(event_id, bucket_start)][metric]))
+                for event_id, bucket_start in chunk if counts[(event_id, bucket_start)].get(metric)
+            ]
+            if whens:
+                updates[metric] = F(metric) + Case(*whens, default=Value(0))
+        EventEngagement.objects.filter(match, period=period).update(**updates)
+    return len(keys)
+
+
+def roll_up_engagement():
+    """
+    Gộp bucket giờ cũ hơn ENGAGEMENT_HOURLY_RETENTION_DAYS thành bucket ngày rồi xóa chúng,
+    và xóa bucket ngày cũ hơn ENGAGEMENT_DAILY_RETENTION_DAYS.
+
+    Returns:
+        dict thống kê: số bucket giờ đã gộp, số bucket ngày được cập nhật, số bucket ngày đã xóa.
+    """
+    today = make_aware(datetime.combine(localdate(), time.min))
+    hourly_cutoff = today - timedelta(days=settings.ENGAGEMENT_HOURLY_RETENTION_DAYS)
+    daily_cutoff = today - timedelta(days=settings.ENGAGEMENT_DAILY_RETENTION_DAYS)
+
+    with transaction.atomic():
+        old_hours = EventEngagement.objects.filter(
+            period=EventEngagement.Period.HOUR, bucket_start__lt=hourly_cutoff
+        )
+        daily = old_hours.order_by().annotate(day=TruncDay('bucket_start')) \
+            .values('event_id', 'day').annotate(**{metric: Sum(metric) for metric in METRICS})
+        days = add_to_buckets(
+            {(row['event_id'], row['day']): {metric: row[metric] for metric in METRICS} for row in daily},
+            period=EventEngagement.Period.DAY
+        )
+        hours, _ = old_hours.delete()
+
+    expired, _ = EventEngagement.objects.filter(
+        period=EventEngagement.Period.DAY, bucket_start__lt=daily_cutoff
+    ).delete()
+
+    stats = {'hours_rolled_up': hours, 'days_updated': days, 'days_expired': expired}
+    if hours or expired:
+        logger.info(f"Gộp dữ liệu tương tác: {stats}")
+    return stats
+
+
+def daily_series_many(event_ids, days=7, pending=None):
+    """
+    Chuỗi chỉ số theo ngày của các sự kiện trong `days` ngày gần nhất (cũ nhất trước), gộp cả bucket giờ,
+    bucket ngày và phần còn trong bộ đệm; một truy vấn GROUP BY (sự kiện, ngày) cho cả danh sách.
+
+    Args:
+        pending: {event_id: kết quả trend_counters.pending_counts_many} (có thể thiếu sự kiện)
+
+    Returns:
+        {event_id: [{'date': ngày, metric: n, ...}]}
+    """
+    today = localdate()
+    first_day = today - timedelta(days=days - 1)
+    pending = pending or {}
+
+    per_day = defaultdict(lambda: defaultdict(lambda: dict.fromkeys(METRICS, 0)))
+    rows = EventEngagement.objects.filter(
+        event_id__in=event_ids, bucket_start__gte=make_aware(datetime.combine(first_day, time.min))
+    ).order_by().annotate(day=TruncDate('bucket_start')).values('event_id', 'day') \
+        .annotate(**{metric: Sum(metric) for metric in METRICS})
+    for row in rows:
+        for metric in METRICS:
+            per_day[row['event_id']][row['day']][metric] += row[metric]
+
+    for event_id in event_ids:
+        for hour_start, hour_counts in (pending.get(event_id) or {}).get('by_hour', {}).items():
+            for metric, value in hour_counts.items():
+                per_day[event_id][localtime(hour_start).date()][metric] += value
+
+    return {
+        event_id: [
+            {'date': day, **per_day[event_id][day]}
+            for day in (first_day + timedelta(days=i) for i in range(days))
+        ]
+        for event_id in event_ids
+    }
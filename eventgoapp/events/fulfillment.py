@@ -0,0 +1,65 @@
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils.timezone import now
+
+from . import ticket_qr
+from .models import Order, OrderDetail
+
+logger = logging.getLogger(__name__)
+
+
+def ticket_qr_codes(order):
+    """Mã QR cố định cho từng vé của đơn hàng, dùng làm khóa chống tạo trùng khi tác vụ chạy lại."""
+    return [f"QR_{order.id}_{order.ticket_id}_{i + 1}" for i in range(order.quantity)]
+
+
+def enqueue_fulfillment(order):
+    """Đưa đơn hàng vừa thanh toán vào hàng đợi phát hành vé sau khi transaction hiện tại commit."""
+    from .tasks import fulfil_paid_order
+    transaction.on_commit(lambda: fulfil_paid_order.delay(order.id))
+
+
+def fulfil_order(order_id):
+    """
+    Phát hành vé cho một đơn đã thanh toán: tạo OrderDetail, tạo trước ảnh QR vào cache
+    theo lô, sau đó gửi một email xác nhận duy nhất chứa đường dẫn có chữ ký tới ảnh QR.
+
+    Ảnh QR không còn được tải lên Cloudinary ở bước này; việc đó chỉ xảy ra khi được yêu cầu
+    (xem `ticket_qr.persist_qr_image`).
+
+    Hàm có thể chạy lại an toàn: OrderDetail được tạo theo mã QR cố định với ignore_conflicts
+    và email chỉ gửi khi đơn chưa có `fulfilled_at`.
+
+    Returns:
+        Số vé của đơn hàng, hoặc 0 nếu đơn không cần xử lý.
+    """
+    order = Order.objects.select_related('user', 'ticket').filter(id=order_id).first()
+    if not order or order.payment_status != Order.PaymentStatus.PAID or order.fulfilled_at:
+        return 0
+
+    qr_codes = ticket_qr_codes(order)
+    OrderDetail.objects.bulk_create(
+        [OrderDetail(order=order, qr_code=qr_code) for qr_code in qr_codes],
+        ignore_conflicts=True
+    )
+
+    try:
+        ticket_qr.warm_qr_cache(qr_codes)
+    except Exception as e:
+        logger.error(f"Lỗi khi tạo trước ảnh QR cho đơn hàng #{order.id}: {str(e)}")
+
+    qr_image_urls = [ticket_qr.qr_image_url(qr_code) for qr_code in qr_codes]
+    send_mail(
+        subject=f"Xác nhận đặt vé thành công - Đơn hàng #{order.id}",
+        message=f"Chào {order.user.username},\n\nĐơn hàng của bạn đã được thanh toán thành công. Dưới đây là các mã QR cho vé của bạn:\n" +
+                "\n".join([f"Vé {i + 1}: {url}" for i, url in enumerate(qr_image_urls)]) +
+                f"\n\nBạn cũng có thể xem mã QR tại: /orders/{order.id}/",
+        from_email=settings.DEFAULT_FROM_EMAIL or settings.EMAIL_HOST_USER,
+        recipient_list=[order.user.email],
+        fail_silently=True
+    )
+    Order.objects.filter(id=order.id, fulfilled_at__isnull=True).update(fulfilled_at=now())
+    return len(qr_codes)
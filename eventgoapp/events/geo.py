@@ -0,0 +1,289 @@
+import math
+import re
+from urllib.parse import unquote
+
+import numpy as np
+import requests
+from django.db.models import Exists, OuterRef, Q
+from django.utils.timezone import now
+
+from . import response_cache
+from .models import Event, User
+from .trending import _slug
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+GEOHASH_PRECISION = 9
+MAX_COVER_CELLS = 16
+GEOCODE_BATCH_SIZE = 500
+# Số id ứng viên (x limit) được lọc theo queryset mỗi lượt khi tìm sự kiện gần; với bán kính lớn hơn
+# NEARBY_PROBE_MIN_KM thì thử trước vòng NEARBY_PROBE_FRACTION x bán kính
+NEARBY_BATCH_FACTOR = 2
+NEARBY_PROBE_MIN_KM = 10
+NEARBY_PROBE_FRACTION = 0.25
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Tọa độ trung tâm các thành phố dùng khi không đọc được tọa độ từ google_maps_link (khóa là slug, kèm tên khác)
+GAZETTEER = {
+    'ha-noi': (21.0285, 105.8542), 'hanoi': (21.0285, 105.8542),
+    'tp-ho-chi-minh': (10.7769, 106.7009), 'ho-chi-minh': (10.7769, 106.7009), 'hcmc': (10.7769, 106.7009),
+    'ho-chi-minh-city': (10.7769, 106.7009), 'sai-gon': (10.7769, 106.7009), 'saigon': (10.7769, 106.7009),
+    'thu-duc': (10.8494, 106.7537),
+    'da-nang': (16.0544, 108.2022), 'hoi-an': (15.8801, 108.3380), 'hue': (16.4637, 107.5909),
+    'hai-phong': (20.8449, 106.6881), 'ha-long': (20.9517, 107.0748), 'ninh-binh': (20.2506, 105.9745),
+    'sa-pa': (22.3364, 103.8438), 'vinh': (18.6796, 105.6813), 'quy-nhon': (13.7820, 109.2196),
+    'nha-trang': (12.2388, 109.1967), 'da-lat': (11.9404, 108.4583), 'buon-ma-thuot': (12.6667, 108.0500),
+    'vung-tau': (10.3460, 107.0843), 'bien-hoa': (10.9574, 106.8429), 'can-tho': (10.0452, 105.7469),
+    'phu-quoc': (10.2899, 103.9840),
+}
+
+# Ghim địa điểm (!3d..!4d..) chính xác hơn tâm khung nhìn (@lat,lng) nên được thử trước
+_LINK_PATTERNS = [
+    re.compile(r'!3d(-?\d+(?:\.\d+)?)!4d(-?\d+(?:\.\d+)?)'),
+    re.compile(r'[?&](?:q|ll|query|center|destination)=(-?\d+(?:\.\d+)?),\s*(-?\d+(?:\.\d+)?)'),
+    re.compile(r'@(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)'),
+]
+
+
+def _valid(lat, lng):
+    return -90 <= lat <= 90 and -180 <= lng <= 180
+
+
+def coordinates_from_link(url):
+    """(lat, lng) ghi trong link Google Maps đầy đủ; None với link rút gọn (maps.app.goo.gl) hoặc link không tọa độ."""
+    url = unquote(url or '')
+    for pattern in _LINK_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            lat, lng = float(match.group(1)), float(match.group(2))
+            if _valid(lat, lng):
+                return lat, lng
+    return None
+
+
+def resolve_link(url, timeout=10):
+    """Link đích của một link rút gọn (gọi mạng, chỉ dùng trong lệnh geocode_locations)."""
+    try:
+        return requests.head(url, allow_redirects=True, timeout=timeout).url
+    except requests.RequestException:
+        return None
+
+
+def coordinates_from_gazetteer(text):
+    """Tọa độ thành phố xuất hiện muộn nhất trong địa chỉ ("Hải Châu, Đà Nẵng" -> Đà Nẵng); None nếu không có."""
+    slug = f'-{_slug(text or "")}-'
+    best = None
+    for name, coordinates in GAZETTEER.items():
+        position = slug.rfind(f'-{name}-')
+        if position >= 0 and (best is None or position > best[0]):
+            best = (position, coordinates)
+    return best[1] if best else None
+
+
+def geocode(link=None, text=None):
+    """Tọa độ không cần gọi mạng: từ link Google Maps, nếu không có thì từ bảng GAZETTEER theo địa chỉ."""
+    return coordinates_from_link(link) or coordinates_from_gazetteer(text)
+
+
+def encode(lat, lng, precision=GEOHASH_PRECISION):
+    """Geohash của một điểm: các ô có chung tiền tố nằm kề nhau nên tìm theo vùng là tìm theo khoảng chuỗi."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def _cell_size(precision):
+    """(độ cao, độ rộng) tính bằng độ của một ô geohash độ dài `precision`."""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def bounding_box(lat, lng, radius_km):
+    """(lat_min, lat_max, lng_min, lng_max) chứa hình tròn bán kính radius_km."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def covering_cells(lat, lng, radius_km):
+    """
+    Các ô geohash phủ khung bao của hình tròn, ở độ dài lớn nhất mà lưới ô phủ khung không quá MAX_COVER_CELLS ô:
+    ô càng nhỏ thì càng ít sự kiện ngoài bán kính bị đọc, nhưng mỗi ô là một lần quét khoảng trên chỉ mục.
+    """
+    lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, radius_km)
+    lat_min, lat_max = max(lat_min, -90), min(lat_max, 90)
+    precision = 1
+    while precision < GEOHASH_PRECISION:
+        height, width = _cell_size(precision + 1)
+        rows = math.floor(lat_max / height) - math.floor(lat_min / height) + 1
+        columns = math.floor(lng_max / width) - math.floor(lng_min / width) + 1
+        if rows * columns > MAX_COVER_CELLS:
+            break
+        precision += 1
+
+    height, width = _cell_size(precision)
+    cells = set()
+    for row in range(math.floor(lat_min / height), math.floor(lat_max / height) + 1):
+        y = min(max((row + 0.5) * height, lat_min), lat_max)
+        for column in range(math.floor(lng_min / width), math.floor(lng_max / width) + 1):
+            x = min(max((column + 0.5) * width, lng_min), lng_max)
+            cells.add(encode(y, (x + 180) % 360 - 180, precision))
+    return sorted(cells)
+
+
+def _ranges(cells):
+    """
+    Gộp các ô liền nhau theo thứ tự geohash ("w7e" rồi "w7f") thành khoảng [đầu, cuối) trên cột geohash;
+    cuối là None khi khoảng kéo tới hết bảng.
+    """
+    ranges = []
+    for cell in cells:
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1][1] = _successor(cell)
+        else:
+            ranges.append([cell, _successor(cell)])
+    return ranges
+
+
+def _successor(cell):
+    """
+    Ô cùng độ dài ngay sau `cell` ("w7z" -> "w80"): đứng sau mọi geohash có tiền tố `cell`. Chỉ dùng các ký tự
+    base32, có cùng thứ tự ở collation nhị phân lẫn không phân biệt hoa thường, thay vì một ký tự canh như "~";
+    None khi `cell` chỉ gồm "z".
+    """
+    stem = cell.rstrip('z')
+    if not stem:
+        return None
+    return stem[:-1] + _BASE32[_BASE32.index(stem[-1]) + 1] + '0' * (len(cell) - len(stem))
+
+
+def distances_km(lat, lng, lats, lngs):
+    """Khoảng cách haversine (km) từ một điểm tới các mảng tọa độ; NaN ở các phần tử không có tọa độ."""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _within(lat, lng, radius_km):
+    """
+    (ids, khoảng cách km) của mọi sự kiện có tọa độ trong bán kính, gần nhất trước. Chỉ lọc theo hình học trên
+    cả bảng: các khoảng geohash cộng khung bao lat/lng, đọc hoàn toàn từ chỉ mục event_geohash_idx.
+    """
+    cells = Q()
+    for start, end in _ranges(covering_cells(lat, lng, radius_km)):
+        cells |= Q(geohash__gte=start, geohash__lt=end) if end else Q(geohash__gte=start)
+    lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, radius_km)
+    box = Q(latitude__range=(lat_min, lat_max))
+    # Khung bao vắt qua kinh tuyến 180 thì chỉ dựa vào các ô geohash (đã quy về [-180, 180))
+    if -180 <= lng_min and lng_max <= 180:
+        box &= Q(longitude__range=(lng_min, lng_max))
+    rows = list(Event.objects.filter(cells, box).order_by().values_list('id', 'latitude', 'longitude'))
+    if not rows:
+        return [], []
+
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    coordinates = np.array([row[1:] for row in rows], dtype=np.float64)
+    distances = distances_km(lat, lng, coordinates[:, 0], coordinates[:, 1])
+    inside = np.flatnonzero(distances <= radius_km)
+    ordered = inside[np.lexsort((ids[inside], distances[inside]))]
+    return ids[ordered].tolist(), distances[ordered].tolist()
+
+
+def nearby_event_ids(queryset, lat, lng, radius_km, limit=20):
+    """
+    Id các sự kiện của `queryset` trong bán kính radius_km quanh (lat, lng), gần nhất trước.
+
+    Bán kính lớn được tìm trước trong vòng nhỏ NEARBY_PROBE_FRACTION x radius_km: ở nơi dày sự kiện vòng này
+    thường đủ `limit` sự kiện nên không phải đọc cả đĩa; vòng có ít hơn `limit` ứng viên được bỏ qua ngay.
+    Bộ lọc của `queryset` (trạng thái, danh mục, ...) được thử bằng EXISTS trên từng lô id theo thứ tự khoảng
+    cách, để DB tra theo khóa chính thay vì chọn chỉ mục của bộ lọc (như status) rồi quét cả bảng.
+
+    Returns:
+        [(event_id, khoảng cách km)]
+    """
+    matched = {}
+    batch_size = NEARBY_BATCH_FACTOR * limit
+    rings = [radius_km * NEARBY_PROBE_FRACTION, radius_km] if radius_km > NEARBY_PROBE_MIN_KM else [radius_km]
+    for ring in rings:
+        ids, distances = _within(lat, lng, ring)
+        if len(ids) < limit and ring < radius_km:
+            continue
+        unchecked = [event_id for event_id in ids if event_id not in matched]
+        for start in range(0, len(unchecked), batch_size):
+            batch = unchecked[start:start + batch_size]
+            found = set(Event.objects.filter(id__in=batch)
+                        .filter(Exists(queryset.filter(pk=OuterRef('pk')))).values_list('id', flat=True))
+            matched.update((event_id, event_id in found) for event_id in batch)
+            # Các id được thử theo thứ tự khoảng cách nên `limit` kết quả đầu tiên đã là gần nhất
+            results = [(event_id, distance) for event_id, distance in zip(ids, distances) if matched.get(event_id)]
+            if len(results) >= limit:
+                return results[:limit]
+    return [(event_id, distance) for event_id, distance in zip(ids, distances) if matched.get(event_id)][:limit]
+
+
+def _geocode_events(resolve_links, batch_size):
+    stats = {'events': 0, 'events_located': 0}
+    rows = Event.objects.filter(latitude__isnull=True).order_by('id').values_list('id', 'location', 'google_maps_link')
+    last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return stats
+        last_id = batch[-1][0]
+        located = []
+        for event_id, location, link in batch:
+            coordinates = coordinates_from_link(link)
+            if coordinates is None and resolve_links and link:
+                coordinates = coordinates_from_link(resolve_link(link))
+            coordinates = coordinates or coordinates_from_gazetteer(location)
+            if coordinates:
+                # updated_at đổi để lần cập nhật mô hình gợi ý kế tiếp đọc lại tọa độ
+                located.append(Event(id=event_id, latitude=coordinates[0], longitude=coordinates[1],
+                                     geohash=encode(*coordinates), updated_at=now()))
+        Event.objects.bulk_update(located, ['latitude', 'longitude', 'geohash', 'updated_at'])
+        response_cache.invalidate_events([event.id for event in located])
+        stats['events'] += len(batch)
+        stats['events_located'] += len(located)
+
+
+def _geocode_users(batch_size):
+    stats = {'users': 0, 'users_located': 0}
+    rows = User.objects.filter(latitude__isnull=True).exclude(address__isnull=True).exclude(address='') \
+        .order_by('id').values_list('id', 'address')
+    last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return stats
+        last_id = batch[-1][0]
+        located = []
+        for user_id, address in batch:
+            coordinates = coordinates_from_gazetteer(address)
+            if coordinates:
+                located.append(User(id=user_id, latitude=coordinates[0], longitude=coordinates[1]))
+        User.objects.bulk_update(located, ['latitude', 'longitude'])
+        stats['users'] += len(batch)
+        stats['users_located'] += len(located)
+
+
+def geocode_missing(resolve_links=False, batch_size=GEOCODE_BATCH_SIZE):
+    """
+    Điền tọa độ còn trống của sự kiện (link Google Maps, rồi GAZETTEER) và người dùng (GAZETTEER theo address).
+    `resolve_links` mở các link rút gọn qua mạng để đọc tọa độ trong link đích; chỉ nên dùng khi chạy ngoài giờ.
+    """
+    return {**_geocode_events(resolve_links, batch_size), **_geocode_users(batch_size)}
@@ -0,0 +1,151 @@
+import logging
+
+from django.db import transaction
+from django.db.models import F, Case, When, Value, PositiveIntegerField
+from django.utils.timezone import now
+
+from . import sales_rollups, loyalty, recommendations
+from .models import TicketType, Order
+
+logger = logging.getLogger(__name__)
+
+
+def reserve_tickets(ticket_id, quantity):
+    """
+    Giữ chỗ `quantity` vé của một loại vé bằng một câu UPDATE có điều kiện.
+
+    Câu lệnh chỉ trừ khi còn đủ vé nên nhiều request đồng thời không thể bán vượt số lượng,
+    và khóa dòng chỉ được giữ trong thời gian của chính câu UPDATE đó. Cache response không bị làm mới:
+    số vé còn lại hiển thị có thể chậm tối đa RESPONSE_CACHE_TIMEOUT, còn câu UPDATE luôn kiểm tra số thật.
+
+    Returns:
+        True nếu giữ chỗ thành công, False nếu không đủ vé.
+    """
+    if quantity <= 0:
+        return False
+    updated = TicketType.objects.filter(id=ticket_id, quantity__gte=quantity).update(
+        quantity=F('quantity') - quantity,
+        updated_at=now()
+    )
+    return updated == 1
+
+
+def release_tickets(ticket_id, quantity):
+    """Trả lại `quantity` vé đã giữ chỗ cho loại vé."""
+    if quantity <= 0:
+        return
+    TicketType.objects.filter(id=ticket_id).update(
+        quantity=F('quantity') + quantity,
+        updated_at=now()
+    )
+
+
+def _transition_pending_order(order, new_status, **extra_fields):
+    """Chuyển trạng thái có điều kiện; gọi trong transaction để bảng tổng hợp doanh số được cập nhật cùng lúc."""
+    current_time = now()
+    updated = Order.objects.filter(id=order.id, payment_status=Order.PaymentStatus.PENDING).update(
+        payment_status=new_status,
+        updated_at=current_time,
+        **extra_fields
+    )
+    if updated:
+        sales_rollups.record_transition([order.id], new_status)
+        order.payment_status = new_status
+        order.updated_at = current_time
+        for field, value in extra_fields.items():
+            setattr(order, field, value)
+    return updated == 1
+
+
+def mark_order_paid(order):
+    """
+    Chuyển đơn hàng PENDING sang PAID. Số vé đã được giữ chỗ lúc tạo đơn nên không trừ thêm.
+
+    Returns:
+        True nếu lần gọi này thực hiện chuyển trạng thái, False nếu đơn đã được xử lý trước đó
+        (ví dụ MoMo gọi IPN nhiều lần).
+    """
+    with transaction.atomic():
+        transitioned = _transition_pending_order(order, Order.PaymentStatus.PAID)
+        if transitioned:
+            loyalty.record_paid_order(order)
+            recommendations.record_purchase(order)
+    return transitioned
+
+
+def mark_order_failed(order):
+    """
+    Chuyển đơn hàng PENDING sang FAILED và trả lại số vé đã giữ chỗ.
+
+    Việc chuyển trạng thái có điều kiện đảm bảo vé chỉ được trả lại đúng một lần dù
+    `pay`, IPN MoMo hay tác vụ kiểm tra trạng thái cùng xử lý một đơn.
+    """
+    with transaction.atomic():
+        released = _transition_pending_order(order, Order.PaymentStatus.FAILED, active=False)
+        if released and order.ticket_id:
+            release_tickets(order.ticket_id, order.quantity)
+    return released
+
+
+def release_expired_orders(batch_size=500, max_batches=None):
+    """
+    Quét các đơn PENDING đã quá `expiration_time` theo từng lô và trả vé về kho.
+
+    Mỗi lô khóa các đơn bằng SELECT ... FOR UPDATE SKIP LOCKED trên chỉ mục
+    (payment_status, expiration_time), chuyển chúng sang FAILED bằng một câu UPDATE
+    và cộng lại số lượng cho các loại vé bằng một câu UPDATE dùng CASE.
+
+    Returns:
+        dict thống kê: số lô, số đơn, số vé được trả lại và độ trễ lớn nhất (giây)
+        giữa thời điểm hết hạn và thời điểm được quét.
+    """
+    stats = {'batches': 0, 'orders': 0, 'tickets': 0, 'max_lag_seconds': 0.0}
+
+    while max_batches is None or stats['batches'] < max_batches:
+        current_time = now()
+        with transaction.atomic():
+            batch = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(payment_status=Order.PaymentStatus.PENDING, expiration_time__lt=current_time)
+                .order_by('expiration_time')
+                .values_list('id', 'ticket_id', 'quantity', 'expiration_time')[:batch_size]
+            )
+            if not batch:
+                break
+
+            order_ids = [order_id for order_id, _, _, _ in batch]
+            Order.objects.filter(id__in=order_ids).update(
+                payment_status=Order.PaymentStatus.FAILED,
+                active=False,
+                updated_at=current_time
+            )
+            sales_rollups.record_transition(order_ids, Order.PaymentStatus.FAILED)
+
+            released = {}
+            for _, ticket_id, quantity, _ in batch:
+                if ticket_id:
+                    released[ticket_id] = released.get(ticket_id, 0) + quantity
+            if released:
+                TicketType.objects.filter(id__in=released.keys()).update(
+                    quantity=F('quantity') + Case(
+                        *[When(id=ticket_id, then=Value(quantity)) for ticket_id, quantity in released.items()],
+                        default=Value(0),
+                        output_field=PositiveIntegerField()
+                    ),
+                    updated_at=current_time
+                )
+
+        lag = (current_time - batch[0][3]).total_seconds()
+        stats['batches'] += 1
+        stats['orders'] += len(batch)
+        stats['tickets'] += sum(released.values())
+        stats['max_lag_seconds'] = max(stats['max_lag_seconds'], lag)
+        logger.info(
+            f"Released expired orders batch: size={len(batch)}, tickets={sum(released.values())}, "
+            f"ticket_types={len(released)}, lag={lag:.1f}s"
+        )
+
+        if len(batch) < batch_size:
+            break
+
+    return stats
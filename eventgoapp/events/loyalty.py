@@ -0,0 +1,133 @@
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum, Case, When, Value
+from django.utils.timezone import now
+
+from .models import Order, Discount, CustomerLoyalty
+
+logger = logging.getLogger(__name__)
+
+Rank = Discount.LoyaltyRank
+
+# Ngưỡng hạng: (hạng, tổng chi tiêu tối thiểu, số vé tối thiểu), xét từ hạng cao xuống
+RANK_THRESHOLDS = (
+    (Rank.GOLD, Decimal('1000000'), 10),
+    (Rank.SILVER, Decimal('500000'), 5),
+)
+RANK_CACHE_KEY = 'loyalty:rank:{user_id}'
+
+
+def rank_for(total_spent, tickets_bought):
+    """Hạng tương ứng với tổng chi tiêu và số vé đã mua."""
+    for rank, min_spent, min_tickets in RANK_THRESHOLDS:
+        if total_spent >= min_spent or tickets_bought >= min_tickets:
+            return rank.value
+    if total_spent > 0 or tickets_bought > 0:
+        return Rank.BRONZE.value
+    return Rank.NONE.value
+
+
+def _rank_expression():
+    """rank_for dưới dạng biểu thức SQL trên các cột đã lưu, để tính lại hạng trong cùng câu UPDATE."""
+    return Case(
+        *[When(Q(total_spent__gte=min_spent) | Q(tickets_bought__gte=min_tickets), then=Value(rank.value))
+          for rank, min_spent, min_tickets in RANK_THRESHOLDS],
+        When(Q(total_spent__gt=0) | Q(tickets_bought__gt=0), then=Value(Rank.BRONZE.value)),
+        default=Value(Rank.NONE.value)
+    )
+
+
+def _cache_key(user_id):
+    return RANK_CACHE_KEY.format(user_id=user_id)
+
+
+def get_rank(user):
+    """Hạng khách hàng, đọc từ cache; khi cache trống đọc dòng CustomerLoyalty thay vì cộng lại toàn bộ đơn hàng."""
+    key = _cache_key(user.id)
+    rank = cache.get(key)
+    if rank is None:
+        rank = CustomerLoyalty.objects.filter(user_id=user.id).values_list('rank', flat=True).first() \
+            or Rank.NONE.value
+        cache.set(key, rank, settings.LOYALTY_RANK_CACHE_TIMEOUT)
+    return rank
+
+
+def record_paid_order(order):
+    """
+    Cộng đơn vừa chuyển sang PAID vào tổng của khách hàng bằng F() rồi tính lại hạng bằng UPDATE ... CASE.
+    Gọi trong cùng transaction với việc chuyển trạng thái; cache hạng bị xóa sau khi commit.
+    """
+    CustomerLoyalty.objects.get_or_create(user_id=order.user_id)
+    CustomerLoyalty.objects.filter(user_id=order.user_id).update(
+        total_spent=F('total_spent') + order.total_amount,
+        tickets_bought=F('tickets_bought') + order.quantity,
+        updated_at=now()
+    )
+    CustomerLoyalty.objects.filter(user_id=order.user_id).update(rank=_rank_expression())
+    transaction.on_commit(lambda: cache.delete(_cache_key(order.user_id)))
+
+
+def reconcile_loyalty(batch_size=1000, fix=True):
+    """
+    Tính lại tổng chi tiêu và số vé từ các đơn PAID theo từng lô khách hàng rồi so với dữ liệu đã lưu.
+
+    Args:
+        fix: ghi lại các dòng sai lệch (dùng để backfill); False chỉ đếm.
+
+    Returns:
+        dict thống kê: số khách hàng đã kiểm tra, số dòng sai lệch và số dòng đã sửa.
+    """
+    stats = {'users': 0, 'mismatched': 0, 'fixed': 0}
+    paid_users = Order.objects.filter(payment_status=Order.PaymentStatus.PAID).order_by('user_id') \
+        .values_list('user_id', flat=True).distinct()
+    stored_users = CustomerLoyalty.objects.order_by('user_id').values_list('user_id', flat=True)
+
+    last_id = 0
+    while True:
+        # Lô tiếp theo gồm cả khách đã có đơn PAID lẫn khách đã có dòng tổng hợp (để phát hiện dòng thừa)
+        user_ids = sorted(
+            set(paid_users.filter(user_id__gt=last_id)[:batch_size])
+            | set(stored_users.filter(user_id__gt=last_id)[:batch_size])
+        )[:batch_size]
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        source = {
+            row['user_id']: (row['spent'], row['tickets'])
+            for row in Order.objects.filter(payment_status=Order.PaymentStatus.PAID, user_id__in=user_ids)
+            .order_by().values('user_id').annotate(spent=Sum('total_amount'), tickets=Sum('quantity'))
+        }
+        stored = {row.user_id: row for row in CustomerLoyalty.objects.filter(user_id__in=user_ids)}
+
+        to_create, to_update = [], []
+        for user_id in user_ids:
+            spent, tickets = source.get(user_id, (Decimal('0'), 0))
+            rank = rank_for(spent, tickets)
+            row = stored.get(user_id)
+            if row is None:
+                if spent or tickets:
+                    to_create.append(CustomerLoyalty(user_id=user_id, total_spent=spent, tickets_bought=tickets,
+                                                     rank=rank))
+            elif (row.total_spent, row.tickets_bought, row.rank) != (spent, tickets, rank):
+                row.total_spent, row.tickets_bought, row.rank = spent, tickets, rank
+                to_update.append(row)
+
+        stats['users'] += len(user_ids)
+        stats['mismatched'] += len(to_create) + len(to_update)
+        if fix and (to_create or to_update):
+            with transaction.atomic():
+                CustomerLoyalty.objects.bulk_create(to_create, ignore_conflicts=True)
+                CustomerLoyalty.objects.bulk_update(to_update, ['total_spent', 'tickets_bought', 'rank'])
+            cache.delete_many([_cache_key(row.user_id) for row in to_create + to_update])
+            stats['fixed'] += len(to_create) + len(to_update)
+
+    if stats['mismatched'] > stats['fixed']:
+        logger.warning(f"Dữ liệu hạng khách hàng sai lệch: {stats}")
+    elif stats['fixed']:
+        logger.info(f"Đã ghi lại dữ liệu hạng khách hàng: {stats}")
+    return stats
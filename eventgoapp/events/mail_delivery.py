@@ -0,0 +1,158 @@
+import logging
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from .models import User
+from .notification_fanout import iter_recipient_chunks
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    smtplib.SMTPConnectError,
+    smtplib.SMTPHeloError,
+    ConnectionError,
+    TimeoutError,
+)
+
+_local = threading.local()
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Token bucket giới hạn số email mỗi giây gửi tới một nhà cung cấp SMTP trong một process."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            while True:
+                current = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (current - self.updated) * self.rate)
+                self.updated = current
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
+
+
+def _rate_limiter():
+    host = settings.EMAIL_HOST
+    with _limiters_lock:
+        if host not in _limiters:
+            rate = settings.EMAIL_RATE_LIMITS.get(host, settings.EMAIL_RATE_LIMIT_PER_SECOND)
+            _limiters[host] = RateLimiter(rate)
+        return _limiters[host]
+
+
+def _get_connection():
+    """Kết nối SMTP dùng chung của luồng hiện tại, chỉ mở lại khi đã bị đóng."""
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        connection = get_connection(fail_silently=False)
+        _local.connection = connection
+    connection.open()
+    return connection
+
+
+def _reset_connection():
+    connection = getattr(_local, 'connection', None)
+    _local.connection = None
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def _is_transient(error):
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 400 <= error.smtp_code < 500
+
+
+def build_message(subject, body, recipient):
+    return EmailMessage(
+        subject=subject,
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL or settings.EMAIL_HOST_USER,
+        to=[recipient]
+    )
+
+
+def send_messages(messages):
+    """
+    Gửi danh sách EmailMessage qua một kết nối SMTP dùng lại được.
+
+    Lỗi tạm thời (mất kết nối, mã 4xx) được thử lại với backoff tăng dần từ email đang gửi dở;
+    email bị từ chối vĩnh viễn được bỏ qua và ghi log.
+
+    Returns:
+        Số email đã gửi thành công.
+    """
+    sent = 0
+    index = 0
+    attempt = 0
+    limiter = _rate_limiter()
+
+    while index < len(messages):
+        try:
+            connection = _get_connection()
+            while index < len(messages):
+                limiter.acquire()
+                try:
+                    sent += connection.send_messages([messages[index]]) or 0
+                except smtplib.SMTPRecipientsRefused as e:
+                    logger.error(f"Email tới {messages[index].to} bị từ chối: {str(e)}")
+                index += 1
+                attempt = 0
+        except Exception as e:
+            _reset_connection()
+            if not _is_transient(e) or attempt >= settings.EMAIL_SEND_MAX_RETRIES:
+                logger.error(f"Dừng gửi email sau {sent}/{len(messages)} thư: {str(e)}")
+                raise
+            delay = settings.EMAIL_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+            attempt += 1
+            logger.warning(f"Lỗi SMTP tạm thời, thử lại sau {delay}s (lần {attempt}): {str(e)}")
+            time.sleep(delay)
+
+    return sent
+
+
+def send_templated_mail(subject, body_template, user_ids):
+    """Gửi email cho một lô người dùng; `{username}` trong nội dung được thay bằng tên người nhận."""
+    recipients = User.objects.filter(id__in=user_ids).exclude(email__isnull=True).exclude(email='') \
+        .values_list('username', 'email')
+    messages = [
+        build_message(subject, body_template.replace('{username}', username), email)
+        for username, email in recipients
+    ]
+    return send_messages(messages)
+
+
+def fan_out_mail(event_id, audience, subject, body_template):
+    """
+    Chia người nhận của sự kiện thành từng lô MAIL_FANOUT_CHUNK_SIZE người và gửi mỗi lô
+    thành một tác vụ Celery, để nhiều worker cùng gửi song song.
+
+    Returns:
+        Tổng số người nhận đã được chia lô.
+    """
+    from .tasks import send_mail_chunk
+
+    total = 0
+    for chunk in iter_recipient_chunks(event_id, audience, settings.MAIL_FANOUT_CHUNK_SIZE):
+        send_mail_chunk.delay(subject, body_template, chunk)
+        total += len(chunk)
+    return total
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from events.loyalty import reconcile_loyalty
+
+
+class Command(BaseCommand):
+    help = 'Backfill customer loyalty totals and ranks from paid orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số khách hàng mỗi lô')
+
+    def handle(self, *args, **options):
+        stats = reconcile_loyalty(batch_size=options['batch_size'], fix=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Checked {stats['users']} users, wrote {stats['fixed']} loyalty rows"
+        ))
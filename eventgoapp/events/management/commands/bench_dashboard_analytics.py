@@ -0,0 +1,94 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+from events.benchmarks import BenchmarkCommand
+from events.models import User, Event, TicketType, Order, OrderDetail, Review
+from events.sales_rollups import rebuild_sales_rollups
+
+
+class Command(BenchmarkCommand):
+    help = 'Benchmark query count and latency of the organizer and admin dashboard analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizers', type=int, default=30, help='Số nhà tổ chức thử nghiệm')
+        parser.add_argument('--events', type=int, default=20, help='Số sự kiện của mỗi nhà tổ chức')
+        parser.add_argument('--orders', type=int, default=20, help='Số đơn hàng của mỗi sự kiện')
+        parser.add_argument('--runs', type=int, default=5, help='Số lần gọi mỗi endpoint để đo thời gian')
+        parser.add_argument('--max-queries', type=int, default=15, help='Số truy vấn tối đa cho một lần gọi')
+
+    def handle(self, *args, **options):
+        admin, organizers = self.create_fixture(options['organizers'], options['events'], options['orders'])
+        client = APIClient(HTTP_HOST='localhost')
+        url = '/events/dashboard-analytics/'
+        for label, user, expected in (
+            ('organizer', organizers[0], options['events']),
+            ('admin', admin, None),
+        ):
+            client.force_authenticate(user)
+            queries = []
+            with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{label}: unexpected status {response.status_code}')
+            if expected is not None and len(response.data) != expected:
+                raise CommandError(f'{label}: {len(response.data)} events, expected {expected}')
+
+            timings = []
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(f"{label}: {len(response.data)} rows, {len(queries)} queries, "
+                              f"median {statistics.median(timings):.1f} ms")
+            if len(queries) > options['max_queries']:
+                raise CommandError(f'{label}: {len(queries)} queries exceeds the limit of {options["max_queries"]}')
+        self.stdout.write(self.style.SUCCESS('✅ Dashboard analytics query count is constant'))
+
+    def create_fixture(self, organizer_count, events_per_organizer, orders_per_event):
+        admin = User.objects.create(username='dashboard_admin', role=User.Role.ADMIN, is_superuser=True)
+        organizers = [
+            User.objects.create(username=f'dashboard_org_{i}', role=User.Role.ORGANIZER)
+            for i in range(organizer_count)
+        ]
+        User.objects.bulk_create(
+            [User(username=f'dashboard_buyer_{i}', role=User.Role.ATTENDEE) for i in range(orders_per_event)]
+        )
+        buyers = list(User.objects.filter(username__startswith='dashboard_buyer_').values_list('id', flat=True))
+
+        Event.objects.bulk_create([
+            Event(organizer=organizer, name=f'Dashboard {organizer.id}-{i}', location='N/A',
+                  ticket_limit=orders_per_event * 10, date=now() + timedelta(days=30 + i))
+            for organizer in organizers for i in range(events_per_organizer)
+        ])
+        events = list(Event.objects.filter(organizer__in=organizers))
+        tickets = TicketType.objects.bulk_create([
+            TicketType(event=event, type='Standard', price=Decimal('100000'), quantity=orders_per_event * 10)
+            for event in events
+        ])
+
+        orders = []
+        for ticket in tickets:
+            for i, buyer_id in enumerate(buyers):
+                status = Order.PaymentStatus.FAILED if i % 10 == 0 else Order.PaymentStatus.PAID
+                orders.append(Order(user_id=buyer_id, ticket=ticket, quantity=1,
+                                    total_amount=ticket.price, payment_status=status))
+        Order.objects.bulk_create(orders, batch_size=2000)
+        paid_orders = Order.objects.filter(ticket__event__in=events, payment_status=Order.PaymentStatus.PAID) \
+            .values_list('id', flat=True)
+        OrderDetail.objects.bulk_create(
+            [OrderDetail(order_id=order_id, qr_code=f'DASH_{order_id}') for order_id in paid_orders],
+            batch_size=2000
+        )
+        Review.objects.bulk_create(
+            [Review(user_id=buyer_id, event=event, rating=(event.id + i) % 5 + 1, comment='ok')
+             for event in events for i, buyer_id in enumerate(buyers[:3])],
+            batch_size=2000
+        )
+        # Đơn hàng tạo bằng bulk_create không đi qua inventory nên tính lại bảng tổng hợp doanh số
+        rebuild_sales_rollups()
+        return admin, organizers
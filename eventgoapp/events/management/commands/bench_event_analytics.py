@@ -0,0 +1,90 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+from events.benchmarks import BenchmarkCommand
+from events.models import User, Event, TicketType, Order, OrderDetail, Review
+from events.sales_rollups import rebuild_sales_rollups
+
+
+class Command(BenchmarkCommand):
+    help = 'Benchmark query count and p95 latency of the event analytics endpoint for a large event'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=50000, help='Số vé đã bán của sự kiện thử nghiệm')
+        parser.add_argument('--buyers', type=int, default=5000, help='Số người mua khác nhau')
+        parser.add_argument('--runs', type=int, default=20, help='Số lần gọi endpoint để đo p95')
+
+    def handle(self, *args, **options):
+        organizer, event = self.create_fixture(options['tickets'], options['buyers'])
+        client = APIClient(HTTP_HOST='localhost')
+        client.force_authenticate(organizer)
+        url = f'/events/{event.id}/analytics/'
+
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            response = client.get(url)
+        self.stdout.write(f"tickets_sold={response.data['tickets_sold']}, "
+                          f"total_revenue={response.data['total_revenue']}, "
+                          f"repeat_attendee_rate={response.data['repeat_attendee_rate']}")
+
+        timings = []
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(f"queries: {len(queries)}, median: {statistics.median(timings):.1f} ms, p95: {p95:.1f} ms")
+
+    def create_fixture(self, tickets, buyer_count):
+        organizer = User.objects.create(username='analytics', role=User.Role.ORGANIZER)
+        event = Event.objects.create(organizer=organizer, name='Analytics', location='N/A',
+                                     ticket_limit=tickets * 3, date=now() + timedelta(days=30))
+        other_event = Event.objects.create(organizer=organizer, name='Analytics (2)', location='N/A',
+                                           ticket_limit=tickets, date=now() + timedelta(days=60))
+        ticket_types = [
+            TicketType.objects.create(event=event, type=name, price=Decimal(price), quantity=tickets)
+            for name, price in (('Standard', '100000'), ('VIP', '300000'), ('VVIP', '900000'))
+        ]
+        other_ticket = TicketType.objects.create(event=other_event, type='Standard', price=Decimal('100000'),
+                                                 quantity=tickets)
+
+        User.objects.bulk_create(
+            [User(username=f'analytics_{i}', role=User.Role.ATTENDEE) for i in range(buyer_count)],
+            batch_size=1000
+        )
+        buyers = list(User.objects.filter(username__startswith='analytics_').values_list('id', flat=True))
+
+        # Mỗi đơn 2 vé; thêm 10% đơn thất bại và một phần người mua đã mua vé sự kiện khác
+        orders = []
+        for i in range(tickets // 2):
+            ticket = ticket_types[i % len(ticket_types)]
+            orders.append(Order(user_id=buyers[i % len(buyers)], ticket=ticket, quantity=2,
+                                total_amount=ticket.price * 2, payment_status=Order.PaymentStatus.PAID))
+        for i in range(tickets // 20):
+            orders.append(Order(user_id=buyers[i % len(buyers)], ticket=ticket_types[0], quantity=1,
+                                total_amount=ticket_types[0].price, payment_status=Order.PaymentStatus.FAILED))
+        for i in range(0, len(buyers), 4):
+            orders.append(Order(user_id=buyers[i], ticket=other_ticket, quantity=1,
+                                total_amount=other_ticket.price, payment_status=Order.PaymentStatus.PAID))
+        Order.objects.bulk_create(orders, batch_size=2000)
+
+        paid_orders = Order.objects.filter(ticket__event=event, payment_status=Order.PaymentStatus.PAID) \
+            .values_list('id', 'ticket_id')
+        OrderDetail.objects.bulk_create(
+            [OrderDetail(order_id=order_id, qr_code=f'BENCH_{order_id}_{ticket_id}_{n}')
+             for order_id, ticket_id in paid_orders for n in (1, 2)],
+            batch_size=5000
+        )
+        Review.objects.bulk_create(
+            [Review(user_id=buyer_id, event=event, rating=i % 5 + 1, comment='ok')
+             for i, buyer_id in enumerate(buyers[:2000])],
+            batch_size=1000
+        )
+        # Đơn hàng tạo bằng bulk_create không đi qua inventory nên tính lại bảng tổng hợp doanh số
+        rebuild_sales_rollups()
+        return organizer, event
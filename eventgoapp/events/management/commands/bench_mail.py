@@ -0,0 +1,86 @@
+import socketserver
+import threading
+import time
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from events.mail_delivery import build_message, send_messages
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+    """SMTP server tối giản: chấp nhận mọi lệnh và bỏ nội dung thư, chỉ đếm số thư nhận được."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply('220 localhost ESMTP stand-in')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.received += 1
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPStandInHandler)
+        self.received = 0
+
+
+class Command(BaseCommand):
+    help = 'Benchmark messages/second of per-message send_mail vs pooled mail_delivery against a local SMTP stand-in'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Số người nhận')
+        parser.add_argument('--baseline-limit', type=int, default=1000,
+                            help='Bỏ qua cách gửi từng thư (send_mail) khi số người nhận lớn hơn giá trị này')
+
+    def handle(self, *args, **options):
+        server = SMTPStandIn()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST=host, EMAIL_PORT=port, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', DEFAULT_FROM_EMAIL='bench@eventgo.local',
+            EMAIL_RATE_LIMITS={}, EMAIL_RATE_LIMIT_PER_SECOND=0
+        ):
+            self.stdout.write(f"{'recipients':>10} | {'impl':<16} | {'seconds':>8} | {'msg/s':>8}")
+            for size in options['sizes']:
+                recipients = [f"user{i}@eventgo.local" for i in range(size)]
+
+                if size <= options['baseline_limit']:
+                    started = time.perf_counter()
+                    for recipient in recipients:
+                        send_mail('Benchmark', 'Xin chào', 'bench@eventgo.local', [recipient])
+                    self.report(size, 'send_mail', time.perf_counter() - started)
+
+                messages = [build_message('Benchmark', 'Xin chào', recipient) for recipient in recipients]
+                started = time.perf_counter()
+                send_messages(messages)
+                self.report(size, 'mail_delivery', time.perf_counter() - started)
+
+        server.shutdown()
+        self.stdout.write(f"SMTP stand-in received {server.received} messages")
+
+    def report(self, size, name, elapsed):
+        self.stdout.write(f"{size:>10} | {name:<16} | {elapsed:>8.2f} | {size / elapsed:>8.0f}")
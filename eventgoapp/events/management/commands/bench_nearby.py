@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import CommandError
+from django.utils.timezone import now
+from events import geo
+from events.benchmarks import BenchmarkCommand
+from events.models import User, Event
+
+# Lãnh thổ Việt Nam xấp xỉ bằng một khung bao; một nửa sự kiện tập trung quanh các thành phố lớn
+BOUNDS = (8.6, 23.3, 102.2, 109.4)
+CITIES = ['ha-noi', 'tp-ho-chi-minh', 'da-nang', 'hue', 'can-tho', 'hai-phong', 'nha-trang', 'da-lat']
+CITY_SPREAD_DEGREES = 0.3
+RADII_KM = [1, 5, 10, 25]
+
+
+class Command(BenchmarkCommand):
+    help = 'Benchmark /events/nearby/ radius queries: geohash ranges + exact distance vs a bounding-box scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100000, help='Số sự kiện thử nghiệm')
+        parser.add_argument('--runs', type=int, default=50, help='Số điểm truy vấn mỗi bán kính')
+        parser.add_argument('--target-ms', type=float, default=10.0, help='Mục tiêu p95 (ms) của truy vấn theo geohash')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        organizer = User.objects.create(username='nearby_org', role=User.Role.ORGANIZER)
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        self.create_events(organizer, rng, options)
+        self.stdout.write(f"Created {options['events']} located events in {time.perf_counter() - started:.1f} s")
+        events = Event.objects.filter(active=True, status__in=[Event.EventStatus.UPCOMING,
+                                                               Event.EventStatus.ONGOING])
+        slowest = 0
+        for radius in RADII_KM:
+            indexed, scan, found = [], [], []
+            for _ in range(options['runs']):
+                lat, lng = self.point(rng)
+                nearby = lambda: found.append(len(geo.nearby_event_ids(events, lat, lng, radius)))
+                indexed.append(self.measure(nearby))
+                scan.append(self.measure(lambda: self.scan(events, lat, lng, radius)))
+            slowest = max(slowest, self.p95(indexed))
+            self.stdout.write(
+                f"{radius} km: bounding-box scan p50 {statistics.median(scan):.2f} / p95 {self.p95(scan):.2f} ms, "
+                f"geohash p50 {statistics.median(indexed):.2f} / p95 {self.p95(indexed):.2f} ms, "
+                f"{statistics.mean(found):.1f} results on average"
+            )
+        if slowest > options['target_ms']:
+            raise CommandError(f"Nearby p95 {slowest:.2f} ms exceeds the {options['target_ms']} ms target")
+        self.stdout.write(self.style.SUCCESS(f"✅ Nearby p95 {slowest:.2f} ms within {options['target_ms']} ms"))
+
+    def point(self, rng):
+        if rng.random() < 0.5:
+            lat, lng = geo.GAZETTEER[rng.choice(CITIES)]
+            return rng.gauss(lat, CITY_SPREAD_DEGREES), rng.gauss(lng, CITY_SPREAD_DEGREES)
+        return rng.uniform(*BOUNDS[:2]), rng.uniform(*BOUNDS[2:])
+
+    def create_events(self, organizer, rng, options):
+        start = now() + timedelta(days=1)
+        for offset in range(0, options['events'], 5000):
+            batch = []
+            for i in range(offset, min(offset + 5000, options['events'])):
+                lat, lng = self.point(rng)
+                # bulk_create bỏ qua Event.save() nên geohash được tính trực tiếp
+                batch.append(Event(organizer=organizer, ticket_limit=0, name=f'Nearby {i}', location='N/A',
+                                   date=start + timedelta(minutes=i), latitude=lat, longitude=lng,
+                                   geohash=geo.encode(lat, lng)))
+            Event.objects.bulk_create(batch)
+
+    def scan(self, events, lat, lng, radius):
+        # Cách làm không có chỉ mục không gian: lọc khung bao trên các cột lat/lng rồi tính khoảng cách
+        lat_min, lat_max, lng_min, lng_max = geo.bounding_box(lat, lng, radius)
+        rows = list(events.filter(latitude__range=(lat_min, lat_max), longitude__range=(lng_min, lng_max))
+                    .order_by().values_list('id', 'latitude', 'longitude'))
+        return sorted((geo.distances_km(lat, lng, row[1], row[2]), row[0]) for row in rows)[:20]
+
+    def measure(self, run):
+        started = time.perf_counter()
+        run()
+        return (time.perf_counter() - started) * 1000
+
+    def p95(self, timings):
+        return statistics.quantiles(timings, n=20)[-1]
@@ -0,0 +1,86 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils.timezone import now
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from events import paginators
+from events.benchmarks import BenchmarkCommand
+from events.models import User, Event, Order, Notification
+
+
+class Command(BenchmarkCommand):
+    help = 'Benchmark page 1 vs a deep page: OFFSET page numbers vs keyset cursors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=5000, help='Trang sâu cần đo (theo page_size)')
+        parser.add_argument('--page-size', type=int, default=2, help='Số dòng mỗi trang (ItemPaginator mặc định 2)')
+        parser.add_argument('--runs', type=int, default=20, help='Số lần đo mỗi trang')
+
+    def handle(self, *args, **options):
+        rows = options['page'] * options['page_size']
+        organizer, buyer = self.create_fixture(rows)
+        for label, queryset, paginator_class in (
+            ('events', Event.objects.filter(organizer=organizer), paginators.EventPaginator),
+            ('orders', Order.objects.filter(user=buyer), paginators.RecentFirstPaginator),
+            ('notifications', Notification.objects.filter(user=buyer), paginators.RecentFirstPaginator),
+        ):
+            self.report(label, queryset, paginator_class, options)
+
+    def create_fixture(self, rows):
+        organizer = User.objects.create(username='pagination_org', role=User.Role.ORGANIZER)
+        buyer = User.objects.create(username='pagination_buyer', role=User.Role.ATTENDEE)
+        start = now() + timedelta(days=1)
+        Event.objects.bulk_create([
+            Event(organizer=organizer, name=f'Pagination {i}', location='N/A', ticket_limit=0,
+                  date=start + timedelta(minutes=i // 3))
+            for i in range(rows)
+        ], batch_size=2000)
+        event = Event.objects.filter(organizer=organizer).first()
+        Order.objects.bulk_create(
+            [Order(user=buyer, total_amount=Decimal('1000'), quantity=1) for _ in range(rows)], batch_size=2000
+        )
+        Notification.objects.bulk_create(
+            [Notification(user=buyer, event=event, message=f'Pagination {i}') for i in range(rows)], batch_size=2000
+        )
+        return organizer, buyer
+
+    def measure(self, paginator_class, queryset, params, runs):
+        request = Request(APIRequestFactory().get('/', params))
+        timings, queries = [], []
+        for _ in range(runs):
+            queries = []
+            with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                started = time.perf_counter()
+                page = paginator_class().paginate_queryset(queryset, request)
+                timings.append((time.perf_counter() - started) * 1000)
+        return page, statistics.median(timings), len(queries)
+
+    def report(self, label, queryset, paginator_class, options):
+        page_size, depth, runs = options['page_size'], options['page'], options['runs']
+        paginator = paginator_class()
+        field = paginator.ordering.lstrip('-')
+        ordered = queryset.order_by(paginator.ordering, f'{"-" if paginator.ordering.startswith("-") else ""}id')
+        last = ordered[(depth - 1) * page_size - 1]
+        cursor = paginator.encode_cursor(getattr(last, field), last.pk)
+
+        results = {}
+        for mode, params in (
+            ('offset p1', {'page': 1, 'page_size': page_size}),
+            (f'offset p{depth}', {'page': depth, 'page_size': page_size}),
+            ('keyset p1', {'page_size': page_size}),
+            (f'keyset p{depth}', {'page_size': page_size, 'cursor': cursor}),
+        ):
+            results[mode] = self.measure(paginator_class, queryset, params, runs)
+
+        offset_page = [row.pk for row in results[f'offset p{depth}'][0]]
+        keyset_page = [row.pk for row in results[f'keyset p{depth}'][0]]
+        if offset_page != keyset_page:
+            raise CommandError(f'{label}: keyset page {depth} {keyset_page} differs from offset page {offset_page}')
+
+        self.stdout.write(f"{label}: " + ', '.join(
+            f"{mode} {median:.2f} ms / {queries} queries" for mode, (_, median, queries) in results.items()
+        ))
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from events.utils import generate_qr_image, generate_qr_images
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-ticket latency and PNG size of generate_qr_image vs generate_qr_images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 1000], help='Số vé trong mỗi lượt đo')
+        parser.add_argument('--workers', type=int, default=None, help='Số process của process pool')
+
+    def handle(self, *args, **options):
+        # Tắt log INFO của generate_qr_image để không đo cả thời gian ghi log
+        import logging
+        logging.getLogger('events.utils').setLevel(logging.WARNING)
+
+        self.stdout.write(f"{'tickets':>8} | {'impl':<18} | {'ms/ticket':>10} | {'bytes/ticket':>12}")
+        for size in options['sizes']:
+            qr_codes = [f"QR_{100000 + i}_{2000 + i % 7}_{i % 10 + 1}" for i in range(size)]
+
+            started = time.perf_counter()
+            buffers = [generate_qr_image(qr_code) for qr_code in qr_codes]
+            self.report(size, 'generate_qr_image', time.perf_counter() - started, buffers)
+
+            started = time.perf_counter()
+            buffers = generate_qr_images(qr_codes, workers=options['workers'])
+            self.report(size, 'generate_qr_images', time.perf_counter() - started, buffers)
+
+    def report(self, size, name, elapsed, buffers):
+        total_bytes = sum(buffer.getbuffer().nbytes for buffer in buffers)
+        self.stdout.write(
+            f"{size:>8} | {name:<18} | {elapsed * 1000 / size:>10.3f} | {total_bytes / size:>12.0f}"
+        )
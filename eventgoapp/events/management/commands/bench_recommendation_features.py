@@ -0,0 +1,100 @@
+import time
+from datetime import timedelta
+
+import pandas as pd
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils.timezone import now
+from events.benchmarks import BenchmarkCommand
+from events.models import User, Event, EventCategory, EventTrend
+from events.recommendation_engine import RecommendationEngine
+from events.recommendations import RecommendationModel
+
+
+def legacy_prepare_ml_data(events):
+    """Cách trích đặc trưng cũ: tối đa bốn truy vấn EventTrend cho mỗi sự kiện rồi pandas.get_dummies."""
+    data = []
+    for event in events:
+        data.append({
+            'event_id': event.id,
+            'category': event.category.name if event.category else 'Unknown',
+            'views': EventTrend.objects.filter(event=event).first().views
+            if EventTrend.objects.filter(event=event).exists() else 0,
+            'interest': EventTrend.objects.filter(event=event).first().interest_level
+            if EventTrend.objects.filter(event=event).exists() else 0,
+        })
+    df = pd.DataFrame(data)
+    return pd.get_dummies(df, columns=['category'], prefix='cat')
+
+
+class Command(BenchmarkCommand):
+    help = 'Benchmark recommendation feature extraction: per-event loop vs one values_list query into NumPy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000', help='Số sự kiện thử nghiệm, phân tách bằng dấu phẩy')
+        parser.add_argument('--categories', type=int, default=20, help='Số danh mục thử nghiệm')
+        parser.add_argument('--baseline-limit', type=int, default=2000,
+                            help='Số sự kiện tối đa chạy theo cách cũ (thời gian được ngoại suy cho cả tập)')
+        parser.add_argument('--max-queries', type=int, default=2, help='Số truy vấn tối đa của cách mới')
+
+    def handle(self, *args, **options):
+        organizer = User.objects.create(username='features_org', role=User.Role.ORGANIZER)
+        EventCategory.objects.bulk_create(
+            [EventCategory(name=f'Features {i}') for i in range(options['categories'])]
+        )
+        categories = list(EventCategory.objects.filter(name__startswith='Features '))
+        engine = RecommendationEngine()
+        created = 0
+        for size in sorted(int(value) for value in options['sizes'].split(',')):
+            created = self.create_events(organizer, categories, created, size)
+            events = engine.upcoming_events().filter(organizer=organizer)
+            self.report(engine, events, size, options)
+        self.stdout.write(self.style.SUCCESS('✅ Feature extraction query count is constant'))
+
+    def create_events(self, organizer, categories, created, size):
+        """Bổ sung sự kiện cho tới `size`; 1/5 không có danh mục, 1/4 chưa có EventTrend."""
+        Event.objects.bulk_create([
+            Event(organizer=organizer, name=f'Features {i}', location='N/A', ticket_limit=100,
+                  date=now() + timedelta(days=30), category=None if i % 5 == 0 else categories[i % len(categories)])
+            for i in range(created, size)
+        ], batch_size=2000)
+        new_ids = Event.objects.filter(organizer=organizer).order_by('id').values_list('id', flat=True)[created:size]
+        EventTrend.objects.bulk_create([
+            EventTrend(event_id=event_id, views=event_id * 37 % 50000, interest_level=event_id * 11 % 900)
+            for i, event_id in enumerate(new_ids, start=created) if i % 4
+        ], batch_size=2000)
+        return size
+
+    def report(self, engine, events, size, options):
+        baseline = min(size, options['baseline_limit'])
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            started = time.perf_counter()
+            legacy_prepare_ml_data(events.select_related('category').order_by('id')[:baseline])
+            legacy_seconds = (time.perf_counter() - started) * size / baseline
+        legacy_queries = len(queries) * size / baseline
+
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            started = time.perf_counter()
+            vocabulary = engine.category_vocabulary()
+            event_ids, features, coordinates = engine.prepare_ml_data(events, vocabulary=vocabulary)
+            vector_seconds = time.perf_counter() - started
+        if len(event_ids) != size:
+            raise CommandError(f'{size}: extracted {len(event_ids)} events')
+
+        started = time.perf_counter()
+        model = RecommendationModel.build(event_ids, vocabulary, features, coordinates, now())
+        build_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        model.nearest([vocabulary[1][1]], 5)
+        nearest_ms = (time.perf_counter() - started) * 1000
+
+        estimated = ' (extrapolated)' if baseline < size else ''
+        self.stdout.write(
+            f"{size} events: loop {legacy_seconds:.2f} s / {legacy_queries:.0f} queries{estimated}, "
+            f"vectorized {vector_seconds:.2f} s / {len(queries)} queries, "
+            f"model build {build_seconds:.2f} s, nearest {nearest_ms:.1f} ms"
+        )
+        if len(queries) > options['max_queries']:
+            raise CommandError(f'{size}: {len(queries)} queries exceeds the limit of {options["max_queries"]}')
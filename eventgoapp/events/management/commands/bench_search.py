@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import CommandError
+from django.utils.timezone import now
+from events import search
+from events.benchmarks import BenchmarkCommand
+from events.models import User, Event, EventCategory
+
+WORDS = ['nhạc', 'hội', 'sống', 'đêm', 'rock', 'jazz', 'acoustic', 'lễ', 'hội', 'ẩm', 'thực', 'đường', 'phố',
+         'triển', 'lãm', 'nghệ', 'thuật', 'hội', 'thảo', 'công', 'nghệ', 'khởi', 'nghiệp', 'marathon', 'chạy', 'bộ',
+         'bóng', 'đá', 'giao', 'hữu', 'sân', 'khấu', 'kịch', 'múa', 'rối', 'nước', 'điện', 'ảnh', 'thiếu', 'nhi',
+         'mùa', 'hè', 'xuân', 'trung', 'thu', 'tết', 'cà', 'phê', 'sách', 'workshop', 'yoga', 'thiền', 'du', 'lịch']
+CITIES = ['Hà Nội', 'TP. Hồ Chí Minh', 'Đà Nẵng', 'Huế', 'Cần Thơ', 'Hải Phòng', 'Nha Trang', 'Đà Lạt']
+CATEGORIES = ['Âm nhạc', 'Thể thao', 'Hội thảo', 'Nghệ thuật', 'Ẩm thực', 'Giáo dục']
+QUERIES = {
+    'exact': ['nhac', 'da nang', 'marathon', 'am thuc', 'hoi thao cong nghe'],
+    'prefix': ['nh', 'mara', 'da l', 'hoi tha', 'cong ng'],
+    'multi-word': ['nhac rock ha noi', 'le hoi am thuc hue', 'chay bo da lat', 'trien lam nghe thuat'],
+    # Chỉ 1/RARE_EVERY sự kiện chứa các từ này: icontains phải quét gần hết bảng mới đủ 20 dòng
+    'rare': ['gala', 'gala tu thien', 'gal', 'tu thien da nang'],
+}
+RARE_EVERY = 2000
+
+
+class Command(BenchmarkCommand):
+    help = 'Benchmark event search: name__icontains scan vs the inverted search index (p50/p95 per query kind)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100000, help='Số sự kiện thử nghiệm')
+        parser.add_argument('--runs', type=int, default=20, help='Số lần đo mỗi câu tìm kiếm')
+        parser.add_argument('--target-ms', type=float, default=20.0, help='Mục tiêu p95 (ms) của chỉ mục')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        organizer = User.objects.create(username='search_org', role=User.Role.ORGANIZER)
+        categories = [EventCategory.objects.create(name=name) for name in CATEGORIES]
+        started = time.perf_counter()
+        self.create_events(organizer, categories, options)
+        self.stdout.write(f"Indexed {options['events']} events in {time.perf_counter() - started:.1f} s")
+        events = Event.objects.filter(active=True).order_by('date', 'id')
+        slowest = 0
+        for kind, queries in QUERIES.items():
+            scan, indexed, ranked = [], [], []
+            for query in queries:
+                for _ in range(options['runs']):
+                    scan.append(self.measure(lambda: list(events.filter(name__icontains=query)[:20])))
+                    indexed.append(self.measure(lambda: list(search.filter_events(events, query)[:20])))
+                    ranked.append(self.measure(lambda: search.search_events(events, query, limit=20)))
+            slowest = max(slowest, self.p95(indexed), self.p95(ranked))
+            self.stdout.write(
+                f"{kind}: icontains p50 {statistics.median(scan):.2f} / p95 {self.p95(scan):.2f} ms, "
+                f"index filter p50 {statistics.median(indexed):.2f} / p95 {self.p95(indexed):.2f} ms, "
+                f"ranked p50 {statistics.median(ranked):.2f} / p95 {self.p95(ranked):.2f} ms"
+            )
+        if slowest > options['target_ms']:
+            raise CommandError(f"Search p95 {slowest:.2f} ms exceeds the {options['target_ms']} ms target")
+        self.stdout.write(self.style.SUCCESS(f"✅ Search p95 {slowest:.2f} ms within {options['target_ms']} ms"))
+
+    def create_events(self, organizer, categories, options):
+        rng = random.Random(options['seed'])
+        start = now() + timedelta(days=1)
+        for offset in range(0, options['events'], 2000):
+            batch = []
+            for i in range(offset, min(offset + 2000, options['events'])):
+                city = rng.choice(CITIES)
+                rare = ' Gala từ thiện' if i % RARE_EVERY == 0 else ''
+                batch.append(Event(
+                    organizer=organizer, category=rng.choice(categories), ticket_limit=0,
+                    name=f"{' '.join(rng.sample(WORDS, 4)).capitalize()}{rare} {city} {i}",
+                    description=f"<p>{' '.join(rng.choices(WORDS, k=30))} &amp; <strong>{city}</strong></p>",
+                    location=f"{rng.randint(1, 300)} {rng.choice(WORDS)}, {city}",
+                    date=start + timedelta(minutes=i),
+                ))
+            Event.objects.bulk_create(batch)
+            # bulk_create bỏ qua Event.save() nên chỉ mục được cập nhật trực tiếp
+            search.index_events(Event.objects.filter(name__in=[event.name for event in batch])
+                                .values_list('id', flat=True))
+
+    def measure(self, run):
+        started = time.perf_counter()
+        run()
+        return (time.perf_counter() - started) * 1000
+
+    def p95(self, timings):
+        return statistics.quantiles(timings, n=20)[-1]
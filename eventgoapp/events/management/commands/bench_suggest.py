@@ -0,0 +1,72 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import CommandError
+from django.utils.timezone import now
+from redis.exceptions import RedisError
+from events import suggestions
+from events.benchmarks import BenchmarkCommand
+from events.models import User, Event
+from events.trend_counters import redis_client
+
+WORDS = ['Đêm', 'nhạc', 'Rock', 'Jazz', 'Lễ', 'hội', 'ẩm', 'thực', 'Triển', 'lãm', 'nghệ', 'thuật', 'Hội', 'thảo',
+         'công', 'nghệ', 'Marathon', 'bóng', 'đá', 'kịch', 'múa', 'rối', 'nước', 'điện', 'ảnh', 'mùa', 'hè', 'Tết',
+         'cà', 'phê', 'sách', 'Workshop', 'Yoga', 'thiền', 'du', 'lịch', 'khởi', 'nghiệp', 'thiếu', 'nhi']
+VENUES = ['Nhà hát lớn, Hà Nội', 'Sân vận động Mỹ Đình, Hà Nội', 'Nhà văn hóa Thanh niên, TP. Hồ Chí Minh',
+          'Cung thể thao Tiên Sơn, Đà Nẵng', 'Trung tâm Hội nghị, Huế', 'Quảng trường Lâm Viên, Đà Lạt']
+QUERIES = ['d', 'de', 'dem', 'dem nh', 'nhac r', 'ha', 'ha noi', 'le hoi am', 'work', 'tet', 'cung the', 'xyz']
+
+
+class Command(BenchmarkCommand):
+    help = 'Benchmark /events/suggest/ lookups (ZRANGEBYLEX + HMGET) and the Redis memory used by the index'
+    requires_redis = True
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100000, help='Số sự kiện thử nghiệm')
+        parser.add_argument('--runs', type=int, default=200, help='Số lần đo mỗi câu gõ')
+        parser.add_argument('--target-ms', type=float, default=5.0, help='Mục tiêu p95 (ms)')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        client = redis_client()
+        if client is None:
+            raise CommandError('The suggestion index needs the Redis cache backend')
+        organizer = User.objects.create(username='suggest_org', role=User.Role.ORGANIZER)
+        self.create_events(organizer, options)
+        started = time.perf_counter()
+        stats = suggestions.ensure_index(client, force=True)
+        self.stdout.write(f"Rebuilt index {stats} in {time.perf_counter() - started:.1f} s, "
+                          f"{client.zcard(suggestions.INDEX_KEY)} entries, {self.memory(client)}")
+
+        timings = []
+        for query in QUERIES:
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                suggestions.suggest(query)
+                timings.append((time.perf_counter() - started) * 1000)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        self.stdout.write(f"suggest: p50 {statistics.median(timings):.3f} ms / p95 {p95:.3f} ms "
+                          f"over {len(timings)} lookups")
+        if p95 > options['target_ms']:
+            raise CommandError(f"Suggest p95 {p95:.3f} ms exceeds the {options['target_ms']} ms target")
+        self.stdout.write(self.style.SUCCESS(f"✅ Suggest p95 {p95:.3f} ms within {options['target_ms']} ms"))
+
+    def create_events(self, organizer, options):
+        rng = random.Random(options['seed'])
+        start = now() + timedelta(days=1)
+        Event.objects.bulk_create([
+            Event(organizer=organizer, ticket_limit=0, date=start + timedelta(minutes=i),
+                  name=f"{' '.join(rng.sample(WORDS, 4))} {i}", location=rng.choice(VENUES))
+            for i in range(options['events'])
+        ], batch_size=2000)
+
+    def memory(self, client):
+        try:
+            used = sum(client.memory_usage(key, samples=0) or 0 for key in (
+                suggestions.INDEX_KEY, suggestions.NAMES_KEY, suggestions.VENUE_REFS_KEY
+            ))
+        except RedisError:
+            return 'memory usage unavailable'
+        return f"{used / 2 ** 20:.1f} MB in Redis"
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from events.loyalty import reconcile_loyalty
+
+
+class Command(BaseCommand):
+    help = 'Recompute customer loyalty totals from paid orders in batches and report rows that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số khách hàng mỗi lô')
+        parser.add_argument('--fix', action='store_true', help='Ghi lại các dòng sai lệch')
+
+    def handle(self, *args, **options):
+        stats = reconcile_loyalty(batch_size=options['batch_size'], fix=options['fix'])
+        self.stdout.write(f"Checked {stats['users']} users: {stats['mismatched']} mismatched, {stats['fixed']} fixed")
+        if stats['mismatched'] and not options['fix']:
+            raise CommandError(f"{stats['mismatched']} loyalty rows are out of sync; rerun with --fix")
+        self.stdout.write(self.style.SUCCESS('✅ Loyalty totals match paid orders'))
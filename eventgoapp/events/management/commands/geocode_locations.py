@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from events.geo import geocode_missing, GEOCODE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Fill missing event and user coordinates from Google Maps links and the built-in gazetteer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resolve-links', action='store_true',
+                            help='Mở link rút gọn (maps.app.goo.gl) qua mạng để đọc tọa độ trong link đích')
+        parser.add_argument('--batch-size', type=int, default=GEOCODE_BATCH_SIZE, help='Số dòng xử lý mỗi lô')
+
+    def handle(self, *args, **options):
+        stats = geocode_missing(resolve_links=options['resolve_links'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Geocoded locations: {stats}"))
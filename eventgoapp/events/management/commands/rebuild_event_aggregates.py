@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from events.aggregates import rebuild_event_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized review and organizer event counts from source tables'
+
+    def handle(self, *args, **options):
+        stats = rebuild_event_aggregates()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Rebuilt aggregates for {stats['events']} events and {stats['users']} users"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from events.sales_rollups import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Backfill the event/organizer/category sales rollup tables from orders'
+
+    def handle(self, *args, **options):
+        stats = rebuild_sales_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Rebuilt {stats['eventsalesdaily']} event/day, {stats['organizersalesmonthly']} organizer/month "
+            f"and {stats['categorysalesmonthly']} category/month rollup rows"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from events.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the event search index (vocabulary and postings) from all events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Số sự kiện được đánh chỉ mục mỗi lô')
+
+    def handle(self, *args, **options):
+        stats = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt event search index: {stats}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+from events.suggestions import ensure_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search-as-you-type suggestion index in Redis from events and categories'
+
+    def handle(self, *args, **options):
+        stats = ensure_index(force=True)
+        if stats is None:
+            raise CommandError('The suggestion index needs the Redis cache backend')
+        if stats.get('skipped'):
+            raise CommandError('Another process is rebuilding the suggestion index')
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt suggestion index: {stats}"))
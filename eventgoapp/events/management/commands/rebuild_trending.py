@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+from events.trending import rebuild_boards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the trending leaderboards in Redis from EventTrend'
+
+    def handle(self, *args, **options):
+        stats = rebuild_boards()
+        if stats is None:
+            raise CommandError('Trending leaderboards need the Redis cache backend')
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt trending leaderboards: {stats}"))
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_status', 'expiration_time'], name='order_status_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_order_status_expiry_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='fulfilled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
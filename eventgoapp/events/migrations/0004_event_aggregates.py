@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:51
+
+from django.db import migrations, models
+from django.db.models import Count, Sum, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_aggregates(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    Review = apps.get_model('events', 'Review')
+    User = apps.get_model('events', 'User')
+
+    review_stats = Review.objects.filter(event=OuterRef('pk'), active=True).order_by() \
+        .values('event').annotate(count=Count('id'), total=Sum('rating'))
+    Event.objects.update(
+        review_count=Coalesce(Subquery(review_stats.values('count')), Value(0)),
+        rating_total=Coalesce(Subquery(review_stats.values('total')), Value(0))
+    )
+
+    event_counts = Event.objects.filter(organizer=OuterRef('pk'), active=True).order_by() \
+        .values('organizer').annotate(count=Count('id'))
+    User.objects.update(organized_event_count=Coalesce(Subquery(event_counts.values('count')), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_order_fulfilled_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='organized_event_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
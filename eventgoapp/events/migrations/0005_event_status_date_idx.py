@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:52
+
+from django.db import migrations, models
+from django.utils.timezone import now
+
+
+def sync_statuses(apps, schema_editor):
+    # Trước đây trạng thái chỉ được tính lại khi đọc danh sách; đồng bộ một lần trước khi tác vụ định kỳ chạy
+    Event = apps.get_model('events', 'Event')
+    current_time = now()
+    Event.objects.filter(status='upcoming', date__lt=current_time).update(status='completed', updated_at=current_time)
+    Event.objects.filter(status='completed', date__gt=current_time).update(status='upcoming', updated_at=current_time)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['status', 'date'], name='event_status_date_idx'),
+        ),
+        migrations.RunPython(sync_statuses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_status_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventEngagement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], default='hour', max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('interest', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('reviews', models.PositiveIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='engagement', to='events.event')),
+            ],
+            options={
+                'verbose_name': 'Event Engagement',
+                'verbose_name_plural': 'Event Engagement',
+                'ordering': ['bucket_start'],
+                'indexes': [models.Index(fields=['period', 'bucket_start'], name='engagement_period_start_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'period', 'bucket_start'), name='unique_event_engagement_bucket')],
+            },
+        ),
+    ]
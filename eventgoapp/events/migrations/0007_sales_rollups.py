@@ -0,0 +1,72 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_event_engagement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySalesMonthly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paid_orders', models.PositiveIntegerField(default=0)),
+                ('failed_orders', models.PositiveIntegerField(default=0)),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('month', models.DateField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_sales', to='events.eventcategory')),
+            ],
+            options={
+                'verbose_name': 'Category Sales (monthly)',
+                'verbose_name_plural': 'Category Sales (monthly)',
+                'ordering': ['month'],
+                'constraints': [models.UniqueConstraint(fields=('category', 'month'), name='unique_category_sales_month')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EventSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paid_orders', models.PositiveIntegerField(default=0)),
+                ('failed_orders', models.PositiveIntegerField(default=0)),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('day', models.DateField()),
+                ('purchase_seconds', models.FloatField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='events.event')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='events.tickettype')),
+            ],
+            options={
+                'verbose_name': 'Event Sales (daily)',
+                'verbose_name_plural': 'Event Sales (daily)',
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['event', 'day'], name='event_sales_event_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ticket', 'day'), name='unique_event_sales_ticket_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrganizerSalesMonthly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paid_orders', models.PositiveIntegerField(default=0)),
+                ('failed_orders', models.PositiveIntegerField(default=0)),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('month', models.DateField()),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Organizer Sales (monthly)',
+                'verbose_name_plural': 'Organizer Sales (monthly)',
+                'ordering': ['month'],
+                'constraints': [models.UniqueConstraint(fields=('organizer', 'month'), name='unique_organizer_sales_month')],
+            },
+        ),
+    ]
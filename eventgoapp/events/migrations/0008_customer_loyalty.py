@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerLoyalty',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tickets_bought', models.PositiveIntegerField(default=0)),
+                ('rank', models.CharField(choices=[('bronze', 'Đồng'), ('silver', 'Bạc'), ('gold', 'Vàng'), ('none', 'Không có hạng')], default='none', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='loyalty', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Customer Loyalty',
+                'verbose_name_plural': 'Customer Loyalty',
+                'ordering': ['-total_spent'],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, unique=True)),
+                ('document_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Search Term',
+                'verbose_name_plural': 'Search Terms',
+                'ordering': ['term'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EventSearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.FloatField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='events.event')),
+                ('term', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='events.searchterm')),
+            ],
+            options={
+                'verbose_name': 'Event Search Posting',
+                'verbose_name_plural': 'Event Search Postings',
+                'indexes': [models.Index(fields=['term', '-weight', 'event'], name='search_posting_term_weight_idx')],
+                'constraints': [models.UniqueConstraint(fields=('term', 'event'), name='unique_event_search_posting')],
+            },
+        ),
+    ]
@@ -5,7 +5,8 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from ckeditor.fields import RichTextField
 from django.utils.timezone import now
-from django.core.mail import send_mail
+
+from . import response_cache
 
 class User(AbstractUser):
     class Role(models.TextChoices):
@@ -19,10 +20,31 @@ class User(AbstractUser):
     avatar = CloudinaryField('avatar', blank=True, null=True)
     google_credentials = models.JSONField(null=True, blank=True)
     push_token = models.CharField(max_length=255, blank=True, null=True)
+    # Số sự kiện đang hoạt động do người dùng tổ chức, cập nhật trong Event.save()/delete()
+    organized_event_count = models.PositiveIntegerField(default=0)
+    # Tọa độ suy ra từ address (bảng GAZETTEER), dùng làm đặc trưng khoảng cách khi gợi ý sự kiện
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.username}"
 
+    def save(self, *args, **kwargs):
+        from .geo import coordinates_from_gazetteer
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'address' in update_fields:
+            old = None
+            if not self._state.adding:
+                old = User.objects.filter(pk=self.pk).values_list('address', 'latitude', 'longitude').first()
+            # Chỉ geocode lại khi địa chỉ đổi và tọa độ không được gán tay cùng lúc
+            stored = old[1:] if old else (None, None)
+            if (old is None or old[0] != self.address) and (self.latitude, self.longitude) == stored:
+                self.latitude, self.longitude = coordinates_from_gazetteer(self.address) or (None, None)
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'latitude', 'longitude'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "User"
         verbose_name_plural = "Users"
@@ -43,6 +65,30 @@ class EventCategory(BaseModel):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from .search import schedule_index
+        from .suggestions import refresh_category
+
+        renamed = not self._state.adding and not EventCategory.objects.filter(pk=self.pk, name=self.name).exists()
+        super().save(*args, **kwargs)
+        if renamed:
+            # Tên danh mục nằm trong chỉ mục tìm kiếm của mọi sự kiện thuộc danh mục
+            schedule_index(self.events.values_list('id', flat=True))
+        refresh_category(self.pk, self.name)
+        response_cache.invalidate(response_cache.SCOPE_CATEGORIES, response_cache.SCOPE_EVENTS)
+
+    def delete(self, *args, **kwargs):
+        from .search import schedule_index
+        from .suggestions import refresh_category
+
+        category_id = self.pk
+        event_ids = list(self.events.values_list('id', flat=True))
+        result = super().delete(*args, **kwargs)
+        schedule_index(event_ids)
+        refresh_category(category_id, None)
+        response_cache.invalidate(response_cache.SCOPE_CATEGORIES, response_cache.SCOPE_EVENTS)
+        return result
+
     class Meta:
         verbose_name = "Event Category"
         verbose_name_plural = "Event Categories"
@@ -62,13 +108,25 @@ class Event(BaseModel):
     date = models.DateTimeField(default=now)
     location = models.CharField(max_length=255)
     google_maps_link = models.URLField(blank=True, null=True, max_length=1000)
+    # Tọa độ địa điểm (từ google_maps_link hoặc bảng GAZETTEER, xem events/geo.py) và geohash của chúng:
+    # các sự kiện gần nhau có geohash chung tiền tố nên tìm theo bán kính là vài lần quét khoảng trên chỉ mục
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False)
     ticket_limit = models.PositiveIntegerField(null=True, blank=True, default=0)
     status = models.CharField(max_length=20, choices=EventStatus.choices, default=EventStatus.UPCOMING)
     image = CloudinaryField('image', blank=True, null=True)
+    # Tổng hợp đánh giá đang hoạt động, cập nhật trong Review.save()/delete()
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
 
+    @property
+    def average_rating(self):
+        return self.rating_total / self.review_count if self.review_count else 0
+
     def update_status(self):
         current_time = now()
         if self.date < current_time and self.status == self.EventStatus.UPCOMING:
@@ -76,37 +134,114 @@ class Event(BaseModel):
         elif self.date > current_time and self.status == self.EventStatus.COMPLETED:
             self.status = self.EventStatus.UPCOMING
 
+    @classmethod
+    def sync_statuses(cls):
+        """
+        Áp dụng quy tắc của update_status() cho toàn bộ bảng bằng hai câu UPDATE theo chỉ mục (status, date);
+        id của các sự kiện thay đổi được đọc trước để làm mới cache response và gợi ý tìm kiếm của chúng.
+
+        Returns:
+            (completed, reopened): số sự kiện chuyển sang COMPLETED và quay lại UPCOMING.
+        """
+        from .suggestions import refresh_events
+
+        current_time = now()
+        completed_ids = list(cls.objects.filter(status=cls.EventStatus.UPCOMING, date__lt=current_time)
+                             .values_list('id', flat=True))
+        reopened_ids = list(cls.objects.filter(status=cls.EventStatus.COMPLETED, date__gt=current_time)
+                            .values_list('id', flat=True))
+        completed = cls.objects.filter(id__in=completed_ids, status=cls.EventStatus.UPCOMING, date__lt=current_time) \
+            .update(status=cls.EventStatus.COMPLETED, updated_at=current_time)
+        reopened = cls.objects.filter(id__in=reopened_ids, status=cls.EventStatus.COMPLETED, date__gt=current_time) \
+            .update(status=cls.EventStatus.UPCOMING, updated_at=current_time)
+        if completed or reopened:
+            response_cache.invalidate_events(completed_ids + reopened_ids)
+            refresh_events(completed_ids + reopened_ids)
+        return completed, reopened
+
     def save(self, *args, **kwargs):
+        from .aggregates import apply_event_change
+        from .search import schedule_index
+        from .suggestions import refresh_events
+
         self.update_status()
+        update_fields = kwargs.get('update_fields')
+        tracked = update_fields is None or {'active', 'organizer', 'organizer_id'} & set(update_fields)
+        located = update_fields is None or \
+            {'location', 'google_maps_link', 'latitude', 'longitude'} & set(update_fields)
+        old = None
+        stored_place = (None, None, None, None)
+        if (tracked or located) and not self._state.adding:
+            row = Event.objects.filter(pk=self.pk).values_list(
+                'organizer_id', 'active', 'location', 'google_maps_link', 'latitude', 'longitude'
+            ).first()
+            if row:
+                old, stored_place = row[:2], row[2:]
+        if located:
+            self._locate(stored_place)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'latitude', 'longitude', 'geohash'}
         super().save(*args, **kwargs)
+        if tracked:
+            apply_event_change(old, (self.organizer_id, self.active))
+        if update_fields is None or {'name', 'description', 'location', 'category', 'category_id'} & set(update_fields):
+            schedule_index([self.pk])
+        if update_fields is None or {'name', 'location', 'status', 'active'} & set(update_fields):
+            refresh_events([self.pk])
+        response_cache.invalidate_events([self.pk])
+
+    def _locate(self, stored_place):
+        """
+        Geocode lại (không gọi mạng) khi địa điểm hoặc link bản đồ đổi mà tọa độ không được gán tay cùng lúc;
+        link rút gọn và địa chỉ lạ để tọa độ trống cho lệnh geocode_locations xử lý.
+        """
+        from . import geo
+
+        location, link, latitude, longitude = stored_place
+        moved = (location, link) != (self.location, self.google_maps_link)
+        if moved and (self.latitude, self.longitude) == (latitude, longitude):
+            self.latitude, self.longitude = geo.geocode(self.google_maps_link, self.location) or (None, None)
+        has_coordinates = self.latitude is not None and self.longitude is not None
+        self.geohash = geo.encode(self.latitude, self.longitude) if has_coordinates else None
+
+    def delete(self, *args, **kwargs):
+        from .aggregates import apply_event_change
+        from .search import unindex_event
+        from .suggestions import refresh_events
+
+        state = (self.organizer_id, self.active)
+        event_id = self.pk
+        unindex_event(event_id)
+        result = super().delete(*args, **kwargs)
+        refresh_events([event_id])
+        apply_event_change(state, None)
+        response_cache.invalidate_events([event_id])
+        return result
 
     def send_notifications(self):
+        from .mail_delivery import fan_out_mail
+        from .notification_fanout import fan_out_notifications, AUDIENCE_TICKET_HOLDERS
 
-        attendees = OrderDetail.objects.filter(ticket__event=self, order__payment_status=Order.PaymentStatus.PAID).values_list('order__user', flat=True)
-        users = User.objects.filter(id__in=attendees)
-
-        for user in users:
-            if send_mail(
-                subject=f"Thông báo: Upcoming Event - {self.name}",
-                message=f"Gửi {user.username},\n\nMail này thông báo về sự kiện sắp diễn ra '{self.name}' diễn ra vào {self.date}.",
-                from_email="nhanhgon24@gmail.com",
-                recipient_list=[user.email],
-                fail_silently=False,
+        recipient_count = fan_out_mail(
+            self.id,
+            AUDIENCE_TICKET_HOLDERS,
+            subject=f"Thông báo: Upcoming Event - {self.name}",
+            body_template=f"Gửi {{username}},\n\nMail này thông báo về sự kiện sắp diễn ra '{self.name}' diễn ra vào {self.date}."
+        )
+        print(f"Đã xếp hàng email nhắc lịch cho {recipient_count} người dùng.")
 
-            ):
-                print(f"Email gửi đến {user.username} ({user.email})")
-
-            if Notification.objects.create(
-                user=user,
-                event=self,
-                message=f"Nhắc nhở: Sự kiện '{self.name}' sắp diễn ra!"
-            ):
-                print(f"Đã tạo thông báo cho {len(users)} người dùng.")
+        fan_out_notifications(self.id, f"Nhắc nhở: Sự kiện '{self.name}' sắp diễn ra!", AUDIENCE_TICKET_HOLDERS)
 
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['name', 'date'], name='unique_event_name_date')
         ]
+        indexes = [
+            models.Index(fields=['status', 'date'], name='event_status_date_idx'),
+            models.Index(fields=['date', 'id'], name='event_date_id_idx'),
+            # Chứa cả tọa độ để bước lọc theo vùng của /events/nearby/ chỉ đọc chỉ mục
+            models.Index(fields=['geohash', 'latitude', 'longitude'], name='event_geohash_idx'),
+        ]
         verbose_name = "Event"
         verbose_name_plural = "Events"
         ordering = ['date']
@@ -133,6 +268,12 @@ class TicketType(BaseModel):
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
+        response_cache.invalidate_events([self.event_id])
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        response_cache.invalidate_events([self.event_id])
+        return result
 
     def __str__(self):
         return f"{self.type} - {self.event.name}"
@@ -160,6 +301,7 @@ class Order(BaseModel):
     payment_method = models.CharField(max_length=20, choices=PaymentMethod.choices, null=True, blank=True)
     quantity = models.PositiveIntegerField(default=1)
     expiration_time = models.DateTimeField(null=True, blank=True)
+    fulfilled_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
@@ -173,6 +315,10 @@ class Order(BaseModel):
         verbose_name = "Order"
         verbose_name_plural = "Orders"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['payment_status', 'expiration_time'], name='order_status_expiry_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ]
 
 
 class OrderDetail(BaseModel):
@@ -231,10 +377,32 @@ class Review(BaseModel):
     def __str__(self):
         return f"Review by {self.user.username} for {self.event.name}"
 
+    def save(self, *args, **kwargs):
+        from .aggregates import apply_review_change
+
+        old = None
+        if not self._state.adding:
+            old = Review.objects.filter(pk=self.pk).values_list('event_id', 'active', 'rating').first()
+        super().save(*args, **kwargs)
+        apply_review_change(old, (self.event_id, self.active, self.rating))
+        response_cache.invalidate_events([self.event_id] + ([old[0]] if old else []))
+
+    def delete(self, *args, **kwargs):
+        from .aggregates import apply_review_change
+
+        state = (self.event_id, self.active, self.rating)
+        result = super().delete(*args, **kwargs)
+        apply_review_change(state, None)
+        response_cache.invalidate_events([self.event_id])
+        return result
+
     class Meta:
         verbose_name = "Review"
         verbose_name_plural = "Reviews"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['event', 'created_at', 'id'], name='review_event_created_idx'),
+        ]
 
 
 class Notification(BaseModel):
@@ -250,6 +418,9 @@ class Notification(BaseModel):
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='notification_user_created_idx'),
+        ]
 
 
 class EventTrend(BaseModel):
@@ -274,3 +445,152 @@ class EventTrend(BaseModel):
         ordering = ['-views']
 
 
+class EventEngagement(models.Model):
+    """Số lượt tương tác của sự kiện theo từng giờ; dữ liệu giờ cũ được gộp thành theo ngày."""
+    class Period(models.TextChoices):
+        HOUR = 'hour', 'Hour'
+        DAY = 'day', 'Day'
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='engagement')
+    period = models.CharField(max_length=4, choices=Period.choices, default=Period.HOUR)
+    bucket_start = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    interest = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    reviews = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.event_id} {self.period} {self.bucket_start:%Y-%m-%d %H:%M}: {self.views} lượt xem"
+
+    class Meta:
+        verbose_name = "Event Engagement"
+        verbose_name_plural = "Event Engagement"
+        ordering = ['bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'period', 'bucket_start'], name='unique_event_engagement_bucket')
+        ]
+        indexes = [
+            models.Index(fields=['period', 'bucket_start'], name='engagement_period_start_idx'),
+        ]
+
+
+
+
+class SalesRollup(models.Model):
+    """Tổng hợp doanh số cộng dồn khi đơn hàng chuyển sang PAID/FAILED, tính theo ngày tạo đơn."""
+    paid_orders = models.PositiveIntegerField(default=0)
+    failed_orders = models.PositiveIntegerField(default=0)
+    tickets_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class EventSalesDaily(SalesRollup):
+    """Doanh số theo loại vé và ngày; cột event được lưu kèm để gộp theo sự kiện."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='daily_sales')
+    ticket = models.ForeignKey(TicketType, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+    # Tổng thời gian từ lúc tạo đến lúc thanh toán của các đơn PAID, dùng để tính thời gian mua trung bình
+    purchase_seconds = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"{self.event_id} {self.day}: {self.tickets_sold} vé"
+
+    class Meta:
+        verbose_name = "Event Sales (daily)"
+        verbose_name_plural = "Event Sales (daily)"
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['ticket', 'day'], name='unique_event_sales_ticket_day')
+        ]
+        indexes = [
+            models.Index(fields=['event', 'day'], name='event_sales_event_day_idx'),
+        ]
+
+
+class OrganizerSalesMonthly(SalesRollup):
+    organizer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_sales')
+    month = models.DateField()
+
+    def __str__(self):
+        return f"{self.organizer_id} {self.month:%Y-%m}: {self.revenue}"
+
+    class Meta:
+        verbose_name = "Organizer Sales (monthly)"
+        verbose_name_plural = "Organizer Sales (monthly)"
+        ordering = ['month']
+        constraints = [
+            models.UniqueConstraint(fields=['organizer', 'month'], name='unique_organizer_sales_month')
+        ]
+
+
+class CategorySalesMonthly(SalesRollup):
+    category = models.ForeignKey(EventCategory, on_delete=models.CASCADE, related_name='monthly_sales')
+    month = models.DateField()
+
+    def __str__(self):
+        return f"{self.category_id} {self.month:%Y-%m}: {self.revenue}"
+
+    class Meta:
+        verbose_name = "Category Sales (monthly)"
+        verbose_name_plural = "Category Sales (monthly)"
+        ordering = ['month']
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'month'], name='unique_category_sales_month')
+        ]
+
+
+class CustomerLoyalty(models.Model):
+    """Tổng chi tiêu, số vé đã mua và hạng hiện tại của khách hàng; cộng dồn khi đơn hàng chuyển sang PAID."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='loyalty')
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tickets_bought = models.PositiveIntegerField(default=0)
+    rank = models.CharField(max_length=20, choices=Discount.LoyaltyRank.choices, default=Discount.LoyaltyRank.NONE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.rank}"
+
+    class Meta:
+        verbose_name = "Customer Loyalty"
+        verbose_name_plural = "Customer Loyalty"
+        ordering = ['-total_spent']
+
+
+class SearchTerm(models.Model):
+    """Từ vựng của chỉ mục tìm kiếm sự kiện (chữ thường, đã bỏ dấu) và số sự kiện chứa từ đó."""
+    term = models.CharField(max_length=64, unique=True)
+    document_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.term}: {self.document_count}"
+
+    class Meta:
+        verbose_name = "Search Term"
+        verbose_name_plural = "Search Terms"
+        ordering = ['term']
+
+
+class EventSearchPosting(models.Model):
+    """Một từ xuất hiện trong sự kiện, với trọng số theo trường (tên, danh mục, địa điểm, mô tả) và số lần xuất hiện."""
+    # Các chỉ mục ghép bên dưới đều bắt đầu bằng term nên không cần chỉ mục riêng cho khóa ngoại này
+    term = models.ForeignKey(SearchTerm, on_delete=models.CASCADE, related_name='postings', db_index=False)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='search_postings')
+    weight = models.FloatField()
+
+    def __str__(self):
+        return f"{self.term_id} -> {self.event_id}: {self.weight}"
+
+    class Meta:
+        verbose_name = "Event Search Posting"
+        verbose_name_plural = "Event Search Postings"
+        constraints = [
+            # Kiểm tra một sự kiện có chứa từ (EXISTS) và đọc trọng số của các sự kiện ứng viên khi xếp hạng
+            models.UniqueConstraint(fields=['term', 'event'], name='unique_event_search_posting')
+        ]
+        indexes = [
+            # Danh sách sự kiện của một từ, trọng số cao nhất trước (champion list khi xếp hạng)
+            models.Index(fields=['term', '-weight', 'event'], name='search_posting_term_weight_idx'),
+        ]
@@ -0,0 +1,117 @@
+import logging
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import User, Order, Notification
+
+logger = logging.getLogger(__name__)
+
+AUDIENCE_ATTENDEES = 'attendees'
+AUDIENCE_TICKET_HOLDERS = 'ticket_holders'
+
+PROGRESS_TIMEOUT = 24 * 3600
+
+
+def recipient_ids(event_id, audience):
+    """
+    Queryset id người nhận của một đợt thông báo.
+
+    - AUDIENCE_ATTENDEES: tất cả attendee đang hoạt động (sự kiện mới).
+    - AUDIENCE_TICKET_HOLDERS: người đã thanh toán vé của sự kiện (cập nhật, hủy, nhắc lịch).
+    """
+    if audience == AUDIENCE_ATTENDEES:
+        return User.objects.filter(role=User.Role.ATTENDEE, is_active=True).order_by('id').values_list('id', flat=True)
+    if audience == AUDIENCE_TICKET_HOLDERS:
+        return Order.objects.filter(
+            ticket__event_id=event_id,
+            payment_status=Order.PaymentStatus.PAID
+        ).order_by('user_id').values_list('user_id', flat=True).distinct()
+    raise ValueError(f"Audience không hợp lệ: {audience}")
+
+
+def iter_recipient_chunks(event_id, audience, chunk_size):
+    """Đọc id người nhận theo luồng bằng iterator() và gom thành từng lô `chunk_size` phần tử."""
+    ids = recipient_ids(event_id, audience).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(ids, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def fan_out_notifications(event_id, message, audience):
+    """Lên lịch tạo thông báo trong app cho người nhận sau khi transaction hiện tại commit."""
+    from .tasks import fan_out_event_notifications
+    transaction.on_commit(lambda: fan_out_event_notifications.delay(event_id, message, audience))
+
+
+def dispatch_notification_chunks(fanout_id, event_id, message, audience, chunk_size=None, on_progress=None):
+    """
+    Chia người nhận thành từng lô và gửi mỗi lô thành một subtask Celery chạy song song.
+
+    Returns:
+        Tổng số người nhận đã được chia lô.
+    """
+    from .tasks import create_notification_chunk
+
+    chunk_size = chunk_size or settings.NOTIFICATION_FANOUT_CHUNK_SIZE
+    cache.set(_progress_key(fanout_id, 'created'), 0, PROGRESS_TIMEOUT)
+
+    total = 0
+    chunks = 0
+    for chunk in iter_recipient_chunks(event_id, audience, chunk_size):
+        create_notification_chunk.delay(fanout_id, event_id, message, chunk)
+        total += len(chunk)
+        chunks += 1
+        if on_progress:
+            on_progress(total)
+
+    cache.set(_progress_key(fanout_id, 'total'), total, PROGRESS_TIMEOUT)
+    logger.info(f"Notification fan-out {fanout_id}: event={event_id}, audience={audience}, "
+                f"recipients={total}, chunks={chunks}")
+    return total
+
+
+def create_notifications(event_id, message, user_ids, fanout_id=None):
+    """Tạo thông báo cho một lô người nhận bằng bulk_create trong một transaction."""
+    with transaction.atomic():
+        Notification.objects.bulk_create(
+            [Notification(user_id=user_id, event_id=event_id, message=message) for user_id in user_ids],
+            batch_size=settings.NOTIFICATION_FANOUT_CHUNK_SIZE
+        )
+    if fanout_id:
+        _record_created(fanout_id, len(user_ids))
+    return len(user_ids)
+
+
+def _record_created(fanout_id, count):
+    """
+    Cộng dồn số thông báo đã tạo. Lô đã được commit nên bộ đếm chỉ là best-effort: lỗi cache được
+    ghi log và bỏ qua, không để Celery retry task và insert lại cả lô.
+    """
+    key = _progress_key(fanout_id, 'created')
+    try:
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, PROGRESS_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Không cập nhật được tiến độ fan-out {fanout_id} (+{count}): {e}")
+
+
+def get_fanout_progress(fanout_id):
+    """Tiến độ của một đợt fan-out: tổng số người nhận (None khi chưa chia lô xong) và số thông báo đã tạo."""
+    total = cache.get(_progress_key(fanout_id, 'total'))
+    created = cache.get(_progress_key(fanout_id, 'created'), 0)
+    return {
+        'total': total,
+        'created': created,
+        'done': total is not None and created >= total,
+    }
+
+
+def _progress_key(fanout_id, name):
+    return f"notification_fanout:{fanout_id}:{name}"
@@ -1,49 +1,203 @@
-import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
 import requests
-from .models import User, Notification, Event
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 
+from .models import User, Event
+from .notification_fanout import recipient_ids, AUDIENCE_ATTENDEES, AUDIENCE_TICKET_HOLDERS
 
-def send_push_notification(user_ids, title, body, data=None):
-    users = User.objects.filter(id__in=user_ids, push_token__isnull=False)
+logger = logging.getLogger(__name__)
 
-    tokens = [user.push_token for user in users if user.push_token]
-    
-    if not tokens:
-        return
-
-    message = {
-        'to': tokens,
-        'title': title,
-        'body': body,
-        'sound': 'default',
-    }
-
-    if data:
-        message['data'] = data
-    
-    try:
-        response = requests.post(
-            'https://exp.host/--/api/v2/push/send',
-            headers={
+# Giới hạn của Expo: tối đa 100 thông báo mỗi request gửi, 1000 id mỗi request lấy receipt
+EXPO_PUSH_CHUNK_SIZE = 100
+EXPO_RECEIPT_CHUNK_SIZE = 1000
+DEAD_TOKEN_ERRORS = {'DeviceNotRegistered'}
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """Session HTTP dùng chung trong process, giữ kết nối keep-alive tới Expo cho các luồng gửi song song."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.EXPO_PUSH_CONCURRENCY)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({
+                'Accept': 'application/json',
+                'Accept-Encoding': 'gzip, deflate',
                 'Content-Type': 'application/json',
-            },
-            data=json.dumps(message)
-        )
+            })
+            if settings.EXPO_ACCESS_TOKEN:
+                session.headers['Authorization'] = f"Bearer {settings.EXPO_ACCESS_TOKEN}"
+            _session = session
+        return _session
 
-        if response.status_code == 200:
-            print(f"Đã gửi push notification thành công đến {len(tokens)} thiết bị")
-        else:
-            print(f"Lỗi khi gửi push notification: {response.status_code} - {response.text}")
-    
+
+def _chunks(items, size):
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _post(url, payload):
+    """POST tới Expo, thử lại với backoff tăng dần khi bị giới hạn tốc độ (429) hoặc lỗi 5xx/mạng."""
+    attempt = 0
+    while True:
+        try:
+            response = _get_session().post(url, json=payload, timeout=settings.EXPO_PUSH_TIMEOUT_SECONDS)
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return response.json()
+            error = requests.HTTPError(f"{response.status_code} - {response.text[:200]}", response=response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        if attempt >= settings.EXPO_PUSH_MAX_RETRIES:
+            raise error
+        delay = settings.EXPO_PUSH_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+        attempt += 1
+        logger.warning(f"Expo push lỗi tạm thời, thử lại sau {delay}s (lần {attempt}): {str(error)}")
+        time.sleep(delay)
+
+
+def _send_chunk(messages):
+    """
+    Gửi một lô tối đa EXPO_PUSH_CHUNK_SIZE thông báo.
+
+    Returns:
+        (tickets, error): danh sách ticket theo đúng thứ tự thông báo, hoặc lỗi nếu cả lô thất bại.
+    """
+    try:
+        return _post(settings.EXPO_PUSH_SEND_URL, messages).get('data', []), None
     except Exception as e:
-        print(f"Lỗi khi gửi push notification: {str(e)}")
+        return [], e
+
 
+def prune_dead_tokens(tokens):
+    """Xóa push token của các thiết bị đã gỡ ứng dụng hoặc tắt thông báo."""
+    tokens = [token for token in set(tokens) if token]
+    if not tokens:
+        return 0
+    pruned = User.objects.filter(push_token__in=tokens).update(push_token=None)
+    logger.info(f"Đã xóa {pruned} push token không còn hiệu lực")
+    return pruned
+
+
+def push_tokens(user_ids):
+    """Push token (không trùng lặp) của danh sách người dùng, đọc theo luồng."""
+    return User.objects.filter(id__in=user_ids).exclude(push_token__isnull=True).exclude(push_token='') \
+        .order_by('push_token').values_list('push_token', flat=True).distinct().iterator(chunk_size=2000)
+
+
+def send_push_notification(user_ids, title, body, data=None):
+    """
+    Gửi push notification qua Expo cho danh sách người dùng.
+
+    Token được chia thành các lô EXPO_PUSH_CHUNK_SIZE thông báo và gửi song song qua một session
+    HTTP dùng chung. Ticket trả về được đọc ngay để xóa token chết; các ticket thành công được
+    lên lịch kiểm tra receipt sau EXPO_RECEIPT_DELAY_SECONDS.
+
+    Returns:
+        dict thống kê: số thiết bị, số thông báo Expo nhận, số lỗi, số token bị xóa.
+    """
+    stats = {'devices': 0, 'accepted': 0, 'errors': 0, 'pruned': 0}
+    dead_tokens = []
+    receipt_tokens = {}
+
+    def build_messages(tokens):
+        messages = []
+        for token in tokens:
+            message = {'to': token, 'title': title, 'body': body, 'sound': 'default'}
+            if data:
+                message['data'] = data
+            messages.append(message)
+        return messages
+
+    chunks = (build_messages(tokens) for tokens in _chunks(push_tokens(user_ids), EXPO_PUSH_CHUNK_SIZE))
+
+    with ThreadPoolExecutor(max_workers=settings.EXPO_PUSH_CONCURRENCY) as executor:
+        # executor.map đọc hết generator ngay; giới hạn số lô đang chờ để không nạp toàn bộ token vào bộ nhớ
+        for batch in _chunks(chunks, settings.EXPO_PUSH_CONCURRENCY * 4):
+            for messages, (tickets, error) in zip(batch, executor.map(_send_chunk, batch)):
+                stats['devices'] += len(messages)
+                if error is not None:
+                    stats['errors'] += len(messages)
+                    logger.error(f"Lỗi khi gửi lô {len(messages)} push notification: {str(error)}")
+                    continue
+
+                for message, ticket in zip(messages, tickets):
+                    if ticket.get('status') == 'ok':
+                        stats['accepted'] += 1
+                        if ticket.get('id'):
+                            receipt_tokens[ticket['id']] = message['to']
+                        continue
+                    stats['errors'] += 1
+                    error_code = (ticket.get('details') or {}).get('error')
+                    if error_code in DEAD_TOKEN_ERRORS:
+                        dead_tokens.append(message['to'])
+                    else:
+                        logger.warning(f"Expo từ chối push tới {message['to']}: {ticket.get('message')}")
+
+    stats['pruned'] = prune_dead_tokens(dead_tokens)
+
+    if receipt_tokens:
+        from .tasks import check_push_receipts
+        for receipt_chunk in _chunks(receipt_tokens.items(), EXPO_RECEIPT_CHUNK_SIZE):
+            check_push_receipts.apply_async(args=(dict(receipt_chunk),),
+                                            countdown=settings.EXPO_RECEIPT_DELAY_SECONDS)
+
+    logger.info(f"Push notification '{title}': {stats}")
+    return stats
+
+
+def check_push_receipts(receipt_tokens):
+    """
+    Đọc receipt của các ticket đã gửi và xóa token của thiết bị không còn đăng ký.
+
+    Args:
+        receipt_tokens: dict {ticket_id: push_token}
+
+    Returns:
+        dict thống kê: số receipt thành công, lỗi và số token bị xóa.
+    """
+    stats = {'ok': 0, 'errors': 0, 'pruned': 0}
+    dead_tokens = []
+
+    for ids in _chunks(receipt_tokens, EXPO_RECEIPT_CHUNK_SIZE):
+        receipts = _post(settings.EXPO_PUSH_RECEIPTS_URL, {'ids': ids}).get('data', {})
+        for ticket_id, receipt in receipts.items():
+            if receipt.get('status') == 'ok':
+                stats['ok'] += 1
+                continue
+            stats['errors'] += 1
+            error_code = (receipt.get('details') or {}).get('error')
+            if error_code in DEAD_TOKEN_ERRORS:
+                dead_tokens.append(receipt_tokens.get(ticket_id))
+            else:
+                logger.warning(f"Receipt lỗi cho ticket {ticket_id}: {receipt.get('message')}")
+
+    stats['pruned'] = prune_dead_tokens(dead_tokens)
+    return stats
 
 
 def create_and_send_event_notification(event_id, is_update=False, is_cancel=False):
     """
-    Tạo và gửi thông báo khi có sự kiện mới, cập nhật sự kiện hoặc hủy sự kiện.
-    
+    Gửi push notification khi có sự kiện mới, cập nhật sự kiện hoặc hủy sự kiện.
+    Thông báo trong app được tạo riêng bởi notification_fanout.
+
     Args:
         event_id: ID của sự kiện
         is_update: True nếu là cập nhật sự kiện, False nếu là tạo mới
@@ -61,7 +215,7 @@ def create_and_send_event_notification(event_id, is_update=False, is_cancel=Fals
         else:
             title = "Sự kiện mới"
             body = f"'{event.name}' đã được tạo. Khám phá ngay!"
-        
+
         if is_cancel:
             data = {
                 "type": "EVENT_CANCELED",
@@ -72,37 +226,13 @@ def create_and_send_event_notification(event_id, is_update=False, is_cancel=Fals
                 "type": "EVENT_UPDATED" if is_update else "EVENT_CREATED",
                 "eventId": event_id
             }
-        
+
         if is_cancel:
-            from .models import OrderDetail, Order
-            user_ids = OrderDetail.objects.filter(
-                ticket__event=event,
-                order__payment_status=Order.PaymentStatus.PAID
-            ).values_list('order__user_id', flat=True).distinct()
+            user_ids = recipient_ids(event.id, AUDIENCE_TICKET_HOLDERS)
         else:
-            user_ids = User.objects.filter(role='attendee', is_active=True).values_list('id', flat=True)
-        
-
-        send_push_notification(user_ids, title, body, data)
-
-        notifications = []
-        for user_id in user_ids:
-            notifications.append(
-                Notification(
-                    user_id=user_id,
-                    event=event,
-                    message=body,
-                    is_read=False
-                )
-            )
-
-        if notifications:
-            Notification.objects.bulk_create(notifications)
-        
-        return True
+            user_ids = recipient_ids(event.id, AUDIENCE_ATTENDEES)
+
+        return send_push_notification(user_ids, title, body, data)
     except Event.DoesNotExist:
         print(f"Không tìm thấy sự kiện với ID {event_id}")
         return False
-    except Exception as e:
-        print(f"Lỗi khi tạo và gửi thông báo sự kiện: {str(e)}")
-        return False
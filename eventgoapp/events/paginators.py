@@ -1,5 +1,108 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
 
 
 class ItemPaginator(PageNumberPagination):
-    page_size = 2
\ No newline at end of file
+    page_size = 2
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPaginator(BasePagination):
+    """
+    Phân trang theo khóa (cột sắp xếp, id): mỗi trang là một câu WHERE (cột, id) > (giá trị, id) của dòng cuối
+    trang trước rồi LIMIT, nên trang sâu không phải quét OFFSET. Tổng số dòng (COUNT) chỉ tính khi ?count=true.
+    Request có ?page= vẫn được phân trang theo số trang như ItemPaginator để ứng dụng cũ không bị ảnh hưởng.
+
+    Cột sắp xếp phải không NULL; thêm "-" phía trước để sắp xếp giảm dần.
+    """
+    ordering = 'created_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.legacy = None
+        if 'page' in request.query_params:
+            self.legacy = ItemPaginator()
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        field = self.ordering.lstrip('-')
+        lookup = 'lt' if self.ordering.startswith('-') else 'gt'
+        queryset = queryset.order_by(self.ordering, f'{"-" if lookup == "lt" else ""}id')
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request, queryset.model._meta.get_field(field))
+        if cursor is not None:
+            value, last_id = cursor
+            # Điều kiện <=/>= đứng trước để DB dùng chỉ mục (..., cột, id) như một khoảng thay vì quét theo OR
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}e': value}),
+                Q(**{f'{field}__{lookup}': value}) | Q(**{f'id__{lookup}': last_id})
+            )
+
+        page_size = self.get_page_size(request)
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        self.last_key = (getattr(self.page[-1], field), self.page[-1].pk) if self.page else None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request, field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, last_id = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            return field.to_python(value), int(last_id)
+        except (ValueError, TypeError, DjangoValidationError):
+            raise ValidationError({"error": "cursor không hợp lệ."})
+
+    def encode_cursor(self, value, last_id):
+        value = value.isoformat() if hasattr(value, 'isoformat') else value
+        return base64.urlsafe_b64encode(json.dumps([value, last_id]).encode()).decode()
+
+    def get_next_link(self):
+        if self.legacy is not None:
+            return self.legacy.get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(remove_query_param(url, self.count_query_param),
+                                   self.cursor_query_param, self.encode_cursor(*self.last_key))
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        response = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            response['count'] = self.count
+        return Response(response)
+
+
+class EventPaginator(KeysetPaginator):
+    ordering = 'date'
+
+
+class RecentFirstPaginator(KeysetPaginator):
+    ordering = '-created_at'
@@ -1,96 +1,72 @@
-import pandas as pd
-from django_pandas.io import read_frame
-from sklearn.neighbors import NearestNeighbors
-from django.contrib.auth import get_user_model
-from .models import Event, EventCategory, Order, OrderDetail, Review, EventTrend
+from collections import defaultdict
+from itertools import chain
 
-User = get_user_model()
+import numpy as np
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 
-class RecommendationEngine:
-    def __init__(self):
-        self.events_df = None
-        self.user_history_df = None
-        self.load_data()
-
-    def load_data(self):
-        events = Event.objects.filter(status='upcoming')
-        self.events_df = read_frame(events, fieldnames=['id', 'category__name', 'location', 'date'])
-        self.events_df.columns = ['event_id', 'category', 'location', 'date']
+from .models import Event, EventCategory, Order
 
-        orders = Order.objects.filter(payment_status='paid')
-        order_details = OrderDetail.objects.filter(order__in=orders)
-        self.user_history_df = read_frame(order_details, fieldnames=['order__user__id', 'ticket__event__id', 'quantity'])
-        self.user_history_df.columns = ['user_id', 'event_id', 'quantity']
+# Các cột số đứng trước các cột one-hot của danh mục
+NUMERIC_COLUMNS = ['views', 'interest']
+UNKNOWN_CATEGORY = 'Unknown'
 
-    def get_user_preferences(self, user_id):
-        user_events = self.user_history_df[self.user_history_df['user_id'] == user_id]
-        if user_events.empty:
-            return []
-        event_ids = user_events['event_id'].tolist()
-        past_events = Event.objects.filter(id__in=event_ids)
-        categories = past_events.values_list('category__name', flat=True).distinct()
-        return list(categories)
 
-    def simple_recommendation(self, user_id, max_results=5):
-        preferences = self.get_user_preferences(user_id)
-        user = User.objects.get(id=user_id)
-        user_location = user.address or ""
+class RecommendationEngine:
+    """Trích đặc trưng của sự kiện và sở thích của người dùng cho mô hình gợi ý (xem recommendations.py)."""
 
-        if not preferences:
-            trending_events = EventTrend.objects.order_by('-interest_level')[:max_results]
-            return Event.objects.filter(id__in=[t.event_id for t in trending_events])
+    def upcoming_events(self):
+        return Event.objects.filter(status=Event.EventStatus.UPCOMING, active=True)
 
-        recommended = Event.objects.filter(
-            category__name__in=preferences,
-            location__icontains=user_location,
-            status='upcoming'
-        )[:max_results]
-        return recommended
+    def user_categories(self, user_ids=None):
+        """Danh mục của các sự kiện mỗi người dùng đã thanh toán: {user_id: [tên danh mục]}."""
+        orders = Order.objects.filter(
+            payment_status=Order.PaymentStatus.PAID,
+            ticket__event__category__isnull=False
+        )
+        if user_ids is not None:
+            orders = orders.filter(user_id__in=user_ids)
 
-    def prepare_ml_data(self):
-        events = Event.objects.filter(status='upcoming')
-        event_features = []
-        for event in events:
-            category = event.category.name if event.category else "Unknown"
-            views = EventTrend.objects.filter(event=event).first().views if EventTrend.objects.filter(
-                event=event).exists() else 0
-            interest = EventTrend.objects.filter(event=event).first().interest_level if EventTrend.objects.filter(
-                event=event).exists() else 0
-            event_features.append({
-                'event_id': event.id,
-                'category': category,
-                'views': views,
-                'interest': interest
-            })
+        categories = defaultdict(list)
+        for user_id, category in orders.order_by().values_list('user_id', 'ticket__event__category__name').distinct():
+            categories[user_id].append(category)
+        return dict(categories)
 
-        df = pd.DataFrame(event_features)
-        df_encoded = pd.get_dummies(df[['category']], prefix='cat')
-        df_final = pd.concat([df[['event_id', 'views', 'interest']], df_encoded], axis=1)
-        return df_final
+    def category_vocabulary(self):
+        """
+        Bộ từ vựng danh mục [(id, tên)] theo thứ tự id, mở đầu bằng danh mục "Unknown" (id 0) cho sự kiện
+        không có danh mục. Danh mục mới luôn nằm cuối nên vị trí cột one-hot không đổi giữa các lần dựng.
+        """
+        return [(0, UNKNOWN_CATEGORY)] + list(EventCategory.objects.order_by('id').values_list('id', 'name'))
 
-    def ml_recommendation(self, user_id, max_results=5):
-        preferences = self.get_user_preferences(user_id)
-        if not preferences:
-            trending_events = EventTrend.objects.order_by('-interest_level')[:max_results]
-            return Event.objects.filter(id__in=[t.event_id for t in trending_events])
+    def prepare_ml_data(self, events=None, vocabulary=None):
+        """
+        Đặc trưng của các sự kiện bằng một truy vấn values_list (JOIN EventTrend) nạp thẳng vào NumPy.
 
-        df = self.prepare_ml_data()
-        X = df.drop('event_id', axis=1).values
-        n_samples = X.shape[0]
-        n_neighbors = min(max_results, n_samples)
+        Returns:
+            (event_ids, features, coordinates): mảng id int64, ma trận float32 gồm NUMERIC_COLUMNS (chưa chuẩn hóa,
+            xem RecommendationModel) rồi one-hot theo `vocabulary`, và mảng (lat, lng) float64 với NaN ở
+            các sự kiện chưa có tọa độ.
+        """
+        events = self.upcoming_events() if events is None else events
+        vocabulary = self.category_vocabulary() if vocabulary is None else vocabulary
 
-        if n_samples == 0:
-            trending_events = EventTrend.objects.order_by('-interest_level')[:max_results]
-            return Event.objects.filter(id__in=[t.event_id for t in trending_events])
+        rows = events.order_by().annotate(
+            category_key=Coalesce('category_id', Value(0)),
+            views_count=Coalesce('trends__views', Value(0)),
+            interest_count=Coalesce('trends__interest_level', Value(0)),
+        ).values_list('id', 'category_key', 'views_count', 'interest_count', 'latitude', 'longitude')
+        values = (np.nan if value is None else value for value in chain.from_iterable(rows))
+        table = np.fromiter(values, dtype=np.float64).reshape(-1, 6)
+        data = table[:, :4].astype(np.int64)
 
-        knn = NearestNeighbors(n_neighbors=n_neighbors, metric='cosine')
-        knn.fit(X)
-        user_vector = pd.DataFrame([0] * len(X[0]), index=df.columns[1:]).T
-        for pref in preferences:
-            if f'cat_{pref}' in user_vector.columns:
-                user_vector[f'cat_{pref}'] = 1
+        vocabulary_ids = np.array([category_id for category_id, _ in vocabulary], dtype=np.int64)
+        positions = np.searchsorted(vocabulary_ids, data[:, 1]).clip(max=len(vocabulary_ids) - 1)
+        # Danh mục tạo sau khi đọc bộ từ vựng được tính như "Unknown" cho tới lần dựng lại
+        positions[vocabulary_ids[positions] != data[:, 1]] = 0
 
-        distances, indices = knn.kneighbors(user_vector.values)
-        recommended_event_ids = df.iloc[indices[0]]['event_id'].tolist()
-        recommended = Event.objects.filter(id__in=recommended_event_ids).order_by('-trends__interest_level')
-        return recommended
\ No newline at end of file
+        features = np.zeros((len(data), len(NUMERIC_COLUMNS) + len(vocabulary)), dtype=np.float32)
+        features[:, 0] = data[:, 2]
+        features[:, 1] = data[:, 3]
+        features[np.arange(len(data)), len(NUMERIC_COLUMNS) + positions] = 1
+        return data[:, 0], features, table[:, 4:]
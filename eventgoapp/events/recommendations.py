@@ -0,0 +1,408 @@
+import logging
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.timezone import now
+from sklearn.neighbors import NearestNeighbors
+
+from . import geo
+from .models import Event, TicketType, User
+from .recommendation_engine import RecommendationEngine, NUMERIC_COLUMNS
+from .trending import top_events
+
+logger = logging.getLogger(__name__)
+
+# Đổi MODEL_FORMAT khi cấu trúc RecommendationModel thay đổi để không nạp bản pickle cũ
+MODEL_FORMAT = 3
+MODEL_KEY = f'recommendation:model:v{MODEL_FORMAT}'
+MODEL_VERSION_KEY = f'recommendation:model-version:v{MODEL_FORMAT}'
+REFRESH_LOCK_KEY = 'recommendation:refresh-lock'
+REFRESH_LOCK_TIMEOUT = 900
+USER_CATEGORIES_KEY = 'recommendation:user-categories:{user_id}'
+# Danh sách gợi ý đã tính sẵn của từng người dùng; sự kiện bị hủy sau khi tính được lọc khi đọc (recommend)
+USER_EVENTS_KEY = 'recommendation:user-events:{user_id}'
+CACHE_CHUNK_SIZE = 1000
+# Số ứng viên theo sở thích (x số cần trả về) được xếp lại theo khoảng cách với người dùng có tọa độ
+DISTANCE_CANDIDATE_FACTOR = 5
+
+# Mô hình đã nạp trong process hiện tại; chỉ đọc lại từ cache khi phiên bản thay đổi
+_loaded_model = None
+# Mô hình của process con khi tính sẵn danh sách gợi ý bằng process pool
+_worker_model = None
+
+
+class RecommendationModel:
+    """
+    Ma trận đặc trưng của các sự kiện sắp diễn ra cùng chỉ mục láng giềng gần nhất (cosine) trên ma trận đó.
+
+    Lượt xem/quan tâm được chuẩn hóa log1p(x) / scale về khoảng [0, 1] để không lấn át các cột one-hot danh mục;
+    scale lấy từ lần dựng toàn bộ và được giữ nguyên khi cập nhật từng phần. Tọa độ của sự kiện (NaN nếu chưa có)
+    là đặc trưng khoảng cách: các ứng viên gần về sở thích được xếp lại theo độ gần với người dùng có tọa độ.
+    """
+
+    def __init__(self, event_ids, vocabulary, matrix, coordinates, scale, synced_at):
+        self.event_ids = event_ids
+        self.vocabulary = vocabulary
+        self.matrix = matrix
+        self.coordinates = coordinates
+        self.scale = scale
+        self.synced_at = synced_at
+        self.version = uuid.uuid4().hex
+        self._positions = {name: len(NUMERIC_COLUMNS) + i for i, (_, name) in enumerate(vocabulary)}
+        self._fit()
+
+    @classmethod
+    def build(cls, event_ids, vocabulary, features, coordinates, synced_at):
+        """Mô hình từ đặc trưng thô của prepare_ml_data, tính scale từ chính dữ liệu này."""
+        scale = np.log1p(features[:, :len(NUMERIC_COLUMNS)]).max(axis=0, initial=0)
+        scale[scale == 0] = 1
+        return cls(event_ids, vocabulary, cls._normalize(features, scale), coordinates, scale, synced_at)
+
+    @staticmethod
+    def _normalize(features, scale):
+        matrix = features.copy()
+        matrix[:, :len(NUMERIC_COLUMNS)] = np.log1p(matrix[:, :len(NUMERIC_COLUMNS)]) / scale
+        return matrix
+
+    def _fit(self):
+        self.index = None
+        if len(self.event_ids):
+            self.index = NearestNeighbors(metric='cosine', algorithm='brute').fit(self.matrix)
+
+    def __getstate__(self):
+        # Chỉ mục brute-force chỉ giữ lại ma trận nên không tuần tự hóa, fit lại khi nạp gần như không tốn gì
+        state = self.__dict__.copy()
+        state['index'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._fit()
+
+    def user_vector(self, categories):
+        vector = np.zeros((1, self.matrix.shape[1]), dtype=np.float32)
+        for category in categories:
+            if category in self._positions:
+                vector[0, self._positions[category]] = 1
+        return vector
+
+    def nearest(self, categories, max_results=5, location=None):
+        """
+        Id các sự kiện gần nhất với vector sở thích, ưu tiên sự kiện gần `location` (lat, lng) nếu có;
+        người dùng chưa có sở thích nhận các sự kiện gần họ nhất. Rỗng nếu không có cả hai.
+        """
+        return self.nearest_many([categories], max_results, [location])[0]
+
+    def nearest_many(self, category_lists, max_results=5, locations=None):
+        """nearest cho nhiều người dùng bằng một lần kneighbors trên cả lô vector sở thích."""
+        results = [[] for _ in category_lists]
+        if self.index is None or not category_lists:
+            return results
+        locations = locations or [None] * len(category_lists)
+        vectors = np.vstack([self.user_vector(categories) for categories in category_lists])
+        interested = vectors.any(axis=1)
+        rows = np.flatnonzero(interested)
+        if len(rows):
+            factor = DISTANCE_CANDIDATE_FACTOR if settings.RECOMMENDATION_DISTANCE_WEIGHT else 1
+            distances, indices = self.index.kneighbors(
+                vectors[rows], n_neighbors=min(max_results * factor, len(self.event_ids))
+            )
+            for row, cosine_distances, neighbours in zip(rows, distances, indices):
+                results[row] = self._rank(neighbours, 1 - cosine_distances, locations[row], max_results)
+        for row in np.flatnonzero(~interested):
+            if locations[row] is not None:
+                results[row] = self._closest(locations[row], max_results)
+        return results
+
+    def _distances(self, location, positions=slice(None)):
+        return geo.distances_km(location[0], location[1],
+                                self.coordinates[positions, 0], self.coordinates[positions, 1])
+
+    def _rank(self, neighbours, similarity, location, max_results):
+        """Xếp ứng viên theo tương đồng x (1 + WEIGHT x e^(-km / SCALE_KM)); sự kiện chưa có tọa độ giữ nguyên điểm."""
+        if location is not None and settings.RECOMMENDATION_DISTANCE_WEIGHT:
+            proximity = np.nan_to_num(np.exp(-self._distances(location, neighbours)
+                                             / settings.RECOMMENDATION_DISTANCE_SCALE_KM))
+            score = similarity * (1 + settings.RECOMMENDATION_DISTANCE_WEIGHT * proximity)
+            neighbours = neighbours[np.argsort(-score, kind='stable')]
+        return self.event_ids[neighbours[:max_results]].tolist()
+
+    def _closest(self, location, max_results):
+        distances = self._distances(location)
+        located = np.flatnonzero(~np.isnan(distances))
+        nearest = located[np.argsort(distances[located], kind='stable')[:max_results]]
+        return self.event_ids[nearest].tolist()
+
+    def with_events(self, event_ids, features, coordinates, removed_ids, synced_at):
+        """Mô hình mới sau khi thay/thêm các dòng `features` (cùng bộ từ vựng) và bỏ các sự kiện `removed_ids`."""
+        keep = ~np.isin(self.event_ids, np.concatenate([event_ids, np.asarray(removed_ids, dtype=np.int64)]))
+        return RecommendationModel(
+            np.concatenate([self.event_ids[keep], event_ids]),
+            self.vocabulary,
+            np.concatenate([self.matrix[keep], self._normalize(features, self.scale)]),
+            np.concatenate([self.coordinates[keep], coordinates]),
+            self.scale,
+            synced_at
+        )
+
+
+def _user_key(user_id):
+    return USER_CATEGORIES_KEY.format(user_id=user_id)
+
+
+def _events_key(user_id):
+    return USER_EVENTS_KEY.format(user_id=user_id)
+
+
+def save_model(model):
+    # Ghi mô hình trước rồi mới đổi phiên bản để process đọc thấy phiên bản mới luôn nạp được mô hình tương ứng
+    cache.set(MODEL_KEY, model, None)
+    cache.set(MODEL_VERSION_KEY, model.version, None)
+
+
+def get_model():
+    """Mô hình hiện tại; mỗi process chỉ nạp lại từ cache khi phiên bản thay đổi."""
+    global _loaded_model
+    version = cache.get(MODEL_VERSION_KEY)
+    if version is None:
+        return None
+    if _loaded_model is None or _loaded_model.version != version:
+        _loaded_model = cache.get(MODEL_KEY)
+    return _loaded_model
+
+
+def build_model():
+    """Dựng lại toàn bộ mô hình và sở thích danh mục của mọi người dùng, lưu vào cache."""
+    synced_at = now()
+    engine = RecommendationEngine()
+    vocabulary = engine.category_vocabulary()
+    event_ids, features, coordinates = engine.prepare_ml_data(vocabulary=vocabulary)
+    model = RecommendationModel.build(event_ids, vocabulary, features, coordinates, synced_at)
+    save_model(model)
+
+    categories = list(engine.user_categories().items())
+    for start in range(0, len(categories), CACHE_CHUNK_SIZE):
+        cache.set_many(
+            {_user_key(user_id): names for user_id, names in categories[start:start + CACHE_CHUNK_SIZE]},
+            None
+        )
+    stats = {'full': True, 'events': len(model.event_ids), 'users': len(categories)}
+    logger.info(f"Đã dựng lại mô hình gợi ý: {stats}")
+    return stats
+
+
+def refresh_model():
+    """
+    Cập nhật mô hình theo các sự kiện có updated_at sau lần đồng bộ trước: dòng của sự kiện sắp diễn ra
+    được thay hoặc thêm, sự kiện đã hủy/kết thúc/ẩn bị bỏ. Dựng lại toàn bộ khi chưa có mô hình, khi mô hình
+    cũ hơn RECOMMENDATION_MODEL_MAX_AGE_SECONDS (lượt xem/quan tâm thay đổi không đụng tới Event)
+    hoặc khi bộ từ vựng danh mục thay đổi (thêm, đổi tên).
+    """
+    if not cache.add(REFRESH_LOCK_KEY, 1, REFRESH_LOCK_TIMEOUT):
+        return {'skipped': True}
+    try:
+        model = get_model()
+        if model is None or (now() - model.synced_at).total_seconds() > settings.RECOMMENDATION_MODEL_MAX_AGE_SECONDS:
+            return build_model()
+
+        synced_at = now()
+        engine = RecommendationEngine()
+        if engine.category_vocabulary() != model.vocabulary:
+            return build_model()
+
+        changed = Event.objects.filter(updated_at__gte=model.synced_at)
+        upcoming = changed.filter(status=Event.EventStatus.UPCOMING, active=True)
+        event_ids, features, coordinates = engine.prepare_ml_data(upcoming, vocabulary=model.vocabulary)
+        removed_ids = list(changed.exclude(id__in=upcoming.values('id')).values_list('id', flat=True))
+        if not len(event_ids) and not removed_ids:
+            return {'full': False, 'events': 0}
+
+        save_model(model.with_events(event_ids, features, coordinates, removed_ids, synced_at))
+        return {'full': False, 'events': len(event_ids) + len(removed_ids)}
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+
+
+def user_categories(user_id):
+    """Danh mục sở thích của người dùng, đọc từ cache; khi cache trống tính từ các đơn đã thanh toán."""
+    key = _user_key(user_id)
+    categories = cache.get(key)
+    if categories is None:
+        categories = RecommendationEngine().user_categories([user_id]).get(user_id, [])
+        cache.set(key, categories, None)
+    return categories
+
+
+def _add_user_category(user_id, ticket_id):
+    category = TicketType.objects.filter(id=ticket_id).values_list('event__category__name', flat=True).first()
+    key = _user_key(user_id)
+    categories = cache.get(key)
+    if category and categories is not None and category not in categories:
+        cache.set(key, categories + [category], None)
+
+
+def _after_purchase(user_id, ticket_id):
+    _add_user_category(user_id, ticket_id)
+    cache.delete(_events_key(user_id))
+
+
+def record_purchase(order):
+    """
+    Sau khi commit: thêm danh mục của sự kiện vừa thanh toán vào sở thích đã cache của người dùng
+    và xóa danh sách gợi ý đã tính sẵn của họ.
+    """
+    transaction.on_commit(lambda: _after_purchase(order.user_id, order.ticket_id))
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _rank(model, chunk):
+    user_ids, category_lists, locations = chunk
+    return dict(zip(user_ids, model.nearest_many(category_lists, settings.RECOMMENDATION_TOP_N, locations)))
+
+
+def _rank_chunk(chunk):
+    return _rank(_worker_model, chunk)
+
+
+def _location(latitude, longitude):
+    return (latitude, longitude) if latitude is not None and longitude is not None else None
+
+
+def _attendees():
+    return User.objects.filter(role=User.Role.ATTENDEE, is_active=True).order_by('id')
+
+
+def _user_rows(chunk_size):
+    """Các lô (id, vĩ độ, kinh độ) của người tham gia đang hoạt động, duyệt theo id."""
+    last_id = 0
+    while True:
+        rows = list(_attendees().filter(id__gt=last_id).values_list('id', 'latitude', 'longitude')[:chunk_size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def _chunk(engine, rows):
+    """(id người dùng, danh mục sở thích, tọa độ hoặc None) của một lô người dùng."""
+    user_ids = [user_id for user_id, _, _ in rows]
+    categories = engine.user_categories(user_ids)
+    return user_ids, [categories.get(user_id, []) for user_id in user_ids], [_location(*row[1:]) for row in rows]
+
+
+def _store(lists):
+    cache.set_many({_events_key(user_id): event_ids for user_id, event_ids in lists.items()},
+                   settings.RECOMMENDATION_LIST_CACHE_TIMEOUT)
+    return {'users': len(lists), 'empty': sum(1 for event_ids in lists.values() if not event_ids)}
+
+
+def _ready_model():
+    model = get_model()
+    if model is None:
+        build_model()
+        model = get_model()
+    return model
+
+
+def dispatch_precompute(chunk_size=None):
+    """
+    Chia người tham gia đang hoạt động thành từng lô RECOMMENDATION_PRECOMPUTE_CHUNK_SIZE người và gửi mỗi lô
+    thành một subtask Celery, để nhiều worker cùng xếp hạng song song (worker prefork là process daemon,
+    không tạo được process pool bên trong một tác vụ).
+
+    Returns:
+        Số người dùng và số lô đã gửi.
+    """
+    from .tasks import precompute_recommendation_chunk
+
+    chunk_size = chunk_size or settings.RECOMMENDATION_PRECOMPUTE_CHUNK_SIZE
+    _ready_model()
+    stats = {'users': 0, 'chunks': 0}
+    for rows in _user_rows(chunk_size):
+        precompute_recommendation_chunk.delay([row[0] for row in rows])
+        stats['users'] += len(rows)
+        stats['chunks'] += 1
+    logger.info(f"Đã chia lô tính sẵn danh sách gợi ý: {stats}")
+    return stats
+
+
+def precompute_chunk(user_ids):
+    """Tính sẵn và lưu danh sách gợi ý của một lô người dùng bằng mô hình đã nạp trong process hiện tại."""
+    model = _ready_model()
+    rows = list(_attendees().filter(id__in=user_ids).values_list('id', 'latitude', 'longitude'))
+    return _store(_rank(model, _chunk(RecommendationEngine(), rows)))
+
+
+def precompute_lists(workers=None, chunk_size=None):
+    """
+    Tính sẵn RECOMMENDATION_TOP_N sự kiện gợi ý cho mọi người tham gia đang hoạt động ngay trong process hiện tại
+    (lệnh precompute_recommendations) và lưu vào cache với TTL RECOMMENDATION_LIST_CACHE_TIMEOUT. Các lô người dùng
+    được xếp hạng song song trên process pool khi workers > 1 (mặc định bằng số CPU); trong process daemon
+    luôn chạy tuần tự, tác vụ Celery dùng dispatch_precompute.
+    """
+    workers = workers or settings.RECOMMENDATION_PRECOMPUTE_WORKERS or multiprocessing.cpu_count()
+    chunk_size = chunk_size or settings.RECOMMENDATION_PRECOMPUTE_CHUNK_SIZE
+    model = _ready_model()
+    if workers > 1 and multiprocessing.current_process().daemon:
+        logger.info("Đang chạy trong process daemon, tính danh sách gợi ý tuần tự")
+        workers = 1
+
+    engine = RecommendationEngine()
+    chunks = (_chunk(engine, rows) for rows in _user_rows(chunk_size))
+    stats = {'users': 0, 'empty': 0, 'workers': workers}
+
+    def store(lists):
+        for name, value in _store(lists).items():
+            stats[name] += value
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model,)) as pool:
+            for lists in pool.map(_rank_chunk, chunks):
+                store(lists)
+    else:
+        for chunk in chunks:
+            store(_rank(model, chunk))
+
+    logger.info(f"Đã tính sẵn danh sách gợi ý: {stats}")
+    return stats
+
+
+def _events():
+    return Event.objects.filter(status=Event.EventStatus.UPCOMING, active=True) \
+        .select_related('organizer', 'category').prefetch_related('tickets')
+
+
+def trending(max_results=5):
+    return top_events(max_results)
+
+
+def recommend(user, max_results=5):
+    """
+    Sự kiện gợi ý cho người dùng theo danh sách đã tính sẵn trong cache; khi chưa có danh sách thì tra
+    trên mô hình đã nạp rồi cache lại. Sự kiện đã hủy/kết thúc bị lọc khi đọc. Không có mô hình, chưa có
+    sở thích lẫn tọa độ hoặc không còn sự kiện nào thì trả về sự kiện thịnh hành.
+    """
+    key = _events_key(user.id)
+    event_ids = cache.get(key)
+    if event_ids is None:
+        model = get_model()
+        categories = user_categories(user.id)
+        location = _location(user.latitude, user.longitude)
+        event_ids = []
+        if model is not None and (categories or location):
+            event_ids = model.nearest(categories, settings.RECOMMENDATION_TOP_N, location)
+        if model is not None:
+            cache.set(key, event_ids, settings.RECOMMENDATION_LIST_CACHE_TIMEOUT)
+
+    events = _events().in_bulk(event_ids) if event_ids else {}
+    ranked = [events[event_id] for event_id in event_ids if event_id in events][:max_results]
+    return ranked or trending(max_results)
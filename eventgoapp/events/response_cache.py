@@ -0,0 +1,111 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+# Phiên bản của mỗi phạm vi dữ liệu là thời điểm thay đổi cuối cùng (dùng luôn cho Last-Modified);
+# khóa của response chứa phiên bản nên đổi phiên bản là mọi response cũ của phạm vi đó hết hiệu lực
+VERSION_KEY = 'response-cache:version:{scope}'
+RESPONSE_KEY = 'response-cache:{endpoint}:{digest}'
+# Phiên bản sống lâu hơn response (x RESPONSE_CACHE_TIMEOUT) rồi tự hết hạn, để phạm vi của các id không tồn tại
+# hay sự kiện đã cũ không nằm mãi trong cache; phiên bản hết hạn được tạo lại như vừa thay đổi
+VERSION_TIMEOUT_FACTOR = 10
+
+# Các phạm vi: danh sách sự kiện, một sự kiện (chi tiết, vé, đánh giá) và danh mục
+SCOPE_EVENTS = 'events'
+SCOPE_CATEGORIES = 'categories'
+
+
+def event_scope(event_id):
+    return f'event:{event_id}'
+
+
+def _version_timeout():
+    return settings.RESPONSE_CACHE_TIMEOUT * VERSION_TIMEOUT_FACTOR
+
+
+def _versions(scopes):
+    keys = {VERSION_KEY.format(scope=scope): scope for scope in scopes}
+    versions = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    if missing:
+        # Chưa có phiên bản (cache trống): coi như vừa thay đổi
+        for key, version in missing.items():
+            cache.add(key, version, _version_timeout())
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def _invalidate_now(scopes):
+    version = time.time()
+    cache.set_many({VERSION_KEY.format(scope=scope): version for scope in scopes}, _version_timeout())
+
+
+def invalidate(*scopes):
+    """Đổi phiên bản của các phạm vi sau khi transaction hiện tại commit (ngay lập tức nếu không có transaction)."""
+    scopes = [scope for scope in scopes if scope]
+    if scopes:
+        transaction.on_commit(lambda: _invalidate_now(scopes))
+
+
+def invalidate_events(event_ids):
+    """
+    Đổi phiên bản của các sự kiện và của danh sách sự kiện. Số vé còn lại thay đổi khi giữ chỗ/nhả vé
+    không làm mới cache: chi tiết, danh sách vé và danh sách sự kiện cập nhật sau RESPONSE_CACHE_TIMEOUT.
+    """
+    invalidate(*[event_scope(event_id) for event_id in set(event_ids)], SCOPE_EVENTS)
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+def cached_response(request, endpoint, scopes, build):
+    """
+    Response của một endpoint GET công khai, cache theo endpoint + query params đã chuẩn hóa + phiên bản
+    của các phạm vi dữ liệu; kèm ETag/Last-Modified và trả 304 cho GET có điều kiện khớp.
+
+    Args:
+        endpoint: tên endpoint kèm tham số đường dẫn, ví dụ "events:detail:5".
+        scopes: các phạm vi mà dữ liệu trả về phụ thuộc vào.
+        build: hàm tạo Response khi cache trống; chỉ response 200 được cache.
+    """
+    versions = _versions(scopes)
+    params = sorted((name, sorted(values)) for name, values in request.query_params.lists())
+    digest = hashlib.md5(
+        json.dumps([request.scheme, request.get_host(), params, versions]).encode()
+    ).hexdigest()
+    key = RESPONSE_KEY.format(endpoint=endpoint, digest=digest)
+
+    entry = cache.get(key)
+    if entry is None:
+        response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        body = json.dumps(response.data, cls=JSONEncoder)
+        entry = {
+            'data': json.loads(body),
+            'etag': quote_etag(hashlib.md5(body.encode()).hexdigest()),
+            'last_modified': max(versions),
+        }
+        cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+
+    headers = {
+        'ETag': entry['etag'],
+        'Last-Modified': http_date(entry['last_modified']),
+        'Cache-Control': 'no-cache',
+    }
+    if _not_modified(request, entry['etag'], entry['last_modified']):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(entry['data'], headers=headers)
@@ -0,0 +1,169 @@
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Sum, Count, Case, When, Value, ExpressionWrapper, DurationField
+from django.db.models.functions import TruncDate
+from django.utils.timezone import localtime
+
+from .models import Order, EventSalesDaily, OrganizerSalesMonthly, CategorySalesMonthly
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('paid_orders', 'failed_orders', 'tickets_sold', 'revenue')
+UPSERT_CHUNK_SIZE = 500
+
+# (bảng, các cột khóa) theo thứ tự khóa của dict cộng dồn
+EVENT_DAILY = (EventSalesDaily, ('event_id', 'ticket_id', 'day'))
+ORGANIZER_MONTHLY = (OrganizerSalesMonthly, ('organizer_id', 'month'))
+CATEGORY_MONTHLY = (CategorySalesMonthly, ('category_id', 'month'))
+
+
+def _empty_bucket(with_purchase_time=False):
+    bucket = {'paid_orders': 0, 'failed_orders': 0, 'tickets_sold': 0, 'revenue': Decimal('0')}
+    if with_purchase_time:
+        bucket['purchase_seconds'] = 0.0
+    return bucket
+
+
+def _add(bucket, values):
+    for metric, value in values.items():
+        if metric in bucket:
+            bucket[metric] += value
+
+
+def _split(rows):
+    """
+    Chia các dòng theo (sự kiện, loại vé, ngày) thành lượng cộng dồn của ba bảng.
+
+    Args:
+        rows: các dict có event_id, ticket_id, organizer_id, category_id, day và các chỉ số.
+    """
+    event_daily = defaultdict(lambda: _empty_bucket(with_purchase_time=True))
+    organizer_monthly = defaultdict(_empty_bucket)
+    category_monthly = defaultdict(_empty_bucket)
+    for row in rows:
+        month = row['day'].replace(day=1)
+        _add(event_daily[(row['event_id'], row['ticket_id'], row['day'])], row)
+        _add(organizer_monthly[(row['organizer_id'], month)], row)
+        if row['category_id']:
+            _add(category_monthly[(row['category_id'], month)], row)
+    return {EVENT_DAILY: event_daily, ORGANIZER_MONTHLY: organizer_monthly, CATEGORY_MONTHLY: category_monthly}
+
+
+def _upsert(table, counts):
+    """
+    Cộng dồn vào một bảng tổng hợp: tạo dòng còn thiếu bằng bulk_create(ignore_conflicts=True)
+    rồi tăng các chỉ số bằng một câu UPDATE F() + Case/When cho mỗi lô.
+    """
+    model, key_fields = table
+    keys = [key for key, bucket in counts.items() if any(bucket.values())]
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in keys],
+        ignore_conflicts=True,
+        batch_size=UPSERT_CHUNK_SIZE
+    )
+
+    for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+        chunk = keys[start:start + UPSERT_CHUNK_SIZE]
+        match = Q()
+        for key in chunk:
+            match |= Q(**dict(zip(key_fields, key)))
+
+        updates = {}
+        for metric in counts[chunk[0]]:
+            whens = [
+                When(Q(**dict(zip(key_fields, key))), then=Value(counts[key][metric]))
+                for key in chunk if counts[key][metric]
+            ]
+            if whens:
+                updates[metric] = F(metric) + Case(
+                    *whens, default=Value(0), output_field=model._meta.get_field(metric)
+                )
+        model.objects.filter(match).update(**updates)
+    return len(keys)
+
+
+def record_transition(order_ids, status):
+    """
+    Cộng các đơn vừa chuyển sang PAID hoặc FAILED vào bảng tổng hợp doanh số.
+    Gọi trong cùng transaction với câu UPDATE chuyển trạng thái để mỗi đơn chỉ được cộng một lần.
+    """
+    rows = Order.objects.filter(id__in=order_ids, ticket__isnull=False).values(
+        'ticket_id', 'quantity', 'total_amount', 'created_at', 'updated_at',
+        event_id=F('ticket__event_id'),
+        organizer_id=F('ticket__event__organizer_id'),
+        category_id=F('ticket__event__category_id'),
+    )
+
+    deltas = []
+    for row in rows:
+        delta = {
+            'event_id': row['event_id'],
+            'ticket_id': row['ticket_id'],
+            'organizer_id': row['organizer_id'],
+            'category_id': row['category_id'],
+            'day': localtime(row['created_at']).date(),
+        }
+        if status == Order.PaymentStatus.PAID:
+            delta.update(
+                paid_orders=1,
+                tickets_sold=row['quantity'],
+                revenue=row['total_amount'],
+                purchase_seconds=(row['updated_at'] - row['created_at']).total_seconds(),
+            )
+        else:
+            delta['failed_orders'] = 1
+        deltas.append(delta)
+
+    for table, counts in _split(deltas).items():
+        _upsert(table, counts)
+    return len(deltas)
+
+
+def rebuild_sales_rollups():
+    """
+    Tính lại toàn bộ bảng tổng hợp doanh số từ Order bằng một truy vấn GROUP BY (loại vé, ngày);
+    dùng để backfill lần đầu hoặc sau khi sửa đơn hàng trực tiếp trong DB.
+    """
+    paid = Q(payment_status=Order.PaymentStatus.PAID)
+    rows = Order.objects.filter(
+        ticket__isnull=False,
+        payment_status__in=[Order.PaymentStatus.PAID, Order.PaymentStatus.FAILED]
+    ).order_by().annotate(day=TruncDate('created_at')).values(
+        'ticket_id', 'day',
+        event_id=F('ticket__event_id'),
+        organizer_id=F('ticket__event__organizer_id'),
+        category_id=F('ticket__event__category_id'),
+    ).annotate(
+        paid_orders=Count('id', filter=paid),
+        failed_orders=Count('id', filter=Q(payment_status=Order.PaymentStatus.FAILED)),
+        tickets_sold=Sum('quantity', filter=paid),
+        revenue=Sum('total_amount', filter=paid),
+        purchase_time=Sum(
+            ExpressionWrapper(F('updated_at') - F('created_at'), output_field=DurationField()),
+            filter=paid
+        ),
+    )
+
+    deltas = []
+    for row in rows:
+        purchase_time = row.pop('purchase_time')
+        row['tickets_sold'] = row['tickets_sold'] or 0
+        row['revenue'] = row['revenue'] or Decimal('0')
+        row['purchase_seconds'] = purchase_time.total_seconds() if purchase_time else 0.0
+        deltas.append(row)
+
+    stats = {}
+    with transaction.atomic():
+        for (model, key_fields), counts in _split(deltas).items():
+            model.objects.all().delete()
+            model.objects.bulk_create(
+                [model(**dict(zip(key_fields, key)), **bucket) for key, bucket in counts.items()],
+                batch_size=UPSERT_CHUNK_SIZE
+            )
+            stats[model._meta.model_name] = len(counts)
+
+    logger.info(f"Đã tính lại bảng tổng hợp doanh số: {stats}")
+    return stats
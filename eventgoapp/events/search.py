@@ -0,0 +1,297 @@
+import html
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum, Case, When, Value, Exists, OuterRef, Subquery, FloatField, \
+    IntegerField
+from django.utils.html import strip_tags
+
+from .models import Event, SearchTerm, EventSearchPosting
+
+logger = logging.getLogger(__name__)
+
+# Trọng số của mỗi lần một từ xuất hiện trong từng trường
+FIELD_WEIGHTS = (('name', 3.0), ('category', 2.0), ('location', 1.5), ('description', 1.0))
+MAX_TERM_LENGTH = 64
+# Số từ tối đa trong từ vựng được dùng cho một tiền tố (ưu tiên từ phổ biến)
+PREFIX_EXPANSION = 50
+MAX_QUERY_TERMS = 8
+# Nhóm từ hiếm nhất dẫn truy vấn lọc khi số posting^2 <= số sự kiện x hệ số này (đọc hết posting rẻ hơn
+# duyệt sự kiện theo thứ tự và kiểm tra EXISTS cho tới khi đủ một trang); phổ biến hơn thì chỉ dùng EXISTS
+DRIVING_FACTOR = 100
+# Số sự kiện tối đa được chấm điểm khi xếp hạng, lấy từ các từ phổ biến nhất của nhóm tiền tố
+RANK_CANDIDATES = 200
+RANK_TERMS = 5
+INDEX_CHUNK_SIZE = 500
+EVENT_COUNT_KEY = 'search:event-count'
+EVENT_COUNT_TIMEOUT = 3600
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+# Các ký tự của từ theo thứ tự tăng dần, giống nhau ở collation nhị phân lẫn collation không phân biệt hoa thường
+_ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def fold(text):
+    """Chữ thường, bỏ dấu tiếng Việt ("Đà Nẵng" -> "da nang") để tìm không phân biệt dấu."""
+    text = unicodedata.normalize('NFKD', text.replace('đ', 'd').replace('Đ', 'D'))
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in _TOKEN_RE.findall(fold(text or ''))]
+
+
+def document_weights(name, category, location, description):
+    """{từ: trọng số} của một sự kiện; mô tả CKEditor được bỏ thẻ HTML và giải mã entity trước khi tách từ."""
+    fields = {
+        'name': name,
+        'category': category,
+        'location': location,
+        'description': html.unescape(strip_tags(description or '')),
+    }
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for token, count in Counter(tokenize(fields[field])).items():
+            # Số lần lặp lại chỉ tăng theo log để mô tả dài không lấn át tên sự kiện
+            weights[token] += weight * (1 + math.log(count))
+    return weights
+
+
+def _terms(term_names):
+    """{từ: id} của các từ trong từ vựng, tạo các từ còn thiếu."""
+    SearchTerm.objects.bulk_create([SearchTerm(term=term) for term in term_names], ignore_conflicts=True,
+                                   batch_size=INDEX_CHUNK_SIZE)
+    return dict(SearchTerm.objects.filter(term__in=term_names).values_list('term', 'id'))
+
+
+def _adjust_counts(deltas):
+    """Cộng {term_id: delta} vào document_count bằng một câu UPDATE F() + Case/When cho mỗi lô."""
+    term_ids = [term_id for term_id, delta in deltas.items() if delta]
+    for start in range(0, len(term_ids), INDEX_CHUNK_SIZE):
+        chunk = term_ids[start:start + INDEX_CHUNK_SIZE]
+        SearchTerm.objects.filter(id__in=chunk).update(document_count=F('document_count') + Case(
+            *[When(id=term_id, then=Value(deltas[term_id])) for term_id in chunk],
+            default=Value(0), output_field=IntegerField()
+        ))
+
+
+def index_events(event_ids):
+    """
+    Cập nhật chỉ mục của các sự kiện: so trọng số mới với các posting đã lưu, chỉ xóa/thêm/sửa phần thay đổi
+    và điều chỉnh số sự kiện của từng từ. Sự kiện không còn tồn tại bị bỏ khỏi chỉ mục.
+
+    Returns:
+        Số sự kiện có posting thay đổi.
+    """
+    event_ids = list(event_ids)
+    rows = Event.objects.filter(id__in=event_ids).values_list(
+        'id', 'name', 'category__name', 'location', 'description'
+    )
+    wanted = {event_id: document_weights(*fields) for event_id, *fields in rows}
+    stored = {}
+    for event_id, term, weight in EventSearchPosting.objects.filter(event_id__in=event_ids) \
+            .values_list('event_id', 'term__term', 'weight'):
+        stored.setdefault(event_id, {})[term] = weight
+
+    term_ids = _terms({term for weights in wanted.values() for term in weights})
+    stored_ids = dict(SearchTerm.objects.filter(
+        term__in={term for weights in stored.values() for term in weights}
+    ).values_list('term', 'id'))
+
+    to_create, to_delete, to_update, deltas, changed = [], Q(), {}, Counter(), 0
+    for event_id in event_ids:
+        new, old = wanted.get(event_id, {}), stored.get(event_id, {})
+        if new == old:
+            continue
+        changed += 1
+        for term in old.keys() - new.keys():
+            to_delete |= Q(event_id=event_id, term_id=stored_ids[term])
+            deltas[stored_ids[term]] -= 1
+        for term in new.keys() - old.keys():
+            to_create.append(EventSearchPosting(event_id=event_id, term_id=term_ids[term], weight=new[term]))
+            deltas[term_ids[term]] += 1
+        for term in new.keys() & old.keys():
+            if new[term] != old[term]:
+                to_update[(event_id, term_ids[term])] = new[term]
+
+    if changed:
+        with transaction.atomic():
+            if to_delete:
+                EventSearchPosting.objects.filter(to_delete).delete()
+            EventSearchPosting.objects.bulk_create(to_create, batch_size=INDEX_CHUNK_SIZE)
+            for (event_id, term_id), weight in to_update.items():
+                EventSearchPosting.objects.filter(event_id=event_id, term_id=term_id).update(weight=weight)
+            _adjust_counts(deltas)
+    return changed
+
+
+def schedule_index(event_ids):
+    """Cập nhật chỉ mục của các sự kiện (theo lô) sau khi transaction hiện tại commit."""
+    event_ids = list(event_ids)
+
+    def run():
+        for start in range(0, len(event_ids), INDEX_CHUNK_SIZE):
+            index_events(event_ids[start:start + INDEX_CHUNK_SIZE])
+
+    if event_ids:
+        transaction.on_commit(run)
+
+
+def unindex_event(event_id):
+    """Giảm số sự kiện của các từ trước khi sự kiện bị xóa (posting bị xóa theo CASCADE)."""
+    term_ids = list(EventSearchPosting.objects.filter(event_id=event_id).values_list('term_id', flat=True))
+    _adjust_counts({term_id: -1 for term_id in term_ids})
+
+
+def rebuild_index(batch_size=INDEX_CHUNK_SIZE):
+    """Dựng lại toàn bộ chỉ mục theo từng lô sự kiện (backfill hoặc sau khi ghi hàng loạt bỏ qua save())."""
+    with transaction.atomic():
+        EventSearchPosting.objects.all().delete()
+        SearchTerm.objects.all().delete()
+    stats = {'events': 0, 'terms': 0}
+    last_id = 0
+    while True:
+        event_ids = list(Event.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not event_ids:
+            break
+        last_id = event_ids[-1]
+        index_events(event_ids)
+        stats['events'] += len(event_ids)
+    stats['terms'] = SearchTerm.objects.count()
+    cache.delete(EVENT_COUNT_KEY)
+    logger.info(f"Đã dựng lại chỉ mục tìm kiếm sự kiện: {stats}")
+    return stats
+
+
+def parse_query(query):
+    """
+    Các từ của câu tìm kiếm đã bỏ dấu; từ cuối được coi là tiền tố (gõ dở) trừ khi câu kết thúc bằng khoảng trắng.
+
+    Returns:
+        [(từ, là_tiền_tố)]
+    """
+    tokens = tokenize(query)[:MAX_QUERY_TERMS]
+    open_ended = bool(query) and not query[-1].isspace()
+    return [(token, open_ended and i == len(tokens) - 1) for i, token in enumerate(tokens)]
+
+
+def _prefix_range(token):
+    """
+    Khoảng [đầu, cuối) chứa đúng các từ bắt đầu bằng `token`, để DB quét một khoảng của chỉ mục unique của term.
+    Cận trên là tiền tố kế tiếp trong _ALPHABET (nhớ sang ký tự trước khi gặp "z") thay vì một ký tự canh
+    như "~", vốn không đứng sau a-z0-9 ở mọi collation; không có cận trên khi token chỉ gồm "z".
+    """
+    stem = token.rstrip('z')
+    if not stem:
+        return Q(term__gte=token)
+    return Q(term__gte=token, term__lt=stem[:-1] + _ALPHABET[_ALPHABET.index(stem[-1]) + 1])
+
+
+def _term_groups(tokens):
+    """Mỗi từ của câu tìm kiếm -> {term_id: document_count}; None nếu có từ không khớp từ nào trong từ vựng."""
+    exact = {term: {term_id: document_count} for term, term_id, document_count in SearchTerm.objects.filter(
+        term__in=[token for token, prefix in tokens if not prefix], document_count__gt=0
+    ).values_list('term', 'id', 'document_count')}
+    groups = []
+    for token, prefix in tokens:
+        if prefix:
+            group = dict(SearchTerm.objects.filter(_prefix_range(token), document_count__gt=0)
+                         .order_by('-document_count').values_list('id', 'document_count')[:PREFIX_EXPANSION])
+        else:
+            group = exact.get(token)
+        if not group:
+            return None
+        groups.append(group)
+    return groups
+
+
+def _event_count():
+    count = cache.get(EVENT_COUNT_KEY)
+    if count is None:
+        count = Event.objects.count()
+        cache.set(EVENT_COUNT_KEY, count, EVENT_COUNT_TIMEOUT)
+    return max(count, 1)
+
+
+def _plan(query):
+    """Nhóm term_id của từng từ trong câu tìm kiếm, từ hiếm nhất trước; None nếu chắc chắn không có kết quả."""
+    tokens = parse_query(query)
+    if not tokens:
+        return None
+    groups = _term_groups(tokens)
+    if groups is None:
+        return None
+    return sorted(groups, key=lambda group: sum(group.values()))
+
+
+def _filter_groups(events, groups):
+    """
+    Sự kiện chứa mọi nhóm từ. Nhóm hiếm nhất (ít posting) dẫn truy vấn qua id__in; nếu cả nhóm hiếm nhất
+    cũng phổ biến, mọi nhóm dùng EXISTS để DB duyệt sự kiện theo thứ tự của queryset và dừng ngay khi đủ LIMIT.
+    """
+    rarest = groups[0]
+    if sum(rarest.values()) ** 2 <= _event_count() * DRIVING_FACTOR:
+        events = events.filter(id__in=EventSearchPosting.objects.filter(term_id__in=list(rarest)).values('event_id'))
+        groups = groups[1:]
+    return _containing(events, groups)
+
+
+def _containing(events, groups):
+    for group in groups:
+        events = events.filter(Exists(EventSearchPosting.objects.filter(event_id=OuterRef('pk'),
+                                                                        term_id__in=list(group))))
+    return events
+
+
+def filter_events(events, query):
+    """Lọc queryset sự kiện theo câu tìm kiếm (khớp mọi từ, từ cuối theo tiền tố), giữ nguyên thứ tự của queryset."""
+    groups = _plan(query)
+    if groups is None:
+        return events.none()
+    return _filter_groups(events, groups)
+
+
+def _candidates(group):
+    """
+    Champion list của một nhóm từ: mọi sự kiện chứa nhóm nếu nhóm có tối đa RANK_CANDIDATES posting, ngược lại
+    các posting trọng số cao nhất của RANK_TERMS từ phổ biến nhất trong nhóm (đọc theo chỉ mục (term, weight)).
+    """
+    if sum(group.values()) <= RANK_CANDIDATES:
+        return list(EventSearchPosting.objects.filter(term_id__in=list(group)).values_list('event_id', flat=True))
+    term_ids = list(group)[:RANK_TERMS]
+    per_term = RANK_CANDIDATES // len(term_ids)
+    candidates = set()
+    for term_id in term_ids:
+        candidates.update(EventSearchPosting.objects.filter(term_id=term_id).order_by('-weight')
+                          .values_list('event_id', flat=True)[:per_term])
+    return list(candidates)
+
+
+def search_events(events, query, limit=20):
+    """
+    Sự kiện khớp câu tìm kiếm, xếp theo độ liên quan (tổng trọng số x IDF của các từ khớp).
+
+    Chỉ các sự kiện trong champion list của nhóm từ hiếm nhất được chấm điểm nên chi phí không tăng theo số
+    sự kiện chứa từ phổ biến; kết quả là chính xác khi nhóm đó có tối đa RANK_CANDIDATES posting.
+    """
+    groups = _plan(query)
+    if groups is None:
+        return []
+
+    total = _event_count()
+    idf = {term_id: math.log(1 + total / max(document_count, 1))
+           for group in groups for term_id, document_count in group.items()}
+    score = EventSearchPosting.objects.filter(event_id=OuterRef('pk'), term_id__in=list(idf)) \
+        .values('event_id').annotate(score=Sum(F('weight') * Case(
+            *[When(term_id=term_id, then=Value(value)) for term_id, value in idf.items()],
+            output_field=FloatField()
+        ))).values('score')
+    return list(
+        _containing(events.filter(id__in=_candidates(groups[0])), groups[1:])
+        .annotate(score=Subquery(score, output_field=FloatField())).order_by('-score', 'id')[:limit]
+    )
@@ -1,8 +1,8 @@
 from cloudinary.utils import cloudinary_url
-from django.db.models import Avg
 from rest_framework import serializers
 import re
 from events.models import User, Event, TicketType, Order, OrderDetail, EventCategory, Review, Notification, Discount
+from events.ticket_qr import qr_image_url
 
 
 class BaseSerializer(serializers.ModelSerializer):
@@ -12,7 +12,7 @@ class BaseSerializer(serializers.ModelSerializer):
         return d
 
 class UserSerializer(serializers.ModelSerializer):
-    event_count = serializers.SerializerMethodField(read_only=True)
+    event_count = serializers.IntegerField(source='organized_event_count', read_only=True)
     
     def validate_email(self, value):
         if not re.match(r'^[\w\.-]+@[\w\.-]+\.\w+$', value):
@@ -22,11 +22,7 @@ class UserSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         d = super().to_representation(instance)
         d['avatar'] = instance.avatar.url if instance.avatar else None # Check if image is null
-        d['event_count'] = self.get_event_count(instance)
         return d
-        
-    def get_event_count(self, obj):
-        return Event.objects.filter(organizer=obj, active=True).count()
 
     def validate_phone(self, value):
         if value and not re.match(r'^\d{10}$', value):
@@ -94,8 +90,8 @@ class EventCategorySerializer(serializers.ModelSerializer):
 class EventSerializer(BaseSerializer):
     organizer = UserSerializer(read_only=True, )
     category = EventCategorySerializer(read_only=True)
-    average_rating = serializers.SerializerMethodField(read_only=True)
-    review_count = serializers.SerializerMethodField(read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
+    review_count = serializers.IntegerField(read_only=True)
     tickets = serializers.SerializerMethodField(read_only=True)
     
     # Thêm các trường để map đúng cho frontend
@@ -118,16 +114,9 @@ class EventSerializer(BaseSerializer):
         write_only=True
     )
 
-    def get_average_rating(self, obj):
-        avg = obj.reviews.aggregate(Avg('rating'))['rating__avg']
-        return avg if avg else 0
-    
-    def get_review_count(self, obj):
-        return obj.reviews.count()
-    
     def get_tickets(self, obj):
-        tickets = TicketType.objects.filter(event=obj)
-        return TicketSerializer(tickets, many=True).data
+        # Dùng prefetch_related('tickets') của queryset danh sách nếu có
+        return TicketSerializer(obj.tickets.all(), many=True).data
     
     def get_event_date(self, obj):
         if obj.date:
@@ -149,8 +138,6 @@ class EventSerializer(BaseSerializer):
     def to_representation(self, instance):
         data = super().to_representation(instance)
         data['venue'] = instance.location
-        if instance.organizer:
-            data['organizer'] = UserSerializer(instance.organizer, context=self.context).data
         return data
 
     def create(self, validated_data):
@@ -187,6 +174,10 @@ class TicketSerializer(serializers.ModelSerializer):
 
 class OrderDetailSerializer(serializers.ModelSerializer):
     order = serializers.SerializerMethodField()
+    qr_image_url = serializers.SerializerMethodField()
+
+    def get_qr_image_url(self, obj):
+        return qr_image_url(obj.qr_code, self.context.get('request'))
 
     def get_order(self, obj):
         if obj.order and obj.order.ticket:
@@ -207,7 +198,7 @@ class OrderDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = OrderDetail
-        fields = ['id', 'order', 'qr_code', 'qr_image', 'checked_in', 'checkin_time']
+        fields = ['id', 'order', 'qr_code', 'qr_image', 'qr_image_url', 'checked_in', 'checkin_time']
 
 class OrderSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
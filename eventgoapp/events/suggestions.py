@@ -0,0 +1,285 @@
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Event, EventCategory
+from .search import tokenize
+from .trend_counters import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Chỉ mục gợi ý khi gõ: sorted set mọi phần tử cùng điểm 0 nên ZRANGEBYLEX trả về các phần tử theo thứ tự từ điển.
+# Mỗi mục (sự kiện, danh mục, địa điểm) có một phần tử "<văn bản không dấu từ vị trí một từ>\x00<ref>" cho mỗi
+# vị trí trong SUGGEST_MAX_WORDS từ đầu, văn bản cắt còn MAX_TEXT_LENGTH ký tự; tên hiển thị chỉ lưu một lần trong
+# NAMES_KEY. Bộ nhớ vì vậy bị chặn: khoảng SUGGEST_MAX_WORDS x ~110 byte + ~100 byte tên cho mỗi mục
+# (~430 MB cho 1 triệu tên với SUGGEST_MAX_WORDS=3).
+INDEX_KEY = 'suggest:index'
+# ref -> JSON giá trị đã đánh chỉ mục (tên; với sự kiện là [tên, địa điểm]) để tính lại phần tử cũ khi cập nhật
+NAMES_KEY = 'suggest:names'
+# Số sự kiện đang dùng mỗi địa điểm; địa điểm bị bỏ khỏi chỉ mục khi không còn sự kiện nào
+VENUE_REFS_KEY = 'suggest:venue-refs'
+READY_KEY = 'suggest:ready'
+REBUILD_KEY_PREFIX = 'suggest:rebuild:'
+REBUILD_LOCK_KEY = 'suggest:rebuild-lock'
+REBUILD_LOCK_TIMEOUT = 600
+REBUILD_CHUNK_SIZE = 1000
+MAX_TEXT_LENGTH = 48
+MAX_NAME_LENGTH = 255
+SEPARATOR = '\x00'
+
+KIND_EVENT = 'event'
+KIND_CATEGORY = 'category'
+KIND_VENUE = 'venue'
+SUGGESTED_STATUSES = [Event.EventStatus.UPCOMING, Event.EventStatus.ONGOING]
+
+
+def _text(value):
+    return ' '.join(tokenize(value))
+
+
+def _members(ref, name):
+    """Các phần tử của một mục: văn bản không dấu bắt đầu từ mỗi từ trong SUGGEST_MAX_WORDS từ đầu."""
+    words = tokenize(name)
+    return {
+        f"{' '.join(words[i:])[:MAX_TEXT_LENGTH]}{SEPARATOR}{ref}"
+        for i in range(min(len(words), settings.SUGGEST_MAX_WORDS))
+    }
+
+
+def _venue_ref(location):
+    text = _text(location)
+    return f'{KIND_VENUE}:{text[:MAX_TEXT_LENGTH]}' if text else None
+
+
+def _visible_events(event_ids):
+    return {
+        event_id: (name, location)
+        for event_id, name, location in Event.objects.filter(
+            id__in=event_ids, active=True, status__in=SUGGESTED_STATUSES
+        ).values_list('id', 'name', 'location')
+    }
+
+
+def _parts(value):
+    """(tên, địa điểm) của giá trị đã đánh chỉ mục: [tên, địa điểm] với sự kiện, tên với danh mục/địa điểm."""
+    if value is None:
+        return None, None
+    return tuple(value) if isinstance(value, (list, tuple)) else (value, None)
+
+
+def _add(pipe, ref, name):
+    members = _members(ref, name)
+    if members:
+        pipe.zadd(INDEX_KEY, dict.fromkeys(members, 0))
+
+
+def _apply(client, items):
+    """
+    Đồng bộ các mục vào chỉ mục: {ref: giá trị mới hoặc None để xóa}; với sự kiện giá trị là (tên, địa điểm).
+    Một round-trip đọc giá trị cũ, một round-trip ghi, thêm một round-trip nếu có địa điểm không còn sự kiện.
+    """
+    refs = list(items)
+    stored = dict(zip(refs, client.hmget(NAMES_KEY, refs)))
+    pipe = client.pipeline(transaction=False)
+    venue_deltas = {}
+    for ref, value in items.items():
+        old_name, old_location = _parts(json.loads(stored[ref]) if stored[ref] else None)
+        name, location = _parts(value)
+        if (old_name, old_location) == (name, location):
+            continue
+
+        stale = _members(ref, old_name) - _members(ref, name) if old_name else set()
+        if stale:
+            pipe.zrem(INDEX_KEY, *stale)
+        if name:
+            _add(pipe, ref, name)
+            pipe.hset(NAMES_KEY, ref, json.dumps([name, location] if location is not None else name))
+        else:
+            pipe.hdel(NAMES_KEY, ref)
+
+        old_venue, venue = _venue_ref(old_location), _venue_ref(location)
+        if old_venue != venue:
+            if old_venue:
+                venue_deltas[old_venue] = venue_deltas.get(old_venue, 0) - 1
+            if venue:
+                venue_deltas[venue] = venue_deltas.get(venue, 0) + 1
+                _add(pipe, venue, location)
+                pipe.hset(NAMES_KEY, venue, json.dumps(location[:MAX_NAME_LENGTH]))
+
+    venues = [venue for venue, delta in venue_deltas.items() if delta]
+    for venue in venues:
+        pipe.hincrby(VENUE_REFS_KEY, venue, venue_deltas[venue])
+    results = pipe.execute()
+
+    unused = [venue for venue, count in zip(venues, results[len(results) - len(venues):]) if count <= 0]
+    if unused:
+        locations = client.hmget(NAMES_KEY, unused)
+        pipe = client.pipeline(transaction=False)
+        for venue, location in zip(unused, locations):
+            members = _members(venue, json.loads(location)) if location else set()
+            if members:
+                pipe.zrem(INDEX_KEY, *members)
+        pipe.hdel(NAMES_KEY, *unused)
+        pipe.hdel(VENUE_REFS_KEY, *unused)
+        pipe.execute()
+
+
+def _refresh_events(event_ids):
+    client = redis_client()
+    if client is None:
+        return
+    visible = _visible_events(event_ids)
+    _apply(client, {f'{KIND_EVENT}:{event_id}': visible.get(event_id) for event_id in event_ids})
+
+
+def refresh_events(event_ids):
+    """Cập nhật gợi ý của các sự kiện sau khi transaction hiện tại commit; sự kiện bị xóa/ẩn/đã kết thúc bị bỏ ra."""
+    event_ids = list(event_ids)
+    if event_ids:
+        transaction.on_commit(lambda: _refresh_events(event_ids))
+
+
+def refresh_category(category_id, name):
+    """Cập nhật (hoặc xóa nếu `name` là None) gợi ý của một danh mục sau khi transaction hiện tại commit."""
+    def run():
+        client = redis_client()
+        if client is not None:
+            _apply(client, {f'{KIND_CATEGORY}:{category_id}': name})
+
+    transaction.on_commit(run)
+
+
+def _rebuild(client):
+    """Dựng chỉ mục vào các khóa tạm rồi RENAME trong một MULTI để người đọc không thấy chỉ mục dở dang."""
+    index_key, names_key, refs_key = (f'{REBUILD_KEY_PREFIX}{key}' for key in (INDEX_KEY, NAMES_KEY, VENUE_REFS_KEY))
+    client.delete(index_key, names_key, refs_key)
+    stats = {KIND_EVENT: 0, KIND_CATEGORY: 0, KIND_VENUE: 0}
+    venues = {}
+
+    def flush(members, names):
+        pipe = client.pipeline(transaction=False)
+        if members:
+            pipe.zadd(index_key, members)
+        if names:
+            pipe.hset(names_key, mapping=names)
+        pipe.execute()
+
+    members, names = {}, {}
+    for category_id, name in EventCategory.objects.values_list('id', 'name'):
+        ref = f'{KIND_CATEGORY}:{category_id}'
+        members.update(dict.fromkeys(_members(ref, name), 0))
+        names[ref] = json.dumps(name)
+        stats[KIND_CATEGORY] += 1
+    flush(members, names)
+
+    rows = Event.objects.filter(active=True, status__in=SUGGESTED_STATUSES).order_by() \
+        .values_list('id', 'name', 'location')
+    members, names = {}, {}
+    for event_id, name, location in rows.iterator(chunk_size=REBUILD_CHUNK_SIZE):
+        ref = f'{KIND_EVENT}:{event_id}'
+        members.update(dict.fromkeys(_members(ref, name), 0))
+        names[ref] = json.dumps([name, location])
+        venue = _venue_ref(location)
+        if venue:
+            if venue not in venues:
+                members.update(dict.fromkeys(_members(venue, location), 0))
+                names[venue] = json.dumps(location[:MAX_NAME_LENGTH])
+                venues[venue] = 0
+            venues[venue] += 1
+        stats[KIND_EVENT] += 1
+        if len(names) >= REBUILD_CHUNK_SIZE:
+            flush(members, names)
+            members, names = {}, {}
+    flush(members, names)
+    items = list(venues.items())
+    for start in range(0, len(items), REBUILD_CHUNK_SIZE):
+        client.hset(refs_key, mapping=dict(items[start:start + REBUILD_CHUNK_SIZE]))
+    stats[KIND_VENUE] = len(venues)
+
+    pipe = client.pipeline(transaction=True)
+    pipe.delete(INDEX_KEY, NAMES_KEY, VENUE_REFS_KEY)
+    for temp_key, key in ((index_key, INDEX_KEY), (names_key, NAMES_KEY), (refs_key, VENUE_REFS_KEY)):
+        if client.exists(temp_key):
+            pipe.rename(temp_key, key)
+    pipe.set(READY_KEY, 1)
+    pipe.execute()
+    logger.info(f"Đã dựng chỉ mục gợi ý tìm kiếm: {stats}")
+    return stats
+
+
+def ensure_index(client=None, force=False):
+    """
+    Dựng chỉ mục nếu chưa có (khởi động lạnh, Redis bị xóa) hoặc khi `force`; chỉ một tiến trình dựng tại một
+    thời điểm. Thay đổi ghi trong lúc dựng lại có thể bị mất tới lần dựng kế tiếp.
+    """
+    client = client or redis_client()
+    if client is None:
+        return None
+    if not force and client.exists(READY_KEY):
+        return {}
+    if not client.set(REBUILD_LOCK_KEY, 1, nx=True, ex=REBUILD_LOCK_TIMEOUT):
+        return {'skipped': True}
+    try:
+        return _rebuild(client)
+    finally:
+        client.delete(REBUILD_LOCK_KEY)
+
+
+def _suggest_from_sql(query, limit):
+    # Cache không phải Redis (phát triển): tìm theo tiền tố tên trong DB, không bỏ dấu
+    results = [
+        {'type': KIND_CATEGORY, 'id': category_id, 'name': name}
+        for category_id, name in EventCategory.objects.filter(name__istartswith=query).values_list('id', 'name')[:limit]
+    ]
+    results += [
+        {'type': KIND_EVENT, 'id': event_id, 'name': name}
+        for event_id, name in Event.objects.filter(
+            name__istartswith=query, active=True, status__in=SUGGESTED_STATUSES
+        ).order_by('name').values_list('id', 'name')[:limit - len(results)]
+    ]
+    return results
+
+
+def suggest(query, limit=8):
+    """
+    Gợi ý sự kiện, danh mục và địa điểm có một từ bắt đầu bằng câu đã gõ (không phân biệt dấu):
+    một ZRANGEBYLEX và một HMGET. Chỉ mục chưa có (khởi động lạnh, Redis bị xóa) được dựng ngay như
+    trending.top_events; trong lúc một tiến trình khác đang dựng, gợi ý được tìm trong DB.
+
+    Returns:
+        [{"type": "event" | "category" | "venue", "id": id (None với địa điểm), "name": tên hiển thị}]
+    """
+    text = _text(query)
+    if not text:
+        return []
+    if query[-1].isspace():
+        text += ' '
+    client = redis_client()
+    if client is None or ensure_index(client).get('skipped'):
+        return _suggest_from_sql(query.strip(), limit)
+
+    # Mỗi mục có thể khớp ở vài vị trí từ nên đọc dư rồi bỏ trùng
+    members = client.zrangebylex(INDEX_KEY, b'[' + text.encode(), b'[' + text.encode() + b'\xff', 0, 3 * limit)
+    refs = []
+    for member in members:
+        ref = member.decode().split(SEPARATOR, 1)[1]
+        if ref not in refs:
+            refs.append(ref)
+    refs = refs[:limit]
+    if not refs:
+        return []
+
+    results = []
+    for ref, value in zip(refs, client.hmget(NAMES_KEY, refs)):
+        if value is None:
+            continue
+        kind, key = ref.split(':', 1)
+        name = json.loads(value)
+        results.append({
+            'type': kind,
+            'id': int(key) if kind != KIND_VENUE else None,
+            'name': name[0] if kind == KIND_EVENT else name,
+        })
+    return results
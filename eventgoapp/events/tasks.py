@@ -1,9 +1,10 @@
 from datetime import timedelta
 from celery import shared_task
 from django.utils.timezone import now
-from events.models import Event, User, Notification, OrderDetail, Order
+from events.models import Event
+from events.mail_delivery import fan_out_mail, send_templated_mail
+from events.notification_fanout import AUDIENCE_ATTENDEES, AUDIENCE_TICKET_HOLDERS
 from django.db import transaction
-from django.core.mail import send_mail
 
 @shared_task(bind=True, name='events.tasks.send_event_reminders')
 def send_event_reminders(self):
@@ -18,81 +19,172 @@ def send_event_reminders(self):
 
 @shared_task(bind=True, name='events.tasks.send_event_update_notifications')
 def send_event_update_notifications(self, event_id, update_message):
-    print(f"--- TASK send_event_update_notifications ENTERED ---")
-    print(f"--- SELF: {self}, EVENT_ID: {event_id}, MESSAGE (first 100 chars): '{str(update_message)[:100]}...' ---")
     try:
-        with transaction.atomic():
-            event = Event.objects.get(id=event_id)
-
-            attendees = OrderDetail.objects.filter(
-                ticket__event=event, 
-                order__payment_status=Order.PaymentStatus.PAID
-            ).values_list('order__user', flat=True).distinct()
-            
-            users = User.objects.filter(id__in=attendees)
-            
-            notification_count = 0
-            for user in users:
-                try:
-                    send_mail(
-                        subject=f"Cập nhật cho sự kiện: {event.name}",
-                        message=f"Xin chào {user.username},\n\n{update_message}\n\nTrân trọng,\nĐội ngũ EventGo",
-                        from_email="nhanhgon24@gmail.com",
-                        recipient_list=[user.email],
-                        fail_silently=True,
-                    )
-                except Exception as e:
-                    print(f"Lỗi gửi mail {user.email}: {str(e)}")
-
-                Notification.objects.create(
-                    user=user,
-                    event=event,
-                    message=update_message
-                )
-                notification_count += 1
-            
-            print(f"Đã tạo {notification_count} thông báo cho event '{event.name}' (ID: {event_id})")
-            return notification_count
+        event = Event.objects.get(id=event_id)
     except Event.DoesNotExist:
         print(f"Event {event_id} không tìm thấy.")
         return 0
-    except Exception as e:
-        print(f"Lỗi khi send_event_update_notifications: {str(e)}")
-        return 0
+
+    recipient_count = fan_out_mail(
+        event.id,
+        AUDIENCE_TICKET_HOLDERS,
+        subject=f"Cập nhật cho sự kiện: {event.name}",
+        body_template=f"Xin chào {{username}},\n\n{update_message}\n\nTrân trọng,\nĐội ngũ EventGo"
+    )
+    print(f"Đã xếp hàng {recipient_count} email cập nhật cho event '{event.name}' (ID: {event_id})")
+    return recipient_count
 
 
 @shared_task(bind= True, name='events.tasks.send_new_event_notifications')
 def send_new_event_notifications(self, event_id):
     try:
-        with transaction.atomic():
-            event = Event.objects.get(id=event_id)
-
-            attendees = User.objects.filter(role='attendee', is_active=True)
-            
-            notification_count = 0
-            for user in attendees:
-                try:
-                    send_mail(
-                        subject=f"Sự kiện mới: {event.name}",
-                        message=f"Xin chào {user.username},\n\nSự kiện mới '{event.name}' đã được tạo và sẽ diễn ra vào {event.date.strftime('%d/%m/%Y')}.\n\nĐịa điểm: {event.location}\n\nHãy đặt vé ngay hôm nay!\n\nTrân trọng,\nĐội ngũ EventGo",
-                        from_email="nhanhgon24@gmail.com",
-                        recipient_list=[user.email],
-                        fail_silently=True,
-                    )
-                    print(f"Đã gửi email thông báo sự kiện mới tới {user.email}")
-                except Exception as e:
-                    print(f"Lỗi gửi email đến {user.email}: {str(e)}")
-                
-                notification_count += 1
-            
-            print(f"Đã tạo {notification_count} thông báo email cho sự kiện '{event.name}' (ID: {event_id})")
-            return notification_count
+        event = Event.objects.get(id=event_id)
     except Event.DoesNotExist:
         print(f"Không tìm thấy sự kiện với ID {event_id}")
         return 0
-    except Exception as e:
-        print(f"Lỗi trong send_new_event_notifications: {str(e)}")
-        return 0
+
+    recipient_count = fan_out_mail(
+        event.id,
+        AUDIENCE_ATTENDEES,
+        subject=f"Sự kiện mới: {event.name}",
+        body_template=f"Xin chào {{username}},\n\nSự kiện mới '{event.name}' đã được tạo và sẽ diễn ra vào {event.date.strftime('%d/%m/%Y')}.\n\nĐịa điểm: {event.location}\n\nHãy đặt vé ngay hôm nay!\n\nTrân trọng,\nĐội ngũ EventGo"
+    )
+    print(f"Đã xếp hàng {recipient_count} email thông báo cho sự kiện '{event.name}' (ID: {event_id})")
+    return recipient_count
+
+
+@shared_task(bind=True, name='events.tasks.send_mail_chunk')
+def send_mail_chunk(self, subject, body_template, user_ids):
+    sent = send_templated_mail(subject, body_template, user_ids)
+    print(f"Đã gửi {sent}/{len(user_ids)} email: {subject}")
+    return sent
+
+
+@shared_task(bind=True, name='events.tasks.release_expired_orders')
+def release_expired_orders(self, batch_size=None):
+    from django.conf import settings
+    from events.inventory import release_expired_orders as sweep_expired_orders
+
+    stats = sweep_expired_orders(batch_size=batch_size or settings.ORDER_SWEEP_BATCH_SIZE)
+    if stats['orders']:
+        print(f"Đã nhả {stats['tickets']} vé từ {stats['orders']} đơn hết hạn "
+              f"({stats['batches']} lô, trễ tối đa {stats['max_lag_seconds']:.1f}s)")
+    return stats
+
+
+@shared_task(bind=True, name='events.tasks.sync_event_statuses')
+def sync_event_statuses(self):
+    completed, reopened = Event.sync_statuses()
+    if completed or reopened:
+        print(f"Đã cập nhật trạng thái sự kiện: {completed} kết thúc, {reopened} mở lại")
+    return {'completed': completed, 'reopened': reopened}
+
+
+@shared_task(bind=True, name='events.tasks.flush_trend_counters')
+def flush_trend_counters(self):
+    from events.trend_counters import flush_trend_counters as flush_counters
+
+    return flush_counters()
+
+
+@shared_task(bind=True, name='events.tasks.roll_up_engagement')
+def roll_up_engagement(self):
+    from events.engagement import roll_up_engagement as roll_up
+
+    return roll_up()
+
+
+@shared_task(bind=True, name='events.tasks.ensure_trending_boards')
+def ensure_trending_boards(self):
+    from events.trending import ensure_boards
+
+    stats = ensure_boards()
+    if stats:
+        print(f"Đã dựng bảng xếp hạng xu hướng: {stats}")
+    return stats
+
+
+@shared_task(bind=True, name='events.tasks.refresh_recommendation_model')
+def refresh_recommendation_model(self):
+    from events.recommendations import refresh_model
+
+    stats = refresh_model()
+    if stats.get('events'):
+        print(f"Đã cập nhật mô hình gợi ý: {stats}")
+    return stats
+
+
+@shared_task(bind=True, name='events.tasks.precompute_recommendations')
+def precompute_recommendations(self):
+    from events.recommendations import dispatch_precompute
+
+    stats = dispatch_precompute()
+    print(f"Đã chia {stats['users']} người dùng thành {stats['chunks']} lô tính sẵn gợi ý")
+    return stats
+
+
+@shared_task(bind=True, name='events.tasks.precompute_recommendation_chunk', autoretry_for=(Exception,),
+             retry_backoff=True, max_retries=3)
+def precompute_recommendation_chunk(self, user_ids):
+    from events.recommendations import precompute_chunk
+
+    return precompute_chunk(user_ids)
+
+
+@shared_task(bind=True, name='events.tasks.ensure_suggestion_index')
+def ensure_suggestion_index(self):
+    from events.suggestions import ensure_index
+
+    stats = ensure_index()
+    if stats:
+        print(f"Đã dựng chỉ mục gợi ý tìm kiếm: {stats}")
+    return stats
+
+
+@shared_task(bind=True, name='events.tasks.fulfil_paid_order', autoretry_for=(Exception,),
+             retry_backoff=True, max_retries=5)
+def fulfil_paid_order(self, order_id):
+    from events.fulfillment import fulfil_order
+
+    ticket_count = fulfil_order(order_id)
+    if ticket_count:
+        print(f"Đã phát hành {ticket_count} vé cho đơn hàng #{order_id}")
+    return ticket_count
+
+
+@shared_task(bind=True, name='events.tasks.fan_out_event_notifications')
+def fan_out_event_notifications(self, event_id, message, audience):
+    from events.notification_fanout import dispatch_notification_chunks
+
+    def report_progress(dispatched):
+        if not self.request.called_directly:
+            self.update_state(state='PROGRESS', meta={'dispatched': dispatched})
+
+    return dispatch_notification_chunks(self.request.id, event_id, message, audience, on_progress=report_progress)
+
+
+@shared_task(bind=True, name='events.tasks.create_notification_chunk', autoretry_for=(Exception,),
+             retry_backoff=True, max_retries=3)
+def create_notification_chunk(self, fanout_id, event_id, message, user_ids):
+    from events.notification_fanout import create_notifications
+
+    return create_notifications(event_id, message, user_ids, fanout_id)
+
+
+@shared_task(bind=True, name='events.tasks.send_event_push_notification')
+def send_event_push_notification(self, event_id, is_update=False, is_cancel=False):
+    from events.notification_utils import create_and_send_event_notification
+
+    return create_and_send_event_notification(event_id, is_update=is_update, is_cancel=is_cancel)
+
+
+@shared_task(bind=True, name='events.tasks.check_push_receipts', autoretry_for=(Exception,),
+             retry_backoff=True, max_retries=3)
+def check_push_receipts(self, receipt_tokens):
+    from events.notification_utils import check_push_receipts as read_push_receipts
+
+    return read_push_receipts(receipt_tokens)
+
 
 @shared_task(bind=True, name='events.tasks.test_taskk')
 def test_taskk(self):
@@ -102,42 +194,18 @@ def test_taskk(self):
 @shared_task(bind=True, name='events.tasks.send_event_cancellation_notifications')
 def send_event_cancellation_notifications(self, event_id, cancel_message):
     try:
-        with transaction.atomic():
-            event = Event.objects.get(id=event_id)
-            attendees = OrderDetail.objects.filter(
-                ticket__event=event,
-                order__payment_status=Order.PaymentStatus.PAID
-            ).values_list('order__user', flat=True).distinct()
-            
-            users = User.objects.filter(id__in=attendees)
-            
-            notification_count = 0
-            for user in users:
-                try:
-                    send_mail(
-                        subject=f"Thông báo hủy sự kiện: {event.name}",
-                        message=f"Xin chào {user.username},\n\n{cancel_message}\n\nChúng tôi rất tiếc phải thông báo rằng sự kiện này đã bị hủy. Vui lòng liên hệ ban tổ chức để được hỗ trợ về việc hoàn tiền.\n\nTrân trọng,\nĐội ngũ EventGo",
-                        from_email="nhanhgon24@gmail.com",
-                        recipient_list=[user.email],
-                        fail_silently=True,
-                    )
-                    print(f"Đã gửi email thông báo hủy sự kiện tới {user.email}")
-                except Exception as e:
-                    print(f"Lỗi gửi email đến {user.email}: {str(e)}")
-                Notification.objects.create(
-                    user=user,
-                    event=event,
-                    message=f"Sự kiện '{event.name}' mà bạn đã đăng ký tham gia đã bị hủy. Vui lòng liên hệ ban tổ chức để được hỗ trợ về việc hoàn tiền."
-                )
-                notification_count += 1
-            
-            print(f"Đã tạo {notification_count} thông báo hủy sự kiện cho '{event.name}' (ID: {event_id})")
-            return notification_count
+        event = Event.objects.get(id=event_id)
     except Event.DoesNotExist:
         print(f"Không tìm thấy sự kiện với ID {event_id}")
         return 0
-    except Exception as e:
-        print(f"Lỗi trong send_event_cancellation_notifications: {str(e)}")
-        return 0
+
+    recipient_count = fan_out_mail(
+        event.id,
+        AUDIENCE_TICKET_HOLDERS,
+        subject=f"Thông báo hủy sự kiện: {event.name}",
+        body_template=f"Xin chào {{username}},\n\n{cancel_message}\n\nChúng tôi rất tiếc phải thông báo rằng sự kiện này đã bị hủy. Vui lòng liên hệ ban tổ chức để được hỗ trợ về việc hoàn tiền.\n\nTrân trọng,\nĐội ngũ EventGo"
+    )
+    print(f"Đã xếp hàng {recipient_count} email hủy sự kiện cho '{event.name}' (ID: {event_id})")
+    return recipient_count
 
 print("Available tasks:", send_event_reminders.name, send_event_update_notifications.name, send_new_event_notifications.name, send_event_cancellation_notifications.name)
@@ -1,3 +1,809 @@
-from django.test import TestCase
+import base64
+import json
+import random
+import re
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from eventgoapp.celery import app
+from . import geo, paginators, recommendations, search, trend_counters
+from .inventory import reserve_tickets, release_tickets
+from .mail_delivery import build_message, send_messages
+from .models import User, Event, EventCategory, TicketType, Review, EventTrend, EventEngagement, Order, \
+    OrderDetail, Notification
+from .notification_fanout import create_notifications, get_fanout_progress
+from .notification_utils import send_push_notification, EXPO_PUSH_CHUNK_SIZE
+from .recommendation_engine import RecommendationEngine
+from .tasks import precompute_recommendations
+from .sales_rollups import rebuild_sales_rollups
+from .utils import generate_qr_images, render_qr_png, QR_PARALLEL_THRESHOLD
+
+# Cache trong bộ nhớ cho test: không cần Redis, các đường dẫn dùng Redis tự chuyển sang phương án SQL
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+# Một trang /events/: các sự kiện (kèm organizer, category) và vé prefetch, không phụ thuộc số sự kiện
+EVENT_LIST_QUERIES = 2
+
+
+def create_event(organizer, name, **fields):
+    fields.setdefault('date', now() + timedelta(days=7))
+    fields.setdefault('location', 'N/A')
+    return Event.objects.create(organizer=organizer, name=name, **fields)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TicketReservationConcurrencyTests(TransactionTestCase):
+    """Nhiều luồng cùng giữ chỗ và trả vé trên một loại vé: không bao giờ bán vượt số lượng."""
+
+    stock = 200
+    workers = 16
+    attempts = 25
+    release_every = 10
+
+    def setUp(self):
+        # SQLite trong bộ nhớ khóa cả bảng khi ghi đồng thời thay vì chờ; đặt DB_TEST_NAME là một file để chạy
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Cần DB test cho phép nhiều kết nối đồng thời')
+
+    def test_concurrent_reservations_never_oversell(self):
+        organizer = User.objects.create(username='stress_org', role=User.Role.ORGANIZER)
+        event = create_event(organizer, 'Stress inventory', ticket_limit=self.stock)
+        ticket = TicketType.objects.create(event=event, type='Stress', price=Decimal('1000'), quantity=self.stock)
+        reserved = [0] * self.workers
+        released = [0] * self.workers
+        errors = []
+        barrier = threading.Barrier(self.workers)
+
+        def worker(index):
+            try:
+                barrier.wait()
+                for attempt in range(self.attempts):
+                    if reserve_tickets(ticket.id, 1):
+                        reserved[index] += 1
+                        if attempt % self.release_every == 0:
+                            release_tickets(ticket.id, 1)
+                            released[index] += 1
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        ticket.refresh_from_db()
+        sold = sum(reserved) - sum(released)
+        self.assertLessEqual(sold, self.stock)
+        self.assertEqual(ticket.quantity, self.stock - sold)
+        # Số lượt giữ chỗ vượt số vé nên kho phải về 0 mà không âm
+        self.assertEqual(ticket.quantity, 0)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TicketReservationTests(TestCase):
+    """Giữ chỗ và trả vé chỉ là một câu UPDATE, không đọc thêm sự kiện để làm mới cache."""
+
+    def test_reserve_and_release_run_one_query(self):
+        organizer = User.objects.create(username='inventory_org', role=User.Role.ORGANIZER)
+        event = create_event(organizer, 'Inventory', ticket_limit=10)
+        ticket = TicketType.objects.create(event=event, type='Standard', price=Decimal('1000'), quantity=2)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(reserve_tickets(ticket.id, 2))
+        with self.assertNumQueries(1):
+            self.assertFalse(reserve_tickets(ticket.id, 1))
+        with self.assertNumQueries(1):
+            release_tickets(ticket.id, 1)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.quantity, 1)
+
+
+@override_settings(CACHES=TEST_CACHES, MOMO_QUERY_ENDPOINT='http://momo.test/query')
+class PaymentStatusTests(TestCase):
+    """Kiểm tra trạng thái thanh toán qua MoMo (API MoMo được giả lập)."""
+
+    def setUp(self):
+        organizer = User.objects.create(username='payment_org', role=User.Role.ORGANIZER)
+        event = create_event(organizer, 'Payment', ticket_limit=10)
+        self.ticket = TicketType.objects.create(event=event, type='Standard', price=Decimal('1000'), quantity=10)
+        self.buyer = User.objects.create(username='payment_buyer')
+        self.order = Order.objects.create(user=self.buyer, ticket=self.ticket, quantity=2, total_amount=Decimal('2000'),
+                                          payment_method=Order.PaymentMethod.MOMO)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def check(self, result_code=0, **extra):
+        extra = {'ticket_id': self.ticket.id, 'quantity': self.order.quantity, **extra}
+        momo = mock.Mock(**{'json.return_value': {
+            'resultCode': result_code, 'message': 'ok',
+            'extraData': base64.b64encode(json.dumps(extra).encode()).decode(),
+        }})
+        with mock.patch('events.views.requests.post', return_value=momo), \
+                mock.patch('events.fulfillment.enqueue_fulfillment') as enqueue:
+            response = self.client.post(f'/orders/{self.order.id}/check-payment-status/')
+        self.order.refresh_from_db()
+        return response, enqueue
+
+    def test_paid(self):
+        response, enqueue = self.check()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.order.payment_status, Order.PaymentStatus.PAID)
+        enqueue.assert_called_once()
+
+    def test_extra_data_must_match_the_order(self):
+        response, enqueue = self.check(quantity=5)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.order.payment_status, Order.PaymentStatus.PENDING)
+        enqueue.assert_not_called()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PaymentWebhookTests(TestCase):
+    """Webhook MoMo chỉ báo thành công khi đơn thực sự PAID; đơn đã hết hạn/thất bại trả 409 để đối soát."""
+
+    def setUp(self):
+        organizer = User.objects.create(username='webhook_org', role=User.Role.ORGANIZER)
+        event = create_event(organizer, 'Webhook', ticket_limit=10)
+        ticket = TicketType.objects.create(event=event, type='Standard', price=Decimal('1000'), quantity=10)
+        buyer = User.objects.create(username='webhook_buyer')
+        self.order = Order.objects.create(user=buyer, ticket=ticket, quantity=1, total_amount=Decimal('1000'),
+                                          payment_method=Order.PaymentMethod.MOMO)
+        self.momo_order_id = f'ORDER_{buyer.id}_{self.order.id}'
+        self.client = APIClient()
+        enqueue = mock.patch('events.fulfillment.enqueue_fulfillment')
+        self.enqueue = enqueue.start()
+        self.addCleanup(enqueue.stop)
+
+    def redirect(self, result_code='0'):
+        return self.client.get('/payment/momo-payment-success/', {
+            'partnerCode': 'MOMO', 'orderId': self.momo_order_id, 'requestId': 'REQ', 'resultCode': result_code,
+        })
+
+    def notify(self, result_code=0):
+        return self.client.post('/payment/momo-payment-notify/', {
+            'orderId': self.momo_order_id, 'requestId': 'REQ', 'resultCode': result_code,
+        }, format='json')
+
+    def test_success_is_idempotent(self):
+        self.assertEqual(self.redirect().status_code, 200)
+        self.assertEqual(self.notify().status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, Order.PaymentStatus.PAID)
+        self.enqueue.assert_called_once()
+
+    def test_payment_for_a_failed_order_is_a_conflict(self):
+        Order.objects.filter(id=self.order.id).update(payment_status=Order.PaymentStatus.FAILED)
+
+        with self.assertLogs('events.utils', 'ERROR'):
+            self.assertEqual(self.redirect().status_code, 409)
+        with self.assertLogs('events.utils', 'ERROR'):
+            self.assertEqual(self.notify().status_code, 409)
+        self.enqueue.assert_not_called()
+
+    def test_payment_notified_after_expiry_is_a_conflict(self):
+        Order.objects.filter(id=self.order.id).update(expiration_time=now() - timedelta(minutes=1))
+
+        with self.assertLogs('events.utils', 'ERROR'):
+            self.assertEqual(self.notify().status_code, 409)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, Order.PaymentStatus.FAILED)
+
+    def test_failed_payment_after_expiry(self):
+        Order.objects.filter(id=self.order.id).update(expiration_time=now() - timedelta(minutes=1))
+        self.assertEqual(self.notify(result_code=1006).status_code, 400)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class EventListQueryTests(TestCase):
+    """Danh sách sự kiện chạy số truy vấn cố định mỗi trang; bộ đếm đánh giá/sự kiện được cập nhật tăng dần."""
+
+    page_size = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizer = User.objects.create(username='queries_org', role=User.Role.ORGANIZER)
+        attendees = [User.objects.create(username=f'queries_{i}') for i in range(3)]
+        cls.category = EventCategory.objects.create(name='Queries')
+        for i in range(cls.page_size):
+            event = create_event(cls.organizer, f'Queries {i}', category=cls.category, ticket_limit=1000,
+                                 date=now() + timedelta(days=30 + i))
+            TicketType.objects.create(event=event, type='Standard', price=Decimal('100000'), quantity=100)
+            TicketType.objects.create(event=event, type='VIP', price=Decimal('300000'), quantity=20)
+            for j, attendee in enumerate(attendees):
+                Review.objects.create(user=attendee, event=event, rating=(i + j) % 5 + 1, comment='ok')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_event_list_query_count_does_not_depend_on_page_size(self):
+        url = reverse('events-list')
+        with self.assertNumQueries(EVENT_LIST_QUERIES):
+            response = self.client.get(url, {'cateId': self.category.id, 'page_size': self.page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), self.page_size)
+
+        with self.assertNumQueries(EVENT_LIST_QUERIES):
+            response = self.client.get(url, {'cateId': self.category.id, 'page_size': 1})
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_review_and_event_counters_follow_changes(self):
+        events = list(Event.objects.filter(category=self.category)[:3])
+        reviews = list(Review.objects.filter(event__in=events))
+        reviews[0].rating = 5
+        reviews[0].save()
+        reviews[1].active = False
+        reviews[1].save()
+        reviews[2].delete()
+        events[0].active = False
+        events[0].save()
+
+        self.organizer.refresh_from_db()
+        self.assertEqual(self.organizer.organized_event_count,
+                         Event.objects.filter(organizer=self.organizer, active=True).count())
+        for event in Event.objects.filter(category=self.category):
+            ratings = list(event.reviews.filter(active=True).values_list('rating', flat=True))
+            self.assertEqual((event.review_count, event.rating_total), (len(ratings), sum(ratings)))
+
+    def test_deleted_reviews_are_not_counted(self):
+        # Xóa đánh giá là xóa mềm (active=False); danh sách sự kiện và trang feedback cùng chỉ đếm đánh giá còn hoạt động
+        event = Event.objects.filter(category=self.category).order_by('date').first()
+        review = event.reviews.order_by('id').first()
+        self.client.force_authenticate(review.user)
+        self.assertEqual(self.client.delete(f'/reviews/{review.id}/').status_code, 204)
+
+        ratings = list(event.reviews.filter(active=True).values_list('rating', flat=True))
+        listed = self.client.get(reverse('events-list'), {'cateId': self.category.id, 'page_size': 1}).data['results'][0]
+        feedback = self.client.get(f'/events/{event.id}/feedback/').data
+        self.assertEqual(listed['id'], event.id)
+        self.assertEqual(listed['review_count'], len(ratings))
+        self.assertAlmostEqual(listed['average_rating'], sum(ratings) / len(ratings))
+        self.assertEqual(feedback['total_reviews'], len(ratings))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TrendCounterTests(TestCase):
+    """Ghi bộ đếm xu hướng xuống DB: EventTrend và EventEngagement cùng commit hoặc cùng rollback."""
+
+    def setUp(self):
+        organizer = User.objects.create(username='trend_org', role=User.Role.ORGANIZER)
+        self.event = create_event(organizer, 'Trend')
+
+    def test_counts_are_applied_to_totals_and_hourly_buckets(self):
+        trend_counters.record_view(self.event)
+        trend_counters.record_order(self.event)
+
+        trend = EventTrend.objects.get(event=self.event)
+        self.assertEqual((trend.views, trend.interest_level), (1, 4))
+        self.assertEqual(EventEngagement.objects.filter(event=self.event).count(), 1)
+
+    def test_failed_bucket_write_rolls_back_totals(self):
+        with mock.patch.object(trend_counters, 'add_to_buckets', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                trend_counters.record_view(self.event)
+
+        self.assertFalse(EventTrend.objects.filter(event=self.event, views__gt=0).exists())
+        self.assertFalse(EventEngagement.objects.filter(event=self.event).exists())
+
+
+class FakeExpoHandler(BaseHTTPRequestHandler):
+    """
+    Giả lập Expo push API:
+    - /send từ chối request quá EXPO_PUSH_CHUNK_SIZE thông báo, trả DeviceNotRegistered trong ticket
+      cho token có số thứ tự chia hết cho `dead_every`.
+    - /getReceipts trả DeviceNotRegistered cho token có số thứ tự chia `receipt_dead_every` dư 1.
+    """
+
+    token_pattern = re.compile(r'ExponentPushToken\[test-(\d+)\]')
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+
+        if self.path == '/send':
+            with server.lock:
+                server.send_requests += 1
+                server.max_batch = max(server.max_batch, len(payload))
+            if len(payload) > EXPO_PUSH_CHUNK_SIZE:
+                return self.respond(400, {'errors': [{'code': 'PUSH_TOO_MANY_NOTIFICATIONS'}]})
+            tickets = []
+            for message in payload:
+                index = int(self.token_pattern.match(message['to']).group(1))
+                if index % server.dead_every == 0:
+                    tickets.append({'status': 'error', 'message': 'not registered',
+                                    'details': {'error': 'DeviceNotRegistered'}})
+                else:
+                    tickets.append({'status': 'ok', 'id': f"ticket-{index}"})
+            return self.respond(200, {'data': tickets})
+
+        if self.path == '/getReceipts':
+            receipts = {}
+            for ticket_id in payload['ids']:
+                index = int(ticket_id.split('-')[1])
+                if index % server.receipt_dead_every == 1:
+                    receipts[ticket_id] = {'status': 'error', 'details': {'error': 'DeviceNotRegistered'}}
+                else:
+                    receipts[ticket_id] = {'status': 'ok'}
+            return self.respond(200, {'data': receipts})
+
+        self.respond(404, {})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PushNotificationTests(TestCase):
+    """Gửi push qua server Expo giả lập: chia lô đúng giới hạn và xóa token chết từ ticket lẫn receipt."""
+
+    devices = 250
+    dead_every = 20
+    receipt_dead_every = 50
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeExpoHandler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        cls.server.dead_every = cls.dead_every
+        cls.server.receipt_dead_every = cls.receipt_dead_every
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.expo = override_settings(EXPO_PUSH_SEND_URL=f"{base_url}/send",
+                                     EXPO_PUSH_RECEIPTS_URL=f"{base_url}/getReceipts",
+                                     EXPO_RECEIPT_DELAY_SECONDS=0)
+        cls.expo.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.expo.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.send_requests = 0
+        self.server.max_batch = 0
+        User.objects.bulk_create([
+            User(username=f'push_{i}', role=User.Role.ATTENDEE, push_token=f'ExponentPushToken[test-{i}]')
+            for i in range(self.devices)
+        ])
+        self.user_ids = list(User.objects.filter(username__startswith='push_').values_list('id', flat=True))
+        # Tác vụ đọc receipt chạy ngay trong process thay vì đợi worker
+        always_eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', always_eager)
+
+    def remaining_tokens(self):
+        return User.objects.filter(id__in=self.user_ids).exclude(push_token__isnull=True).count()
+
+    def test_messages_are_sent_in_expo_sized_chunks(self):
+        stats = send_push_notification(self.user_ids, 'Test', 'Push test')
+
+        self.assertEqual(stats['devices'], self.devices)
+        self.assertLessEqual(self.server.max_batch, EXPO_PUSH_CHUNK_SIZE)
+        self.assertEqual(self.server.send_requests, -(-self.devices // EXPO_PUSH_CHUNK_SIZE))
+
+    def test_dead_tokens_are_pruned_from_tickets_and_receipts(self):
+        ticket_dead = len(range(0, self.devices, self.dead_every))
+        receipt_dead = len([i for i in range(self.devices)
+                            if i % self.receipt_dead_every == 1 and i % self.dead_every != 0])
+
+        stats = send_push_notification(self.user_ids, 'Test', 'Push test')
+
+        self.assertEqual(stats['pruned'], ticket_dead)
+        self.assertEqual(stats['accepted'], self.devices - ticket_dead)
+        self.assertEqual(self.remaining_tokens(), self.devices - ticket_dead - receipt_dead)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class NotificationFanoutTests(TestCase):
+    """Bộ đếm tiến độ fan-out là best-effort: lỗi cache không được làm task retry và tạo trùng thông báo."""
+
+    def setUp(self):
+        organizer = User.objects.create(username='fanout_org', role=User.Role.ORGANIZER)
+        self.event = create_event(organizer, 'Fanout')
+        self.user_ids = [User.objects.create(username=f'fanout_{i}').id for i in range(3)]
+
+    def test_progress_is_counted(self):
+        create_notifications(self.event.id, 'Tin mới', self.user_ids, fanout_id='f1')
+        create_notifications(self.event.id, 'Tin mới', self.user_ids[:1], fanout_id='f1')
+        self.assertEqual(get_fanout_progress('f1')['created'], 4)
+
+    def test_cache_error_does_not_fail_the_chunk(self):
+        with mock.patch('events.notification_fanout.cache.incr', side_effect=ConnectionError('cache down')), \
+                self.assertLogs('events.notification_fanout', 'WARNING'):
+            created = create_notifications(self.event.id, 'Tin mới', self.user_ids, fanout_id='f2')
+
+        self.assertEqual(created, len(self.user_ids))
+        self.assertEqual(Notification.objects.filter(event=self.event).count(), len(self.user_ids))
+
+
+class BenchmarkCommandTests(TestCase):
+    """Lệnh benchmark không được dùng chung Redis cache đang cấu hình."""
+
+    def test_refuses_the_configured_cache(self):
+        with mock.patch('events.benchmarks.setup_databases') as setup:
+            with self.assertRaises(CommandError):
+                call_command('bench_event_analytics', redis_url=settings.CACHES['default']['LOCATION'])
+        setup.assert_not_called()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AnalyticsTests(TestCase):
+    """Báo cáo phân tích sự kiện và dashboard: số liệu đúng, số truy vấn không tăng theo số sự kiện/đơn hàng."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create(username='analytics_admin', role=User.Role.ADMIN, is_superuser=True)
+        self.buyers = [User.objects.create(username=f'analytics_buyer_{i}') for i in range(4)]
+
+    def create_organizer(self, name, events, orders_per_ticket):
+        organizer = User.objects.create(username=name, role=User.Role.ORGANIZER)
+        for i in range(events):
+            event = create_event(organizer, f'{name} {i}', ticket_limit=1000)
+            for ticket_type, price in (('Standard', '100000'), ('VIP', '300000')):
+                ticket = TicketType.objects.create(event=event, type=ticket_type, price=Decimal(price), quantity=100)
+                for j in range(orders_per_ticket):
+                    status = Order.PaymentStatus.FAILED if j % 3 == 2 else Order.PaymentStatus.PAID
+                    order = Order.objects.create(user=self.buyers[j % len(self.buyers)], ticket=ticket, quantity=2,
+                                                 total_amount=ticket.price * 2, payment_status=status)
+                    if status == Order.PaymentStatus.PAID:
+                        OrderDetail.objects.bulk_create([OrderDetail(order=order, qr_code=f'QR_{order.id}_{n}')
+                                                         for n in (1, 2)])
+            Review.objects.create(user=self.buyers[0], event=event, rating=4, comment='ok')
+        rebuild_sales_rollups()
+        return organizer
+
+    def get(self, user, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_event_analytics_totals(self):
+        organizer = self.create_organizer('analytics_org', events=1, orders_per_ticket=6)
+        event = Event.objects.get(organizer=organizer)
+
+        response, _ = self.get(organizer, f'/events/{event.id}/analytics/')
+
+        # 4 đơn thanh toán x 2 vé cho mỗi loại vé, 2 đơn thất bại mỗi loại
+        self.assertEqual(response.data['tickets_sold'], 16)
+        self.assertEqual(response.data['total_revenue'], Decimal('3200000'))
+        self.assertEqual(response.data['cancellation_rate'], round(4 / 12 * 100, 2))
+        self.assertEqual(response.data['average_rating'], 4.0)
+        self.assertEqual([row['quantity_sold'] for row in response.data['tickets_breakdown']], [8, 8])
+
+    def test_event_analytics_query_count_does_not_depend_on_orders(self):
+        small = Event.objects.get(organizer=self.create_organizer('analytics_small', events=1, orders_per_ticket=1))
+        large = Event.objects.get(organizer=self.create_organizer('analytics_large', events=1, orders_per_ticket=12))
+
+        _, small_queries = self.get(self.admin, f'/events/{small.id}/analytics/')
+        _, large_queries = self.get(self.admin, f'/events/{large.id}/analytics/')
+        self.assertEqual(small_queries, large_queries)
+
+    def test_dashboard_query_count_does_not_depend_on_events(self):
+        small = self.create_organizer('dashboard_small', events=1, orders_per_ticket=3)
+        large = self.create_organizer('dashboard_large', events=5, orders_per_ticket=3)
+
+        response, small_queries = self.get(small, '/events/dashboard-analytics/')
+        self.assertEqual(len(response.data), 1)
+        response, large_queries = self.get(large, '/events/dashboard-analytics/')
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(small_queries, large_queries)
+
+        response, _ = self.get(self.admin, '/events/dashboard-analytics/')
+        totals = {row['organizer_id']: row['total_events'] for row in response.data}
+        self.assertEqual(totals, {small.id: 1, large.id: 5})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class KeysetPaginationTests(TestCase):
+    """Trang theo cursor trùng với trang OFFSET tương ứng, kể cả khi nhiều dòng cùng giá trị cột sắp xếp."""
+
+    rows = 45
+    page_size = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizer = User.objects.create(username='pagination_org', role=User.Role.ORGANIZER)
+        cls.buyer = User.objects.create(username='pagination_buyer')
+        start = now() + timedelta(days=1)
+        Event.objects.bulk_create([
+            Event(organizer=cls.organizer, name=f'Pagination {i}', location='N/A', ticket_limit=0,
+                  date=start + timedelta(minutes=i // 3))
+            for i in range(cls.rows)
+        ])
+        event = Event.objects.filter(organizer=cls.organizer).first()
+        Order.objects.bulk_create([Order(user=cls.buyer, total_amount=Decimal('1000')) for _ in range(cls.rows)])
+        Notification.objects.bulk_create([Notification(user=cls.buyer, event=event, message=f'Pagination {i}')
+                                          for i in range(cls.rows)])
+
+    def paginate(self, paginator_class, queryset, params):
+        paginator = paginator_class()
+        page = paginator.paginate_queryset(queryset, Request(APIRequestFactory().get('/', params)))
+        return [row.pk for row in page], paginator
+
+    def assert_cursor_pages_match_offset_pages(self, paginator_class, queryset):
+        params = {'page_size': self.page_size}
+        for number in range(1, -(-self.rows // self.page_size) + 1):
+            keyset, paginator = self.paginate(paginator_class, queryset, params)
+            offset, _ = self.paginate(paginator_class, queryset, {'page': number, 'page_size': self.page_size})
+            self.assertEqual(keyset, offset, f'page {number}')
+            params = {'page_size': self.page_size, 'cursor': paginator.encode_cursor(*paginator.last_key)}
+        self.assertFalse(paginator.has_next)
+
+    def test_events(self):
+        self.assert_cursor_pages_match_offset_pages(paginators.EventPaginator,
+                                                    Event.objects.filter(organizer=self.organizer))
+
+    def test_orders(self):
+        self.assert_cursor_pages_match_offset_pages(paginators.RecentFirstPaginator,
+                                                    Order.objects.filter(user=self.buyer))
+
+    def test_notifications(self):
+        self.assert_cursor_pages_match_offset_pages(paginators.RecentFirstPaginator,
+                                                    Notification.objects.filter(user=self.buyer))
+
+    def test_reviews_by_event_are_paginated_only_on_request(self):
+        event = Event.objects.filter(organizer=self.organizer).first()
+        for i in range(5):
+            Review.objects.create(user=User.objects.create(username=f'pagination_review_{i}'), event=event,
+                                  rating=i + 1, comment='ok')
+        client = APIClient()
+        url = f'/reviews/by-event/{event.id}/'
+
+        response = client.get(url)
+        self.assertEqual(len(response.data['reviews']), 5)
+        self.assertNotIn('next', response.data)
+
+        response = client.get(url, {'page_size': 3})
+        self.assertEqual(len(response.data['reviews']), 3)
+        self.assertEqual(response.data['total_reviews'], 5)
+        response = client.get(response.data['next'])
+        self.assertEqual(len(response.data['reviews']), 2)
+        self.assertIsNone(response.data['next'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchIndexTests(TestCase):
+    """Tìm kiếm qua chỉ mục: không phân biệt dấu, từ cuối theo tiền tố, khớp mọi từ."""
+
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create(username='search_org', role=User.Role.ORGANIZER)
+        music = EventCategory.objects.create(name='Âm nhạc')
+        names = ['Đêm nhạc Rock Hà Nội', 'Lễ hội ẩm thực Huế', 'Marathon Đà Lạt', 'Nhạc Jazz Đà Nẵng',
+                 'Gala từ thiện Đà Nẵng', 'Hội thảo công nghệ', 'Zumba 2025 Zz']
+        Event.objects.bulk_create([
+            Event(organizer=organizer, name=name, location='N/A', ticket_limit=0, date=now() + timedelta(days=i + 1),
+                  category=music if 'hạc' in name else None, description='<p>Sự kiện &amp; <b>giao lưu</b></p>')
+            for i, name in enumerate(names)
+        ])
+        cls.events = Event.objects.filter(organizer=organizer).order_by('date', 'id')
+        search.index_events(cls.events.values_list('id', flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, query):
+        return [event.name for event in search.filter_events(self.events, query)]
+
+    def test_exact_and_accent_insensitive(self):
+        self.assertEqual(self.names('marathon '), ['Marathon Đà Lạt'])
+        self.assertEqual(self.names('da nang '), ['Nhạc Jazz Đà Nẵng', 'Gala từ thiện Đà Nẵng'])
+        self.assertEqual(self.names('giao luu '), list(self.events.values_list('name', flat=True)))
+
+    def test_last_word_is_a_prefix(self):
+        self.assertEqual(self.names('mara'), ['Marathon Đà Lạt'])
+        self.assertEqual(self.names('da la'), ['Marathon Đà Lạt'])
+        self.assertEqual(self.names('x'), [])
+        self.assertEqual(self.names('mara '), [])
+
+    def test_prefix_ending_in_z_or_digit(self):
+        self.assertEqual(self.names('jaz'), ['Nhạc Jazz Đà Nẵng'])
+        self.assertEqual(self.names('jazz'), ['Nhạc Jazz Đà Nẵng'])
+        self.assertEqual(self.names('zz'), ['Zumba 2025 Zz'])
+        self.assertEqual(self.names('z'), ['Zumba 2025 Zz'])
+        self.assertEqual(self.names('20'), ['Zumba 2025 Zz'])
+        self.assertEqual(self.names('209'), [])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.names('am nhac ha noi'), ['Đêm nhạc Rock Hà Nội'])
+        self.assertEqual(self.names('gala tu thien da nang'), ['Gala từ thiện Đà Nẵng'])
+        self.assertEqual(self.names('gala hue'), [])
+
+    def test_ranking_prefers_name_matches(self):
+        results = search.search_events(self.events, 'nhac ')
+        self.assertEqual({event.name for event in results}, {'Đêm nhạc Rock Hà Nội', 'Nhạc Jazz Đà Nẵng'})
+
+
+class NearbyEventTests(TestCase):
+    """Tìm sự kiện theo bán kính qua geohash trả về đúng các sự kiện của phép tính khoảng cách trên cả bảng."""
+
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create(username='nearby_org', role=User.Role.ORGANIZER)
+        rng = random.Random(7)
+        events = []
+        for i in range(600):
+            # Một nửa quanh Hà Nội, một nửa rải khắp lãnh thổ; vài sự kiện sát các mép ô geohash
+            if i % 2:
+                lat, lng = rng.gauss(21.0285, 0.1), rng.gauss(105.8542, 0.1)
+            else:
+                lat, lng = rng.uniform(8.6, 23.3), rng.uniform(102.2, 109.4)
+            events.append(Event(organizer=organizer, name=f'Nearby {i}', location='N/A', ticket_limit=0,
+                                date=now() + timedelta(days=1), latitude=lat, longitude=lng,
+                                geohash=geo.encode(lat, lng)))
+        Event.objects.bulk_create(events)
+        cls.events = Event.objects.filter(organizer=organizer)
+        cls.rows = list(cls.events.values_list('id', 'latitude', 'longitude'))
+
+    def expected(self, lat, lng, radius_km, limit):
+        ids = [row[0] for row in self.rows]
+        distances = geo.distances_km(lat, lng, [row[1] for row in self.rows], [row[2] for row in self.rows])
+        inside = sorted((distance, event_id) for event_id, distance in zip(ids, distances) if distance <= radius_km)
+        return [event_id for _, event_id in inside][:limit]
+
+    def test_matches_exact_distance_scan(self):
+        rng = random.Random(11)
+        points = [(21.0285, 105.8542), (16.0544, 108.2022)] + [
+            (rng.uniform(8.6, 23.3), rng.uniform(102.2, 109.4)) for _ in range(10)
+        ]
+        for lat, lng in points:
+            for radius in (1, 5, 25, 150):
+                found = [event_id for event_id, _ in geo.nearby_event_ids(self.events, lat, lng, radius, limit=30)]
+                self.assertEqual(found, self.expected(lat, lng, radius, 30), (lat, lng, radius))
+
+    def test_queryset_filters_apply(self):
+        self.events.filter(id__in=[row[0] for row in self.rows[1::4]]).update(active=False)
+        active = self.events.filter(active=True)
+        active_ids = set(active.values_list('id', flat=True))
+        found = [event_id for event_id, _ in geo.nearby_event_ids(active, 21.0285, 105.8542, 25, limit=50)]
+        expected = [event_id for event_id in self.expected(21.0285, 105.8542, 25, len(self.rows))
+                    if event_id in active_ids][:50]
+        self.assertEqual(found, expected)
+
+    def test_cells_ending_in_z(self):
+        # Góc đông bắc có geohash "zzz...": khoảng của các ô này không có cận trên
+        organizer = User.objects.get(username='nearby_org')
+        corner = [create_event(organizer, f'Corner {i}', latitude=89.99 - i * 0.001, longitude=179.99 - i * 0.001)
+                  for i in range(3)]
+        self.assertTrue(all(event.geohash.startswith('zz') for event in corner))
+        self.assertEqual(geo._ranges(['w7y', 'w7z', 'w80', 'zzz']), [['w7y', 'w81'], ['zzz', None]])
+
+        found = [event_id for event_id, _ in geo.nearby_event_ids(self.events, 89.99, 179.99, 1)]
+        self.assertEqual(found, [event.id for event in corner])
+
+
+class RecommendationFeatureTests(TestCase):
+    """Trích đặc trưng gợi ý bằng một truy vấn, đúng cột one-hot và số liệu EventTrend."""
+
+    def test_features_from_one_query(self):
+        organizer = User.objects.create(username='features_org', role=User.Role.ORGANIZER)
+        categories = [EventCategory.objects.create(name=f'Features {i}') for i in range(3)]
+        Event.objects.bulk_create([
+            Event(organizer=organizer, name=f'Features {i}', location='N/A', ticket_limit=0,
+                  date=now() + timedelta(days=30), category=None if i % 5 == 0 else categories[i % 3])
+            for i in range(40)
+        ])
+        events = list(Event.objects.filter(organizer=organizer).order_by('id'))
+        EventTrend.objects.bulk_create([EventTrend(event=event, views=i * 7, interest_level=i)
+                                        for i, event in enumerate(events) if i % 4])
+        engine = RecommendationEngine()
+        vocabulary = engine.category_vocabulary()
+
+        with self.assertNumQueries(1):
+            event_ids, features, coordinates = engine.prepare_ml_data(
+                engine.upcoming_events().filter(organizer=organizer), vocabulary=vocabulary)
+
+        self.assertEqual(sorted(event_ids.tolist()), [event.id for event in events])
+        columns = {category_id: 2 + position for position, (category_id, _) in enumerate(vocabulary)}
+        rows = dict(zip(event_ids.tolist(), features))
+        for i, event in enumerate(events):
+            row = rows[event.id]
+            self.assertEqual(row[:2].tolist(), [i * 7, i] if i % 4 else [0, 0])
+            self.assertEqual(row[2:].sum(), 1)
+            self.assertEqual(row[columns[event.category_id or 0]], 1)
+        self.assertEqual(coordinates.shape, (len(events), 2))
+
+
+@override_settings(CACHES=TEST_CACHES, RECOMMENDATION_PRECOMPUTE_CHUNK_SIZE=3)
+class RecommendationPrecomputeTests(TestCase):
+    """Tác vụ tính sẵn gợi ý chia người dùng thành các subtask; mỗi lô lưu danh sách của người dùng trong lô."""
+
+    def setUp(self):
+        cache.clear()
+        organizer = User.objects.create(username='precompute_org', role=User.Role.ORGANIZER)
+        categories = [EventCategory.objects.create(name=f'Precompute {i}') for i in range(2)]
+        events = [create_event(organizer, f'Precompute {i}', category=categories[i % 2], ticket_limit=100)
+                  for i in range(6)]
+        tickets = [TicketType.objects.create(event=event, type='Standard', price=Decimal('1000'), quantity=10)
+                   for event in events[:2]]
+        self.attendees = [User.objects.create(username=f'precompute_{i}') for i in range(7)]
+        for i, attendee in enumerate(self.attendees[:4]):
+            Order.objects.create(user=attendee, ticket=tickets[i % 2], total_amount=Decimal('1000'),
+                                 payment_status=Order.PaymentStatus.PAID)
+        self.category_events = {category.name: set(Event.objects.filter(category=category).values_list('id', flat=True))
+                                for category in categories}
+        always_eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', always_eager)
+
+    def test_lists_are_precomputed_in_chunk_subtasks(self):
+        stats = precompute_recommendations.apply().get()
+
+        self.assertEqual(stats, {'users': len(self.attendees), 'chunks': 3})
+        for i, attendee in enumerate(self.attendees):
+            event_ids = cache.get(recommendations._events_key(attendee.id))
+            self.assertIsNotNone(event_ids, attendee.username)
+            if i < 4:
+                # Sự kiện cùng danh mục với vé đã mua được xếp trước
+                self.assertIn(event_ids[0], self.category_events[f'Precompute {i % 2}'])
+
+    def test_cancelled_event_is_filtered_without_dropping_other_lists(self):
+        precompute_recommendations.apply()
+        attendee = self.attendees[0]
+        cached = cache.get(recommendations._events_key(attendee.id))
+        cancelled = Event.objects.get(id=cached[0])
+
+        self.client = APIClient()
+        self.client.force_authenticate(cancelled.organizer)
+        response = self.client.patch(f'/events/{cancelled.id}/cancel/')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(cache.get(recommendations._events_key(attendee.id)), cached)
+        self.assertNotIn(cancelled.id, [event.id for event in recommendations.recommend(attendee)])
+
+
+class QRRenderingTests(TestCase):
+
+    def test_batch_matches_single_rendering_in_order(self):
+        qr_codes = [f'QR_{100000 + i}_{2000 + i % 7}_{i % 10 + 1}' for i in range(QR_PARALLEL_THRESHOLD + 8)]
+
+        buffers = generate_qr_images(qr_codes, workers=2)
+
+        self.assertEqual([buffer.getvalue() for buffer in buffers], [render_qr_png(code) for code in qr_codes])
+        self.assertTrue(all(buffer.tell() == 0 for buffer in buffers))
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_RATE_LIMITS={},
+                   EMAIL_RATE_LIMIT_PER_SECOND=0)
+class MailDeliveryTests(TestCase):
+
+    def test_messages_are_sent_over_one_connection(self):
+        messages = [build_message('Test', 'Xin chào', f'user{i}@eventgo.local') for i in range(25)]
+
+        self.assertEqual(send_messages(messages), len(messages))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         sorted(f'user{i}@eventgo.local' for i in range(25)))
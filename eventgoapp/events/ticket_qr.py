@@ -0,0 +1,88 @@
+import hashlib
+import logging
+
+import cloudinary.uploader
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+
+from .utils import render_qr_png, generate_qr_images, QR_VERSION, QR_ERROR_CORRECTION, QR_MASK_PATTERN
+
+logger = logging.getLogger(__name__)
+
+QR_SIGNING_SALT = 'events.ticket-qr'
+
+
+def _signer():
+    return signing.Signer(salt=QR_SIGNING_SALT)
+
+
+def _cache_key(qr_code):
+    return f"ticket_qr:{QR_VERSION}:{QR_ERROR_CORRECTION}:{QR_MASK_PATTERN}:{qr_code}"
+
+
+def qr_signature(qr_code):
+    return _signer().signature(qr_code)
+
+
+def verify_qr_signature(qr_code, signature):
+    return bool(signature) and constant_time_compare(qr_signature(qr_code), signature)
+
+
+def qr_etag(qr_code):
+    """ETag của ảnh QR chỉ phụ thuộc vào mã và tham số tạo ảnh nên tính được mà không cần tạo ảnh."""
+    return '"%s"' % hashlib.sha1(_cache_key(qr_code).encode()).hexdigest()
+
+
+def qr_image_path(qr_code):
+    """Đường dẫn có chữ ký tới ảnh QR, mở được mà không cần đăng nhập (ví dụ từ email)."""
+    path = reverse('orders-ticket-qr', kwargs={'qr_code': qr_code})
+    return f"{path}?sig={qr_signature(qr_code)}"
+
+
+def qr_image_url(qr_code, request=None):
+    path = qr_image_path(qr_code)
+    if request is not None:
+        return request.build_absolute_uri(path)
+    return f"{settings.BACKEND_BASE_URL.rstrip('/')}{path}"
+
+
+def get_qr_png(qr_code):
+    """Lấy ảnh PNG của mã QR từ cache, tạo và lưu vào cache nếu chưa có."""
+    key = _cache_key(qr_code)
+    png = cache.get(key)
+    if png is None:
+        png = render_qr_png(qr_code)
+        cache.set(key, png, settings.TICKET_QR_CACHE_TIMEOUT)
+    return png
+
+
+def warm_qr_cache(qr_codes):
+    """Tạo trước ảnh QR của nhiều vé theo lô và ghi vào cache bằng một lệnh."""
+    qr_codes = list(qr_codes)
+    buffers = generate_qr_images(qr_codes)
+    cache.set_many(
+        {_cache_key(qr_code): buffer.getvalue() for qr_code, buffer in zip(qr_codes, buffers)},
+        settings.TICKET_QR_CACHE_TIMEOUT
+    )
+
+
+def persist_qr_image(order_detail):
+    """Tải ảnh QR lên Cloudinary khi được yêu cầu và lưu public_id vào OrderDetail."""
+    if order_detail.qr_image:
+        return order_detail.qr_image.url
+
+    upload_result = cloudinary.uploader.upload(
+        get_qr_png(order_detail.qr_code),
+        folder='tickets',
+        public_id=order_detail.qr_code,
+        resource_type='image',
+        format='png',
+        overwrite=True
+    )
+    order_detail.qr_image = upload_result['public_id']
+    order_detail.save(update_fields=['qr_image', 'updated_at'])
+    logger.info(f"QR image uploaded: public_id={upload_result['public_id']}, url={upload_result['secure_url']}")
+    return upload_result['secure_url']
@@ -0,0 +1,199 @@
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, Case, When, Value
+from django.utils.timezone import now
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from .models import Event, EventTrend
+from .engagement import METRICS, add_to_buckets
+
+logger = logging.getLogger(__name__)
+
+# Hash chờ ghi: field "<event_id>:<metric>:<giờ tính từ epoch>" -> số lượng cộng dồn
+PENDING_KEY = 'event_trend:pending'
+# Hash đang được ghi xuống DB; còn sót lại nếu lần flush trước bị dừng giữa chừng
+FLUSHING_KEY_PREFIX = 'event_trend:flushing:'
+FLUSH_LOCK_KEY = 'event_trend:flush-lock'
+FLUSH_LOCK_TIMEOUT = 300
+# Chỉ xóa khóa khi nó vẫn mang token của tiến trình đang giữ (so sánh và xóa nguyên tử trên Redis)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+FLUSH_CHUNK_SIZE = 500
+
+
+def redis_client():
+    try:
+        return get_redis_connection('default')
+    except NotImplementedError:
+        # Cache không phải Redis (ví dụ LocMemCache khi phát triển): ghi thẳng xuống DB
+        return None
+
+
+def _current_hour():
+    return int(now().timestamp()) // 3600
+
+
+def _hour_start(hour):
+    return datetime.fromtimestamp(hour * 3600, tz=dt_timezone.utc)
+
+
+def record(event, **counts):
+    """
+    Cộng các chỉ số tương tác (views, interest, orders, reviews) của giờ hiện tại vào bộ đệm Redis và điểm
+    của sự kiện trên các bảng xếp hạng xu hướng trong một round-trip; flush_trend_counters ghi xuống
+    EventTrend và EventEngagement theo lịch.
+    """
+    from .trending import add_to_pipeline
+
+    counts = {metric: value for metric, value in counts.items() if value}
+    hour = _current_hour()
+    client = redis_client()
+    if client is None:
+        _apply({(event.id, hour): counts})
+        return
+
+    pipe = client.pipeline(transaction=False)
+    for metric, value in counts.items():
+        pipe.hincrby(PENDING_KEY, f"{event.id}:{metric}:{hour}", value)
+    add_to_pipeline(pipe, event, **counts)
+    pipe.execute()
+
+
+def record_view(event):
+    record(event, views=1, interest=1)
+
+
+def record_review(event):
+    record(event, interest=2, reviews=1)
+
+
+def record_order(event):
+    record(event, interest=3, orders=1)
+
+
+def _empty_counts():
+    totals = {metric: 0 for metric in METRICS}
+    totals['by_hour'] = {}
+    return totals
+
+
+def pending_counts_many(event_ids):
+    """
+    Các chỉ số của các sự kiện còn trong bộ đệm, chưa ghi xuống DB; đọc cả bộ đệm bằng một lệnh HGETALL.
+
+    Returns:
+        {event_id: dict tổng theo chỉ số, kèm 'by_hour': {thời điểm đầu giờ: {metric: n}}}
+        cho mọi event_id được yêu cầu.
+    """
+    result = {event_id: _empty_counts() for event_id in event_ids}
+    client = redis_client()
+    if client is None:
+        return result
+
+    for (event_id, hour), bucket in _parse(client.hgetall(PENDING_KEY)).items():
+        totals = result.get(event_id)
+        if totals is None:
+            continue
+        hour_counts = totals['by_hour'].setdefault(_hour_start(hour), {})
+        for metric, value in bucket.items():
+            totals[metric] += value
+            hour_counts[metric] = hour_counts.get(metric, 0) + value
+    return result
+
+
+def _parse(raw):
+    counts = defaultdict(dict)
+    for field, value in raw.items():
+        event_id, metric, hour = field.decode().split(':')
+        bucket = counts[(int(event_id), int(hour))]
+        bucket[metric] = bucket.get(metric, 0) + int(value)
+    return counts
+
+
+def _apply(counts):
+    """
+    Ghi các lượng cộng dồn {(event_id, giờ): {metric: n}} xuống DB: tổng trọn đời vào EventTrend
+    (F() + Case/When theo lô) và theo giờ vào EventEngagement, trong một transaction để lỗi giữa chừng
+    không để lại EventTrend đã cộng trong khi hash flush vẫn còn và sẽ được cộng lại.
+    """
+    with transaction.atomic():
+        return _apply_counts(counts)
+
+
+def _apply_counts(counts):
+    existing = set(Event.objects.filter(id__in={event_id for event_id, _ in counts}).values_list('id', flat=True))
+    counts = {key: bucket for key, bucket in counts.items() if key[0] in existing}
+
+    totals = defaultdict(lambda: {'views': 0, 'interest': 0})
+    for (event_id, _), bucket in counts.items():
+        totals[event_id]['views'] += bucket.get('views', 0)
+        totals[event_id]['interest'] += bucket.get('interest', 0)
+
+    event_ids = [event_id for event_id, total in totals.items() if total['views'] or total['interest']]
+    EventTrend.objects.bulk_create([EventTrend(event_id=event_id) for event_id in event_ids], ignore_conflicts=True)
+    for start in range(0, len(event_ids), FLUSH_CHUNK_SIZE):
+        chunk = event_ids[start:start + FLUSH_CHUNK_SIZE]
+        EventTrend.objects.filter(event_id__in=chunk).update(
+            views=F('views') + Case(
+                *[When(event_id=event_id, then=Value(totals[event_id]['views'])) for event_id in chunk],
+                default=Value(0)
+            ),
+            interest_level=F('interest_level') + Case(
+                *[When(event_id=event_id, then=Value(totals[event_id]['interest'])) for event_id in chunk],
+                default=Value(0)
+            )
+        )
+
+    add_to_buckets({(event_id, _hour_start(hour)): bucket for (event_id, hour), bucket in counts.items()})
+    return len(totals)
+
+
+def flush_trend_counters():
+    """
+    Ghi bộ đệm xuống DB. Hash chờ được đổi tên nguyên tử sang một khóa flush riêng nên các lượt tăng mới
+    không bị mất. Mỗi khóa flush được ghi trong một transaction và chỉ bị xóa sau khi transaction commit:
+    lỗi khi ghi làm transaction rollback và khóa được xử lý lại ở lần sau. Chỉ khi process chết đúng giữa
+    commit và lệnh xóa khóa thì khóa đó mới bị cộng lại.
+
+    Returns:
+        Số sự kiện đã được cập nhật.
+    """
+    client = redis_client()
+    if client is None:
+        return 0
+
+    # Chỉ một tiến trình flush tại một thời điểm để khóa flush còn sót không bị ghi hai lần
+    token = uuid.uuid4().hex
+    if not client.set(FLUSH_LOCK_KEY, token, nx=True, ex=FLUSH_LOCK_TIMEOUT):
+        return 0
+
+    updated = 0
+    try:
+        try:
+            client.rename(PENDING_KEY, f"{FLUSHING_KEY_PREFIX}{uuid.uuid4().hex}")
+        except ResponseError:
+            # Bộ đệm đang trống (RENAME lỗi khi khóa không tồn tại)
+            pass
+
+        for key in client.scan_iter(match=f"{FLUSHING_KEY_PREFIX}*"):
+            counts = _parse(client.hgetall(key))
+            if counts:
+                updated += _apply(counts)
+            # _apply đã commit; một ngoại lệ ở trên giữ lại khóa cho lần flush sau
+            client.delete(key)
+    finally:
+        # Khóa có thể đã hết hạn và bị tiến trình khác lấy; GET rồi DEL riêng lẻ có thể xóa nhầm khóa của nó
+        client.eval(RELEASE_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, token)
+
+    if updated:
+        logger.info(f"Đã ghi bộ đếm xu hướng của {updated} sự kiện xuống EventTrend")
+    return updated
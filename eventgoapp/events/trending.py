@@ -0,0 +1,234 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db.models.functions import Coalesce
+from django.db.models import Value
+from django.utils.text import slugify
+
+from .models import Event
+from .trend_counters import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Điểm xu hướng = 0.7 * lượt xem + 0.3 * mức quan tâm, mỗi lượt cộng được nhân 2^((t - epoch) / chu kỳ bán rã)
+# nên điểm cũ giảm một nửa sau mỗi chu kỳ so với điểm mới mà không cần cập nhật lại các phần tử cũ
+WEIGHTS = {'views': 0.7, 'interest': 0.3}
+# Epoch được đặt lại sau mỗi kỳ để hệ số 2^(...) không tràn số; bảng của kỳ trước được chuyển sang kỳ mới
+# bằng ZUNIONSTORE ... WEIGHTS
+REBASE_PERIOD = 7 * 24 * 3600
+BOARD_KEY = 'trending:{epoch}:{board}'
+READY_KEY = 'trending-ready:{epoch}'
+SEED_KEY = 'trending-seed:{epoch}:{board}'
+REBUILD_LOCK_KEY = 'trending:rebuild-lock'
+REBUILD_LOCK_TIMEOUT = 300
+BOARD_ALL = 'all'
+REBUILD_CHUNK_SIZE = 1000
+
+
+def _epoch(timestamp=None):
+    timestamp = time.time() if timestamp is None else timestamp
+    return int(timestamp // REBASE_PERIOD * REBASE_PERIOD)
+
+
+def _half_life():
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600
+
+
+def _decay_factor(timestamp=None):
+    timestamp = time.time() if timestamp is None else timestamp
+    return 2 ** ((timestamp - _epoch(timestamp)) / _half_life())
+
+
+def _slug(text):
+    # slugify bỏ dấu bằng NFKD nhưng "đ" không có dạng tách nên phải thay trước
+    return slugify(text.replace('đ', 'd').replace('Đ', 'D'))
+
+
+def city_of(location):
+    """Thành phố của sự kiện: phần cuối của địa chỉ sau dấu phẩy, bỏ dấu ("Quận 1, TP. Hồ Chí Minh" -> "tp-ho-chi-minh")."""
+    return _slug((location or '').rsplit(',', 1)[-1])
+
+
+def board_name(category_id=None, city=None):
+    """Tên bảng xếp hạng ứng với bộ lọc: chung, theo danh mục, theo thành phố hoặc theo cả hai."""
+    if category_id and city:
+        return f'category:{category_id}:city:{city}'
+    if category_id:
+        return f'category:{category_id}'
+    if city:
+        return f'city:{city}'
+    return BOARD_ALL
+
+
+def boards_for(category_id, location):
+    """Các bảng xếp hạng chứa một sự kiện: bảng chung, của danh mục, của thành phố và của cặp danh mục/thành phố."""
+    city = city_of(location)
+    boards = [BOARD_ALL]
+    if category_id:
+        boards.append(board_name(category_id))
+    if city:
+        boards.append(board_name(city=city))
+    if category_id and city:
+        boards.append(board_name(category_id, city))
+    return boards
+
+
+def _key(board, epoch=None):
+    return BOARD_KEY.format(epoch=_epoch() if epoch is None else epoch, board=board)
+
+
+def add_to_pipeline(pipe, event, **counts):
+    """Thêm các lệnh ZINCRBY cộng điểm đã nhân hệ số thời gian của sự kiện vào pipeline của hot path."""
+    score = sum(WEIGHTS.get(metric, 0) * value for metric, value in counts.items())
+    if not score:
+        return
+    epoch = _epoch()
+    score *= _decay_factor()
+    for board in boards_for(event.category_id, event.location):
+        pipe.zincrby(_key(board, epoch), score, event.id)
+
+
+def _rebuild(client, epoch):
+    """
+    Dựng bảng của kỳ `epoch`: chuyển các bảng của kỳ trước sang (nhân 2^(-kỳ / chu kỳ bán rã)), hoặc khi
+    khởi động lạnh tính lại từ EventTrend của các sự kiện sắp diễn ra.
+    """
+    previous = epoch - REBASE_PERIOD
+    prefix = BOARD_KEY.format(epoch=previous, board='')
+    previous_keys = list(client.scan_iter(match=f'{prefix}*'))
+    pipe = client.pipeline(transaction=False)
+    if previous_keys:
+        carry = 2 ** (-REBASE_PERIOD / _half_life())
+        for old_key in previous_keys:
+            new_key = _key(old_key.decode()[len(prefix):], epoch)
+            # Gộp cả các lượt cộng đã ghi vào kỳ mới trước khi chuyển kỳ
+            pipe.zunionstore(new_key, {old_key: carry, new_key: 1})
+            pipe.expire(old_key, REBASE_PERIOD)
+        stats = {'carried': len(previous_keys)}
+    else:
+        factor = _decay_factor()
+        rows = Event.objects.filter(status=Event.EventStatus.UPCOMING, active=True).order_by().values_list(
+            'id', 'category_id', 'location',
+            Coalesce('trends__views', Value(0)), Coalesce('trends__interest_level', Value(0))
+        )
+        boards = {}
+        for event_id, category_id, location, views, interest in rows.iterator(chunk_size=REBUILD_CHUNK_SIZE):
+            score = (WEIGHTS['views'] * views + WEIGHTS['interest'] * interest) * factor
+            for board in boards_for(category_id, location):
+                boards.setdefault(board, {})[event_id] = score
+        for board, scores in boards.items():
+            # Ghi vào khóa tạm rồi cộng gộp để không mất các lượt đã ghi vào kỳ mới trong lúc dựng
+            key, seed_key = _key(board, epoch), SEED_KEY.format(epoch=epoch, board=board)
+            items = list(scores.items())
+            for start in range(0, len(items), REBUILD_CHUNK_SIZE):
+                pipe.zadd(seed_key, dict(items[start:start + REBUILD_CHUNK_SIZE]))
+            pipe.zunionstore(key, {seed_key: 1, key: 1})
+            pipe.delete(seed_key)
+        stats = {'rebuilt': len(boards)}
+    pipe.set(READY_KEY.format(epoch=epoch), 1, ex=2 * REBASE_PERIOD)
+    pipe.execute()
+    logger.info(f"Đã dựng bảng xếp hạng xu hướng kỳ {epoch}: {stats}")
+    return stats
+
+
+def ensure_boards(client=None):
+    """Dựng bảng của kỳ hiện tại nếu chưa có (chuyển kỳ hoặc khởi động lạnh); chỉ một tiến trình dựng tại một thời điểm."""
+    client = client or redis_client()
+    if client is None:
+        return None
+    epoch = _epoch()
+    if client.exists(READY_KEY.format(epoch=epoch)):
+        return {}
+    if not client.set(REBUILD_LOCK_KEY, 1, nx=True, ex=REBUILD_LOCK_TIMEOUT):
+        return {'skipped': True}
+    try:
+        return _rebuild(client, epoch)
+    finally:
+        client.delete(REBUILD_LOCK_KEY)
+
+
+def rebuild_boards():
+    """Xóa bảng của kỳ hiện tại rồi dựng lại từ EventTrend (khi dữ liệu trong Redis bị mất hoặc sai lệch)."""
+    client = redis_client()
+    if client is None:
+        return None
+    epoch = _epoch()
+    keys = list(client.scan_iter(match=BOARD_KEY.format(epoch=epoch, board='*')))
+    keys += list(client.scan_iter(match=BOARD_KEY.format(epoch=epoch - REBASE_PERIOD, board='*')))
+    if keys:
+        client.delete(*keys)
+    client.delete(READY_KEY.format(epoch=epoch))
+    return ensure_boards(client)
+
+
+def remove(event_id):
+    """Bỏ sự kiện khỏi mọi bảng của kỳ hiện tại (khi sự kiện bị hủy)."""
+    client = redis_client()
+    if client is None:
+        return
+    event = Event.objects.filter(id=event_id).values('category_id', 'location').first()
+    if event is None:
+        return
+    pipe = client.pipeline(transaction=False)
+    for board in boards_for(event['category_id'], event['location']):
+        pipe.zrem(_key(board), event_id)
+    pipe.execute()
+
+
+def _upcoming():
+    return Event.objects.filter(status=Event.EventStatus.UPCOMING, active=True) \
+        .select_related('organizer', 'category').prefetch_related('tickets')
+
+
+def _top_from_sql(limit, category_id=None, city=None):
+    # Cache không phải Redis (phát triển): xếp hạng bằng SQL như trước
+    events = _upcoming().annotate(
+        trend_score=0.7 * Coalesce('trends__views', Value(0)) + 0.3 * Coalesce('trends__interest_level', Value(0))
+    ).order_by('-trend_score', 'id')
+    if category_id:
+        events = events.filter(category_id=category_id)
+    if not city:
+        return list(events[:limit])
+    return [event for event in events if city_of(event.location) == city][:limit]
+
+
+def top_events(limit=5, category_id=None, city=None):
+    """
+    Các sự kiện sắp diễn ra có điểm xu hướng cao nhất (toàn hệ thống, theo danh mục hoặc theo thành phố):
+    ZREVRANGE trên bảng của kỳ hiện tại rồi một truy vấn Event. Phần tử đã hủy/kết thúc hoặc đã đổi
+    danh mục/thành phố của bảng đang đọc bị loại khi đọc và xóa khỏi bảng. Khi lọc cả danh mục lẫn thành phố,
+    bảng của cặp danh mục/thành phố được đọc; nếu bảng đó chưa có (dựng trước khi có bảng theo cặp, hoặc chưa
+    có sự kiện nào) thì xếp hạng bằng SQL.
+    """
+    city = _slug(city) if city else None
+    client = redis_client()
+    if client is None:
+        return _top_from_sql(limit, category_id, city)
+
+    key = _key(board_name(category_id, city))
+    ensure_boards(client)
+    if category_id and city and not client.exists(key):
+        return _top_from_sql(limit, category_id, city)
+
+    events = []
+    start = 0
+    # Đọc dư để bù các phần tử không còn hợp lệ; thường chỉ cần một vòng
+    while len(events) < limit:
+        ids = [int(member) for member in client.zrevrange(key, start, start + 2 * limit - 1)]
+        if not ids:
+            break
+        start += len(ids)
+        candidates = _upcoming().in_bulk(ids)
+        stale = []
+        for event_id in ids:
+            event = candidates.get(event_id)
+            if event is None or (category_id and event.category_id != int(category_id)) \
+                    or (city and city_of(event.location) != city):
+                stale.append(event_id)
+            elif len(events) < limit:
+                events.append(event)
+        if stale:
+            client.zrem(key, *stale)
+            start -= len(stale)
+    return events
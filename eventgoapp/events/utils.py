@@ -1,11 +1,11 @@
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 import qrcode
 import io
 from django.core.files.base import ContentFile
 
-from django.db.models import Sum
-from .models import User, Order, OrderDetail
 
 logger = logging.getLogger(__name__)
 
@@ -22,22 +22,50 @@ def generate_qr_image(qr_data):
         raise
 
 
+# Mã vé có dạng QR_<order>_<ticket>_<n> nên version 2 (mức sửa lỗi M) đủ chứa; mã dài hơn sẽ tự tăng version.
+QR_VERSION = 2
+QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_M
+# Cố định mask để bỏ qua bước chấm điểm 8 mask, chiếm phần lớn thời gian tạo mã.
+QR_MASK_PATTERN = 0
+# Dưới ngưỡng này chi phí khởi tạo process pool lớn hơn thời gian tạo mã.
+QR_PARALLEL_THRESHOLD = 64
 
-def get_customer_rank(user):
-    total_spent = Order.objects.filter(
-        user=user,
-        payment_status=Order.PaymentStatus.PAID
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
 
-    event_count = OrderDetail.objects.filter(
-        order__user=user,
-        order__payment_status=Order.PaymentStatus.PAID
-    ).count()
+def render_qr_png(qr_data):
+    """Tạo ảnh PNG 1-bit của mã QR và trả về bytes (dùng được trong process pool)."""
+    return _render_qr_buffer(qr_data).getvalue()
+
+
+def _render_qr_buffer(qr_data):
+    qr = qrcode.QRCode(
+        version=QR_VERSION,
+        error_correction=QR_ERROR_CORRECTION,
+        mask_pattern=QR_MASK_PATTERN
+    )
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    qr.make_image().save(buffer, format='PNG', optimize=True)
+    buffer.seek(0)
+    return buffer
+
+
+def generate_qr_images(qr_codes, workers=None):
+    """
+    Tạo ảnh QR cho nhiều mã cùng lúc.
+
+    Lô lớn được chia cho một process pool; lô nhỏ, hoặc khi đang chạy trong process daemon
+    (worker prefork của Celery không được tạo process con), được tạo ngay trong process hiện tại.
+
+    Returns:
+        Danh sách BytesIO theo đúng thứ tự của `qr_codes`, con trỏ đặt ở đầu buffer.
+    """
+    qr_codes = list(qr_codes)
+    if len(qr_codes) < QR_PARALLEL_THRESHOLD or multiprocessing.current_process().daemon:
+        return [_render_qr_buffer(qr_code) for qr_code in qr_codes]
+
+    workers = workers or multiprocessing.cpu_count()
+    chunksize = max(1, len(qr_codes) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [io.BytesIO(data) for data in executor.map(render_qr_png, qr_codes, chunksize=chunksize)]
 
-    if total_spent >= 1000000 or event_count >= 10:
-        return 'gold'
-    elif total_spent >= 500000 or event_count >= 5:
-        return 'silver'
-    elif total_spent > 0 or event_count > 0:
-        return 'bronze'
-    return 'none'
\ No newline at end of file
@@ -1,10 +1,10 @@
 import base64
 from datetime import timedelta
 from decimal import Decimal
-import cloudinary.uploader
 from django.contrib.auth import logout
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from django.db import transaction, models
+from django.db import transaction
 from django.utils.timezone import now
 from rest_framework import viewsets, permissions, status, parsers
 from rest_framework.decorators import action
@@ -12,7 +12,6 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
-from django.core.mail import send_mail
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
@@ -20,23 +19,42 @@ import json
 import requests
 import hashlib
 import hmac
-from django.db.models import F, Sum, Avg, ExpressionWrapper, DurationField, Q
-from . import paginators
-from .utils import generate_qr_image, logger
+from django.db.models import Q
+from . import paginators, inventory, fulfillment, ticket_qr, notification_fanout, trend_counters, analytics, loyalty, \
+    recommendations, trending, response_cache, search, suggestions, geo
+from .utils import logger
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
-from .recommendation_engine import RecommendationEngine
-from .utils import get_customer_rank
-from events.models import Review, User, Event, TicketType, Order, OrderDetail, EventCategory, Discount, EventTrend, Notification
+from events.models import Review, User, Event, TicketType, Order, OrderDetail, EventCategory, Discount, Notification
 from events.serializers import ReviewSerializer, UserSerializer, EventSerializer, TicketSerializer, OrderSerializer, \
     EventCategorySerializer, DiscountSerializer, ChangePasswordSerializer, OrderDetailSerializer, \
     NotificationSerializer, DeleteEventSerializer
 
 
+def _paid_conflict(order, source):
+    """
+    Cổng thanh toán báo thành công nhưng đơn không chuyển được sang PAID. Trả None nếu đơn đã PAID từ trước
+    (cổng gọi lại nhiều lần); nếu đơn đã FAILED (hết hạn, vé đã được nhả) thì người mua đã bị trừ tiền mà
+    không có vé: ghi log để hoàn tiền/đối soát và trả 409.
+    """
+    order.refresh_from_db(fields=['payment_status'])
+    if order.payment_status == Order.PaymentStatus.PAID:
+        return None
+    logger.error(f"Cần hoàn tiền/đối soát: {source} báo thanh toán thành công cho đơn hàng #{order.id} "
+                 f"(số tiền {order.total_amount}) đang ở trạng thái {order.payment_status}")
+    return Response({
+        "error": "Đơn hàng đã hết hạn hoặc đã bị hủy trước khi thanh toán được xác nhận. "
+                 "Khoản thanh toán sẽ được đối soát và hoàn tiền.",
+        "order_id": order.id
+    }, status=status.HTTP_409_CONFLICT)
+
+
 class UserViewSet(viewsets.GenericViewSet, generics.CreateAPIView, generics.UpdateAPIView):
     queryset = User.objects.filter(is_active=True)
     serializer_class = UserSerializer
     parser_classes = [parsers.MultiPartParser, parsers.FormParser, parsers.JSONParser]
+    # Dùng cho my-tickets và my-notifications
+    pagination_class = paginators.RecentFirstPaginator
 
     def get_permissions(self):
         if self.action == 'list':
@@ -81,13 +99,15 @@ class UserViewSet(viewsets.GenericViewSet, generics.CreateAPIView, generics.Upda
 
     @action(methods=['get'], url_path='my-rank', detail=False, permission_classes=[IsAuthenticated])
     def get_my_rank(self, request):
-        rank = get_customer_rank(request.user)
-        return Response({"rank": rank}, status=status.HTTP_200_OK)    @action(methods=['get'], url_path='my-tickets', detail=False, permission_classes=[IsAuthenticated])
+        rank = loyalty.get_rank(request.user)
+        return Response({"rank": rank}, status=status.HTTP_200_OK)
+
+    @action(methods=['get'], url_path='my-tickets', detail=False, permission_classes=[IsAuthenticated])
     def my_tickets(self, request):
         user = request.user
         order_details = OrderDetail.objects.filter(order__user=user).select_related('order__ticket__event')
         page = self.paginate_queryset(order_details)
-        serializer = OrderDetailSerializer(page, many=True)
+        serializer = OrderDetailSerializer(page, many=True, context={'request': request})
         return self.get_paginated_response(serializer.data)
 
     @action(methods=['get'], url_path='my-notifications', detail=False, permission_classes=[IsAuthenticated])
@@ -136,12 +156,19 @@ class EventCategoryViewSet(viewsets.ViewSet, generics.ListAPIView):
     pagination_class = PageNumberPagination
 
     def get_queryset(self):
-        return self.queryset
+        # .all() để không dùng lại kết quả đã đánh giá của queryset cấp class giữa các request
+        return self.queryset.all()
+
+    def list(self, request, *args, **kwargs):
+        return response_cache.cached_response(
+            request, 'categories:list', [response_cache.SCOPE_CATEGORIES],
+            lambda: super(EventCategoryViewSet, self).list(request, *args, **kwargs)
+        )
 
 class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
     queryset = Event.objects.filter(active=True)
     serializer_class = EventSerializer
-    pagination_class = paginators.ItemPaginator
+    pagination_class = paginators.EventPaginator
 
     def get_queryset(self):
         query = self.queryset.select_related('organizer', 'category').prefetch_related('tickets')
@@ -151,8 +178,6 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
         organizer_param = self.request.query_params.get('organizer')
 
         general_filters = Q()
-        if q_param:
-            general_filters &= Q(name__icontains=q_param)
         if cate_id_param:
             try:
                 general_filters &= Q(category_id=int(cate_id_param))
@@ -173,24 +198,38 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
                     raise ValidationError({"error": "Tham số organizer ID không hợp lệ."})
         if general_filters:
             query = query.filter(general_filters)
-        for event in query:
-            event.update_status()
+        # Trạng thái theo thời gian được đồng bộ định kỳ bởi tác vụ sync_event_statuses
         if status_param:
             valid_statuses = [choice[0] for choice in Event.EventStatus.choices]
             if status_param not in valid_statuses:
                 raise ValidationError({"error": f"Trạng thái không hợp lệ. Sử dụng {', '.join(valid_statuses)}."})
             query = query.filter(status=status_param)
+        # Tìm theo chỉ mục tìm kiếm (tên, mô tả, địa điểm, danh mục; không dấu, từ cuối theo tiền tố);
+        # search-events tự xếp hạng theo độ liên quan
+        if q_param and self.action != 'search_events':
+            query = search.filter_events(query, q_param)
         return query
 
+    def list(self, request, *args, **kwargs):
+        # Danh sách "sự kiện của tôi" phụ thuộc người dùng nên không cache
+        if request.query_params.get('organizer') == 'me':
+            return super().list(request, *args, **kwargs)
+        return response_cache.cached_response(
+            request, 'events:list', [response_cache.SCOPE_EVENTS],
+            lambda: super(EventViewSet, self).list(request, *args, **kwargs)
+        )
 
     @action(methods=['get'], url_path='detail', detail=True)
     def view_event(self, request, pk=None):
-        event = get_object_or_404(Event, id=pk)
-        trend, created = EventTrend.objects.get_or_create(event=event)
-        trend.increment_views()
-        trend.increment_interest(points=1)
-        serializer = EventSerializer(event)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Lượt xem vẫn được ghi khi response lấy từ cache nên chỉ đọc các cột cần cho bảng xếp hạng
+        event = get_object_or_404(Event.objects.only('id', 'category_id', 'location'), id=pk)
+        trend_counters.record_view(event)
+        return response_cache.cached_response(
+            request, f'events:detail:{event.id}', [response_cache.event_scope(event.id)],
+            lambda: Response(EventSerializer(
+                Event.objects.select_related('organizer', 'category').prefetch_related('tickets').get(id=event.id)
+            ).data, status=status.HTTP_200_OK)
+        )
 
     @action(methods=['put', 'patch'], url_path='update', detail=True, permission_classes=[IsAuthenticated])
     def update_event(self, request, pk=None):
@@ -233,11 +272,15 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
             print("Loai")
             print(type(updated_event.id))
             print(type(update_message))
+            notification_fanout.fan_out_notifications(
+                updated_event.id, update_message, notification_fanout.AUDIENCE_TICKET_HOLDERS
+            )
+
             from events.tasks import send_event_update_notifications
             send_event_update_notifications.delay(updated_event.id, update_message)
 
-            from events.notification_utils import create_and_send_event_notification
-            create_and_send_event_notification(updated_event.id, is_update=True)
+            from events.tasks import send_event_push_notification
+            send_event_push_notification.delay(updated_event.id, is_update=True)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -273,27 +316,24 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
         old_status = event.get_status_display()
         event.status = Event.EventStatus.CANCELED
         event.save()
+        trending.remove(event.id)
         
         cancel_message = f"Sự kiện '{event.name}' đã bị hủy. Trạng thái thay đổi từ '{old_status}' thành 'Đã hủy'."
         
+        attendee_count = 0
         try:
-            attendees = User.objects.filter(
-                orders__order_details__ticket__event=event,
-                orders__payment_status=Order.PaymentStatus.PAID
-            ).distinct()
-            
-            for attendee in attendees:
-                Notification.objects.create(
-                    user=attendee,
-                    message=f"Sự kiện '{event.name}' mà bạn đã đăng ký tham gia đã bị hủy. Vui lòng liên hệ ban tổ chức để được hỗ trợ về việc hoàn tiền.",
-                    event=event
-                )
-            
+            attendee_count = notification_fanout.recipient_ids(event.id, notification_fanout.AUDIENCE_TICKET_HOLDERS).count()
+            notification_fanout.fan_out_notifications(
+                event.id,
+                f"Sự kiện '{event.name}' mà bạn đã đăng ký tham gia đã bị hủy. Vui lòng liên hệ ban tổ chức để được hỗ trợ về việc hoàn tiền.",
+                notification_fanout.AUDIENCE_TICKET_HOLDERS
+            )
+
             from events.tasks import send_event_cancellation_notifications
             send_event_cancellation_notifications.delay(event.id, cancel_message)
             
-            from events.notification_utils import create_and_send_event_notification
-            create_and_send_event_notification(event.id, is_cancel=True)
+            from events.tasks import send_event_push_notification
+            send_event_push_notification.delay(event.id, is_cancel=True)
             
         except Exception as e:
             logger.error(f"Lỗi khi gửi thông báo hủy sự kiện {event.id}: {str(e)}")
@@ -302,7 +342,7 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
         return Response({
             "message": "Sự kiện đã được hủy thành công.",
             "event": serializer.data,
-            "notifications_sent": f"Đã gửi thông báo hủy sự kiện đến {attendees.count() if 'attendees' in locals() else 0} người tham gia."
+            "notifications_sent": f"Đã gửi thông báo hủy sự kiện đến {attendee_count} người tham gia."
         }, status=status.HTTP_200_OK)
 
     @action(methods=['post'], url_path='create', detail=False, permission_classes=[permissions.IsAuthenticated])
@@ -324,21 +364,13 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
             event.status = Event.EventStatus.COMPLETED
             event.save(update_fields=['status'])
         message = f"Sự kiện mới '{event.name}' đã được tạo and sẽ diễn ra vào {event.date.strftime('%d/%m/%Y')}"
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        attendees = User.objects.filter(role='attendee', is_active=True)
+        notification_fanout.fan_out_notifications(event.id, message, notification_fanout.AUDIENCE_ATTENDEES)
 
-        for user in attendees:
-            Notification.objects.create(
-                user=user,
-                message=message,
-                event=event
-            )
         from events.tasks import send_new_event_notifications
         send_new_event_notifications.delay(event.id)
 
-        from events.notification_utils import create_and_send_event_notification
-        create_and_send_event_notification(event.id, is_update=False)
+        from events.tasks import send_event_push_notification
+        send_event_push_notification.delay(event.id, is_update=False)
         
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
@@ -397,8 +429,7 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
             comment=comment
         )
 
-        trend, created = EventTrend.objects.get_or_create(event=event)
-        trend.increment_interest(points=2)
+        trend_counters.record_review(event)
 
         return Response(
             {"message": "Đánh giá của bạn đã được gửi thành công."},
@@ -407,15 +438,20 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
 
     @action(methods=['get'], url_path='feedback', detail=True)
     def view_feedback(self, request, pk=None):
+        return response_cache.cached_response(
+            request, f'events:feedback:{pk}', [response_cache.event_scope(pk)],
+            lambda: self._feedback(pk)
+        )
+
+    def _feedback(self, pk):
         event = get_object_or_404(Event, id=pk)
         reviews = Review.objects.filter(event=event, active=True).order_by('-created_at')
         serializer = ReviewSerializer(reviews, many=True)
-        avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
 
         response_data = {
             'reviews': serializer.data,
-            'average_rating': round(avg_rating, 1),
-            'total_reviews': reviews.count(),
+            'average_rating': round(event.average_rating, 1),
+            'total_reviews': event.review_count,
         }
 
         return Response(response_data, status=status.HTTP_200_OK)
@@ -449,25 +485,85 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        self.update_event_statuses(Event.objects.all())
-        engine = RecommendationEngine()
-        recommended_events = engine.ml_recommendation(user.id)
+        recommended_events = recommendations.recommend(user)
         serializer = self.get_serializer(recommended_events, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(methods=['get'], url_path='trending', detail=False)
     def get_trending_events(self, request):
         limit = int(request.query_params.get('limit', 5))
-        trending_events = Event.objects.filter(
-            active=True,
-            status=Event.EventStatus.UPCOMING
-        ).annotate(
-            trend_score=(0.7 * models.F('trends__views') + 0.3 * models.F('trends__interest_level'))
-        ).order_by('-trend_score')[:limit]
+        category_id = request.query_params.get('category')
+        if category_id and not category_id.isdigit():
+            raise ValidationError({"error": "category phải là id danh mục."})
+        trending_events = trending.top_events(limit, category_id=category_id, city=request.query_params.get('city'))
 
         serializer = self.get_serializer(trending_events, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(methods=['get'], url_path='suggest', detail=False)
+    def suggest(self, request):
+        limit = request.query_params.get('limit', '8')
+        if not limit.isdigit():
+            raise ValidationError({"error": "limit phải là số nguyên dương."})
+        # Chỉ trả về loại, id và tên để ô tìm kiếm gọi được trên mỗi lần gõ phím
+        return Response(
+            suggestions.suggest(request.query_params.get('q', ''), limit=min(max(int(limit), 1), 20)),
+            status=status.HTTP_200_OK
+        )
+
+    @action(methods=['get'], url_path='search-events', detail=False)
+    def search_events(self, request):
+        q_param = request.query_params.get('q', '')
+        limit = request.query_params.get('limit', '20')
+        if not limit.isdigit():
+            raise ValidationError({"error": "limit phải là số nguyên dương."})
+        limit = min(max(int(limit), 1), 100)
+
+        def build():
+            events = search.search_events(self.get_queryset(), q_param, limit=limit)
+            return Response(self.get_serializer(events, many=True).data, status=status.HTTP_200_OK)
+
+        # Như danh sách: kết quả "sự kiện của tôi" phụ thuộc người dùng nên không cache
+        if request.query_params.get('organizer') == 'me':
+            return build()
+        return response_cache.cached_response(request, 'events:search', [response_cache.SCOPE_EVENTS], build)
+
+    @action(methods=['get'], url_path='nearby', detail=False)
+    def nearby(self, request):
+        try:
+            lat = float(request.query_params['lat'])
+            lng = float(request.query_params['lng'])
+            radius = float(request.query_params.get('radius', 10))
+        except (KeyError, ValueError):
+            raise ValidationError({"error": "lat, lng và radius (km) phải là số hợp lệ."})
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValidationError({"error": "Tọa độ nằm ngoài phạm vi hợp lệ."})
+        if not 0 < radius <= 100:
+            raise ValidationError({"error": "radius phải trong khoảng (0, 100] km."})
+        limit = request.query_params.get('limit', '20')
+        if not limit.isdigit():
+            raise ValidationError({"error": "limit phải là số nguyên dương."})
+        limit = min(max(int(limit), 1), 100)
+
+        def build():
+            events = self.get_queryset()
+            # Mặc định chỉ các sự kiện còn tham gia được; tham số status vẫn áp dụng như danh sách
+            if not request.query_params.get('status'):
+                events = events.filter(status__in=[Event.EventStatus.UPCOMING, Event.EventStatus.ONGOING])
+            nearby = geo.nearby_event_ids(events, lat, lng, radius, limit=limit)
+            loaded = Event.objects.select_related('organizer', 'category').prefetch_related('tickets') \
+                .in_bulk([event_id for event_id, _ in nearby])
+            results = []
+            for event_id, distance in nearby:
+                data = self.get_serializer(loaded[event_id]).data
+                data['distance_km'] = round(distance, 3)
+                results.append(data)
+            return Response(results, status=status.HTTP_200_OK)
+
+        if request.query_params.get('organizer') == 'me':
+            return build()
+        return response_cache.cached_response(request, 'events:nearby', [response_cache.SCOPE_EVENTS], build)
+
     @action(methods=['post'], url_path='create-discount', detail=True)
     def create_discount(self, request, pk=None):
         event = get_object_or_404(Event, id=pk)
@@ -490,6 +586,12 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
 
     @action(methods=['get'], url_path='tickets', detail=True)
     def get_tickets(self, request, pk=None):
+        return response_cache.cached_response(
+            request, f'events:tickets:{pk}', [response_cache.event_scope(pk)],
+            lambda: self._tickets(pk)
+        )
+
+    def _tickets(self, pk):
         event = get_object_or_404(Event, id=pk)
         tickets = TicketType.objects.filter(event=event)
         serializer = TicketSerializer(tickets, many=True)
@@ -627,40 +729,40 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
             return Response({"error": "Sự kiện không khả dụng để đặt vé"}, status=status.HTTP_400_BAD_REQUEST)
 
         ticket_id = request.data.get('ticket_id')
-        quantity = int(request.data.get('quantity', 1))
         discount_code = request.data.get('discount_code')
         payment_method = request.data.get('payment_method')
+        try:
+            quantity = int(request.data.get('quantity', 1))
+        except (ValueError, TypeError):
+            return Response({"error": "Số lượng vé không hợp lệ"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not all([ticket_id, quantity]):
+        if not ticket_id or quantity <= 0:
             return Response({"error": "Thiếu thông tin đặt vé"}, status=status.HTTP_400_BAD_REQUEST)
 
         ticket = get_object_or_404(TicketType, event=event, id=ticket_id)
+        total_price = ticket.price * quantity
 
-        with transaction.atomic():
-            if ticket.quantity < quantity:
-                return Response({"error": "Số lượng vé không đủ"}, status=status.HTTP_400_BAD_REQUEST)
-
-            ticket.quantity -= quantity
-            ticket.save()
+        if discount_code:
+            discount = Discount.objects.filter(
+                code=discount_code,
+                event=event,
+                expiration_date__gt=now()
+            ).first()
+            if not discount:
+                return Response({"error": "Mã giảm giá không hợp lệ hoặc đã hết hạn"},
+                                status=status.HTTP_400_BAD_REQUEST)
 
-            total_price = ticket.price * quantity
+            user_rank = loyalty.get_rank(user)
+            if discount.target_rank and discount.target_rank != 'none' and discount.target_rank != user_rank:
+                return Response({"error": "Mã giảm giá không áp dụng cho hạng của bạn"},
+                                status=status.HTTP_403_FORBIDDEN)
 
-            if discount_code:
-                discount = Discount.objects.filter(
-                    code=discount_code,
-                    event=event,
-                    expiration_date__gt=now()
-                ).first()
-                if not discount:
-                    return Response({"error": "Mã giảm giá không hợp lệ hoặc đã hết hạn"},
-                                    status=status.HTTP_400_BAD_REQUEST)
+            total_price = total_price * Decimal(str(1 - discount.discount_percent / 100))
 
-                user_rank = get_customer_rank(user)
-                if discount.target_rank and discount.target_rank != 'none' and discount.target_rank != user_rank:
-                    return Response({"error": "Mã giảm giá không áp dụng cho hạng của bạn"},
-                                    status=status.HTTP_403_FORBIDDEN)
+        with transaction.atomic():
+            if not inventory.reserve_tickets(ticket.id, quantity):
+                return Response({"error": "Số lượng vé không đủ"}, status=status.HTTP_400_BAD_REQUEST)
 
-                total_price = total_price * Decimal(str(1 - discount.discount_percent / 100))
             order = Order.objects.create(
                 user=user,
                 ticket=ticket,
@@ -670,8 +772,7 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
                 quantity=quantity
             )
 
-            trend, created = EventTrend.objects.get_or_create(event=event)
-            trend.increment_interest(points=3)
+        trend_counters.record_order(event)
 
         return Response({
             "order_id": order.id,
@@ -715,7 +816,7 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
         """Lấy tất cả mã giảm giá của một sự kiện và đánh dấu mã nào người dùng có thể sử dụng."""
         event = get_object_or_404(Event, id=pk)
 
-        user_rank = get_customer_rank(request.user)
+        user_rank = loyalty.get_rank(request.user)
 
         current_time = now()
         discounts = Discount.objects.filter(
@@ -751,7 +852,7 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
         if not discount:
             return Response({"error": "Mã không hợp lệ hoặc hết hạn"}, status=status.HTTP_400_BAD_REQUEST)
 
-        user_rank = get_customer_rank(request.user)
+        user_rank = loyalty.get_rank(request.user)
         
         if discount.target_rank and discount.target_rank != 'none' and discount.target_rank != user_rank:
             return Response({"error": "Mã không áp dụng cho hạng của bạn"}, status=status.HTTP_403_FORBIDDEN)
@@ -772,124 +873,7 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        total_revenue = Order.objects.filter(
-            ticket__event=event,
-            payment_status=Order.PaymentStatus.PAID
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        tickets_sold = OrderDetail.objects.filter(
-            order__ticket__event=event,
-            order__payment_status=Order.PaymentStatus.PAID
-        ).count() or 0
-
-        average_rating = Review.objects.filter(event=event).aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0
-        average_rating = round(average_rating, 1)
-        
-        total_orders = Order.objects.filter(ticket__event=event).count()
-        canceled_orders = Order.objects.filter(
-            ticket__event=event,
-            payment_status=Order.PaymentStatus.FAILED
-        ).count()
-        cancellation_rate = (canceled_orders / total_orders * 100) if total_orders > 0 else 0
-        cancellation_rate = round(cancellation_rate, 2)
-
-        avg_purchase_time = Order.objects.filter(
-            ticket__event=event,
-            payment_status=Order.PaymentStatus.PAID
-        ).annotate(
-            purchase_duration=ExpressionWrapper(
-                F('updated_at') - F('created_at'),
-                output_field=DurationField()
-            )
-        ).aggregate(avg_time=Avg('purchase_duration'))['avg_time']
-        avg_purchase_time_seconds = avg_purchase_time.total_seconds() / 60 if avg_purchase_time else 0
-
-        attendees = User.objects.filter(
-            orders__ticket__event=event,
-            orders__payment_status=Order.PaymentStatus.PAID
-        ).distinct()
-        total_attendees = attendees.count()
-        other_events = Event.objects.filter(organizer=event.organizer).exclude(id=event.id)
-        repeat_attendees = Order.objects.filter(
-            user__in=attendees,
-            ticket__event__in=other_events,
-            payment_status=Order.PaymentStatus.PAID
-        ).values('user').distinct().count()
-        repeat_attendee_rate = (repeat_attendees / total_attendees * 100) if total_attendees > 0 else 0
-        repeat_attendee_rate = round(repeat_attendee_rate, 2)
-
-        event_trend = EventTrend.objects.filter(event=event).first()
-        event_views = event_trend.views if event_trend else 0
-        event_interest_score = event_trend.interest_level if event_trend else 0
-
-        conversion_rate = (tickets_sold / event_views * 100) if event_views > 0 else 0
-        conversion_rate = round(conversion_rate, 2)
-
-        tickets_breakdown = []
-        tickets = TicketType.objects.filter(event=event)
-        for ticket in tickets:
-            sold_count = OrderDetail.objects.filter(
-                order__ticket=ticket,
-                order__payment_status=Order.PaymentStatus.PAID
-            ).count()
-            
-            tickets_breakdown.append({
-                'ticket_id': ticket.id,
-                'ticket_type': ticket.type,
-                'ticket_price': ticket.price,
-                'quantity_sold': sold_count,
-                'revenue': ticket.price * sold_count
-            })
-
-        from datetime import datetime, timedelta
-        today = datetime.now().date()
-        views_by_day = []
-
-        for i in range(7):
-            day = today - timedelta(days=i)
-            views_by_day.append({
-                'date': day.strftime('%Y-%m-%d'),
-                'count': int(event_views / 7) + ((-1)**i) * (i*3)
-            })
-        views_by_day.reverse()
-
-        reviews = Review.objects.filter(event=event)
-        review_count = reviews.count()
-        
-        rating_counts = {
-            '5': reviews.filter(rating=5).count(),
-            '4': reviews.filter(rating=4).count(),
-            '3': reviews.filter(rating=3).count(),
-            '2': reviews.filter(rating=2).count(),
-            '1': reviews.filter(rating=1).count(),
-        }
-        
-        rating_percents = {
-            'rating_5_percent': (rating_counts['5'] / review_count * 100) if review_count > 0 else 0,
-            'rating_4_percent': (rating_counts['4'] / review_count * 100) if review_count > 0 else 0,
-            'rating_3_percent': (rating_counts['3'] / review_count * 100) if review_count > 0 else 0,
-            'rating_2_percent': (rating_counts['2'] / review_count * 100) if review_count > 0 else 0,
-            'rating_1_percent': (rating_counts['1'] / review_count * 100) if review_count > 0 else 0,
-        }
-        result = {
-            "event_id": event.id,
-            "event_name": event.name,
-            "event_start_date": event.date,
-            "event_end_date": event.date + timedelta(hours=3),
-            "total_revenue": total_revenue,
-            "tickets_sold": tickets_sold,
-            "average_rating": average_rating,
-            "cancellation_rate": cancellation_rate,
-            "avg_purchase_time_minutes": round(avg_purchase_time_seconds, 2),
-            "repeat_attendee_rate": repeat_attendee_rate,
-            "event_views": event_views,
-            "event_interest_score": event_interest_score,
-            "conversion_rate": conversion_rate,
-            "tickets_breakdown": tickets_breakdown,
-            "views_by_day": views_by_day,
-            "review_count": review_count,
-        }
-        result.update(rating_percents)
+        result = analytics.event_analytics([event])[event.id]
         return Response(result, status=status.HTTP_200_OK)
     @action(methods=['get'], url_path='dashboard-analytics', detail=False, permission_classes=[permissions.IsAuthenticated])
     def dashboard_analytics(self, request):
@@ -909,11 +893,7 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
                         status=status.HTTP_400_BAD_REQUEST
                     )
             
-            analytics_data = []
-            for event_instance in organizer_events:
-                response = self.get_event_analytics(request, pk=event_instance.pk)
-                if response.status_code == status.HTTP_200_OK:
-                    analytics_data.append(response.data)
+            analytics_data = analytics.organizer_dashboard(organizer_events)
             return Response(analytics_data, status=status.HTTP_200_OK)
 
         elif user.role == User.Role.ADMIN:
@@ -930,58 +910,9 @@ class EventViewSet(viewsets.ViewSet, generics.ListAPIView):
                         status=status.HTTP_400_BAD_REQUEST
                     )
             
-            admin_analytics_data = []
-            for organizer in organizers:
-                organizer_events = Event.objects.filter(organizer=organizer, active=True)
-                
-                org_total_revenue = 0
-                org_total_tickets_sold = 0
-                org_event_ratings = []
-                org_cancellation_rates = []
-                org_total_views = 0
-                org_total_interest_score = 0
-                event_count = 0
-                event_details = [] 
-
-                for event_instance in organizer_events:
-                    response = self.get_event_analytics(request, pk=event_instance.pk)
-                    if response.status_code == status.HTTP_200_OK:
-                        event_data = response.data
-                        org_total_revenue += event_data.get("total_revenue", 0)
-                        org_total_tickets_sold += event_data.get("tickets_sold", 0)
-                        if event_data.get("average_rating", 0) > 0:
-                            org_event_ratings.append(event_data.get("average_rating", 0))
-                        org_cancellation_rates.append(event_data.get("cancellation_rate", 0))
-                        org_total_views += event_data.get("event_views", 0)
-                        org_total_interest_score += event_data.get("event_interest_score", 0)
-                        event_count += 1
-                        
-                        event_details.append({
-                            "event_id": event_data.get("event_id"),
-                            "event_name": event_data.get("event_name"),
-                            "event_start_date": event_data.get("event_start_date"),
-                            "total_revenue": event_data.get("total_revenue", 0),
-                            "tickets_sold": event_data.get("tickets_sold", 0),
-                            "average_rating": event_data.get("average_rating", 0),
-                            "event_views": event_data.get("event_views", 0)
-                        })
-                
-                if event_count > 0:
-                    avg_rating = sum(org_event_ratings) / len(org_event_ratings) if org_event_ratings else 0
-                    avg_cancellation_rate = sum(org_cancellation_rates) / event_count if org_cancellation_rates else 0
-                    admin_analytics_data.append({
-                        "organizer_id": organizer.id,
-                        "organizer_username": organizer.username,
-                        "organizer_email": organizer.email,
-                        "total_events": event_count,
-                        "aggregated_total_revenue": org_total_revenue,
-                        "aggregated_total_tickets_sold": org_total_tickets_sold,
-                        "average_event_rating": round(avg_rating, 2),
-                        "average_cancellation_rate": round(avg_cancellation_rate, 2),
-                        "total_event_views": org_total_views,
-                        "total_event_interest_score": org_total_interest_score,
-                        "event_details": event_details  
-                    })
+            organizers = list(organizers)
+            organizer_events = Event.objects.filter(organizer__in=organizers, active=True)
+            admin_analytics_data = analytics.admin_dashboard(organizers, organizer_events)
             return Response(admin_analytics_data, status=status.HTTP_200_OK)
 
         else:
@@ -998,7 +929,7 @@ class OrderViewSet(viewsets.GenericViewSet, generics.ListAPIView, generics.Updat
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'id'
-    pagination_class = paginators.ItemPaginator
+    pagination_class = paginators.RecentFirstPaginator
 
     def get_queryset(self):
         queryset = Order.objects.filter(user=self.request.user)
@@ -1033,8 +964,8 @@ class OrderViewSet(viewsets.GenericViewSet, generics.ListAPIView, generics.Updat
     def retrieve(self, request, *args, **kwargs):
         order = self.get_object()
         serializer = self.get_serializer(order)
-        order_details = order.order_details.select_related('order__ticket__event').all()
-        qr_image_urls = [request.build_absolute_uri(detail.qr_image.url) for detail in order_details if detail.qr_image]
+        qr_codes = order.order_details.values_list('qr_code', flat=True)
+        qr_image_urls = [ticket_qr.qr_image_url(qr_code, request) for qr_code in qr_codes]
         return Response({
             "order": serializer.data,
             "qr_image_urls": qr_image_urls
@@ -1126,64 +1057,34 @@ class OrderViewSet(viewsets.GenericViewSet, generics.ListAPIView, generics.Updat
 
         try:
             extra_data_decoded = json.loads(base64.b64decode(extra_data).decode())
-            ticket_id = extra_data_decoded['ticket_id']
-            quantity = extra_data_decoded['quantity']
-        except (ValueError, KeyError):
+            ticket_id = int(extra_data_decoded['ticket_id'])
+            quantity = int(extra_data_decoded['quantity'])
+        except (ValueError, KeyError, TypeError):
             return Response({"error": "Dữ liệu extraData không hợp lệ"}, status=status.HTTP_400_BAD_REQUEST)
 
-        ticket = get_object_or_404(TicketType, id=ticket_id)
-        with transaction.atomic():
-            if ticket.quantity < quantity:
-                order.payment_status = Order.PaymentStatus.FAILED
-                order.save()
-                return Response({"error": "Số lượng vé không đủ"}, status=status.HTTP_400_BAD_REQUEST)
-
-            if (order.payment_method == "MoMo" and result_code == 0) or (
-                    order.payment_method == "VNPAY" and result_code == "00"):
-                order.payment_status = Order.PaymentStatus.PAID
-                order.save()
-                
-                ticket = order.ticket
-                quantity = order.quantity
-                
-                
-
-                qr_image_urls = []
-                for i in range(quantity):
-                    qr_code = f"QR_{order.id}_{ticket.id}_{i + 1}"
-                    order_detail = OrderDetail.objects.create(
-                        order=order,
-                        qr_code=qr_code
-                    )
-
-                    qr_image = generate_qr_image(qr_code)
-                    order_detail.qr_image.save(f"{qr_code}.png", qr_image)
-                    order_detail.save()
-
-                    qr_image_urls.append(request.build_absolute_uri(order_detail.qr_image.url))
-                ticket.quantity -= quantity
-                ticket.save()
-                
-                send_mail(
-                    subject=f"Xác nhận đặt vé thành công - Đơn hàng #{order.id}",
-                    message=f"Chào {order.user.username},\n\nĐơn hàng của bạn đã được thanh toán thành công. Dưới đây là các mã QR cho vé của bạn:\n" +
-                            "\n".join([f"Vé {i + 1}: {url}" for i, url in enumerate(qr_image_urls)]) +
-                            f"\n\nBạn cũng có thể xem mã QR tại: /orders/{order.id}/",
-                    from_email=settings.DEFAULT_FROM_EMAIL or settings.EMAIL_HOST_USER,
-                    recipient_list=[order.user.email],
-                    fail_silently=True
-                )
-                
-                
+        # Vé đã được giữ chỗ theo đơn hàng; extraData của cổng thanh toán phải khớp với đơn
+        if ticket_id != order.ticket_id or quantity != order.quantity:
+            logger.warning(f"extraData của đơn hàng #{order.id} không khớp: ticket_id={ticket_id}, quantity={quantity}")
+            return Response({"error": "Thông tin vé trong extraData không khớp với đơn hàng"},
+                            status=status.HTTP_400_BAD_REQUEST)
 
+        if (order.payment_method == "MoMo" and result_code == 0) or (
+                order.payment_method == "VNPAY" and result_code == "00"):
+            if not inventory.mark_order_paid(order):
+                conflict = _paid_conflict(order, order.payment_method)
+                if conflict:
+                    return conflict
                 return Response({
-                    "message": "Thanh toán thành công, email chứa mã QR đã được gửi",
-                    "qr_image_urls": qr_image_urls
+                    "message": f"Đơn hàng đã được xử lý với trạng thái: {order.payment_status}"
                 }, status=status.HTTP_200_OK)
-            else:
-                order.payment_status = Order.PaymentStatus.FAILED
-                order.save()
-                return Response({"message": f"Thanh toán thất bại: {message}"}, status=status.HTTP_400_BAD_REQUEST)
+
+            fulfillment.enqueue_fulfillment(order)
+            return Response({
+                "message": "Thanh toán thành công, email chứa mã QR sẽ được gửi trong giây lát"
+            }, status=status.HTTP_200_OK)
+        else:
+            inventory.mark_order_failed(order)
+            return Response({"message": f"Thanh toán thất bại: {message}"}, status=status.HTTP_400_BAD_REQUEST)
 
     def update(self, request, *args, **kwargs):
         order = self.get_object()
@@ -1226,18 +1127,49 @@ class OrderViewSet(viewsets.GenericViewSet, generics.ListAPIView, generics.Updat
         serializer = OrderDetailSerializer(order_details, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(methods=['get'], url_path='tickets/(?P<qr_code>[^/.]+)/qr', url_name='ticket-qr', detail=False,
+            permission_classes=[permissions.AllowAny])
+    def get_ticket_qr(self, request, qr_code=None):
+        """Trả về ảnh QR của vé: tạo khi được yêu cầu lần đầu, các lần sau lấy từ cache và hỗ trợ ETag."""
+        if not ticket_qr.verify_qr_signature(qr_code, request.query_params.get('sig')):
+            user = request.user
+            if not user.is_authenticated or not (
+                    user.is_superuser or OrderDetail.objects.filter(qr_code=qr_code, order__user=user).exists()):
+                return Response({"error": "Không tìm thấy vé"}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = ticket_qr.qr_etag(qr_code)
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(ticket_qr.get_qr_png(qr_code), content_type='image/png')
+        response['ETag'] = etag
+        response['Cache-Control'] = f'private, max-age={settings.TICKET_QR_CACHE_TIMEOUT}'
+        return response
+
+    @action(methods=['post'], url_path='tickets/(?P<qr_code>[^/.]+)/qr/persist', detail=False,
+            permission_classes=[permissions.IsAuthenticated])
+    def persist_ticket_qr(self, request, qr_code=None):
+        """Lưu ảnh QR của vé lên Cloudinary khi người dùng cần một link ảnh cố định."""
+        order_detail = get_object_or_404(
+            OrderDetail,
+            qr_code=qr_code,
+            order__user=request.user,
+            order__payment_status=Order.PaymentStatus.PAID
+        )
+        try:
+            qr_url = ticket_qr.persist_qr_image(order_detail)
+        except Exception as e:
+            logger.error(f"Lỗi khi tải ảnh QR {qr_code} lên Cloudinary: {str(e)}")
+            return Response({"error": "Không thể lưu ảnh QR, vui lòng thử lại sau"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({"qr_image_url": qr_url}, status=status.HTTP_200_OK)
+
     @action(methods=['post'], url_path='pay', detail=True, permission_classes=[permissions.IsAuthenticated])
     def pay(self, request, id=None):
         order = self.get_object()
 
         if order.expiration_time and now() > order.expiration_time:
-            with transaction.atomic():
-                ticket = order.ticket
-                ticket.quantity += order.quantity
-                ticket.save()
-                order.active = False
-                order.payment_status = Order.PaymentStatus.FAILED
-                order.save()
+            inventory.mark_order_failed(order)
             return Response({"error": "Thời gian thanh toán đã hết hạn, vé đã được nhả"},
                             status=status.HTTP_400_BAD_REQUEST)
 
@@ -1263,13 +1195,7 @@ class OrderViewSet(viewsets.GenericViewSet, generics.ListAPIView, generics.Updat
         if payment_method == "MoMo":
             payment_response = self.create_momo_qr(order, extra_data)
             if "error" in payment_response or "qrCodeUrl" not in payment_response:
-                with transaction.atomic():
-                    ticket = order.ticket
-                    ticket.quantity += order.quantity
-                    ticket.save()
-                    order.active = False
-                    order.payment_status = Order.PaymentStatus.FAILED
-                    order.save()
+                inventory.mark_order_failed(order)
                 return Response({
                     "error": "Không thể tạo QR thanh toán MoMo",
                     "momo_response": payment_response
@@ -1285,13 +1211,7 @@ class OrderViewSet(viewsets.GenericViewSet, generics.ListAPIView, generics.Updat
         elif payment_method == "VNPAY":
             payment_response = self.create_vnpay_url(order, extra_data, request)
             if "error" in payment_response or "payUrl" not in payment_response:
-                with transaction.atomic():
-                    ticket = order.ticket
-                    ticket.quantity += order.quantity
-                    ticket.save()
-                    order.active = False
-                    order.payment_status = Order.PaymentStatus.FAILED
-                    order.save()
+                inventory.mark_order_failed(order)
                 return Response({
                     "error": "Không thể tạo URL thanh toán VNPAY",
                     "vnpay_response": payment_response
@@ -1372,76 +1292,31 @@ class PaymentViewSet(viewsets.ViewSet):
         if not order:
             return Response({"error": "Không tìm thấy đơn hàng"}, status=status.HTTP_404_NOT_FOUND)
 
-        if order.expiration_time and now() > order.expiration_time:
-            with transaction.atomic():
-                ticket = order.ticket
-                ticket.quantity += order.quantity
-                ticket.save()
-                order.active = False
-                order.payment_status = Order.PaymentStatus.FAILED
-                order.save()            
-                return Response({"error": "Thời gian thanh toán đã hết hạn"}, status=status.HTTP_400_BAD_REQUEST)
-
-        with transaction.atomic():
-            if result_code == "0" or result_code == 0:
-                order.payment_status = Order.PaymentStatus.PAID
-                order.save()
-
-                ticket = order.ticket
-                quantity = order.quantity
-
-                qr_image_urls = []
-                for i in range(quantity):
-                    qr_code = f"QR_{order.id}_{ticket.id}_{i + 1}"
-                    order_detail = OrderDetail.objects.create(
-                        order=order,
-                        qr_code=qr_code
-                    )
-
-                    try:
-                        qr_image = generate_qr_image(qr_code)
-                        upload_result = cloudinary.uploader.upload(
-                            qr_image,
-                            folder='tickets',
-                            public_id=qr_code,
-                            resource_type='image',
-                            format='png'
-                        )
-                        order_detail.qr_image = upload_result['public_id']
-                        order_detail.save()
-                        qr_url = upload_result['secure_url']
-                        logger.info(f"QR image uploaded: public_id={upload_result['public_id']}, url={qr_url}")
-                        qr_image_urls.append(qr_url)
-                    except Exception as e:
-                        logger.error(f"Lỗi khi tải ảnh QR {qr_code} lên Cloudinary: {str(e)}")
-                        order_detail.qr_image = None
-                        order_detail.save()
-                        qr_image_urls.append(None)
-
-
-                send_mail(
-                    subject=f"Xác nhận đặt vé thành công - Đơn hàng #{order.id}",
-                    message=f"Chào {order.user.username},\n\nĐơn hàng của bạn đã được thanh toán thành công. Dưới đây là các mã QR cho vé của bạn:\n" +
-                            "\n".join([f"Vé {i + 1}: {url}" for i, url in enumerate(qr_image_urls)]) +
-                            f"\n\nBạn cũng có thể xem mã QR tại: /orders/{order.id}/",
-                    from_email=settings.DEFAULT_FROM_EMAIL or settings.EMAIL_HOST_USER,
-                    recipient_list=[order.user.email],
-                    fail_silently=True
-                )
+        expired = order.payment_status == Order.PaymentStatus.PENDING and order.expiration_time \
+            and now() > order.expiration_time
+        if expired:
+            inventory.mark_order_failed(order)
 
+        if result_code == "0" or result_code == 0:
+            if not inventory.mark_order_paid(order):
+                conflict = _paid_conflict(order, 'MoMo IPN')
+                if conflict:
+                    return conflict
                 return Response({
-                    "message": "Thanh toán thành công, email chứa mã QR đã được gửi",
+                    "message": f"Đơn hàng đã được xử lý với trạng thái: {order.payment_status}",
                     "order_id": order.id
                 }, status=status.HTTP_200_OK)
-            else:
-                ticket = order.ticket
-                ticket.quantity += order.quantity
-                ticket.save()
-                
-                order.active = False
-                order.payment_status = Order.PaymentStatus.FAILED
-                order.save()
-                return Response({"message": f"Thanh toán thất bại: {message}"}, status=status.HTTP_400_BAD_REQUEST)
+
+            fulfillment.enqueue_fulfillment(order)
+            return Response({
+                "message": "Thanh toán thành công, email chứa mã QR sẽ được gửi",
+                "order_id": order.id
+            }, status=status.HTTP_200_OK)
+        elif expired:
+            return Response({"error": "Thời gian thanh toán đã hết hạn"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            inventory.mark_order_failed(order)
+            return Response({"message": f"Thanh toán thất bại: {message}"}, status=status.HTTP_400_BAD_REQUEST)
 
 
     @action(detail=False, methods=['get'], url_path='momo-payment-success')
@@ -1467,72 +1342,26 @@ class PaymentViewSet(viewsets.ViewSet):
         if not order:
             return Response({"error": "Không tìm thấy đơn hàng"}, status=status.HTTP_404_NOT_FOUND)
 
-        with transaction.atomic():
-            if result_code == '0':
-                order.payment_status = Order.PaymentStatus.PAID
-                order.save()
-                ticket = order.ticket
-                quantity = order.quantity
-
-                qr_image_urls = []
-                for i in range(quantity):
-                    qr_code = f"QR_{order.id}_{ticket.id}_{i + 1}"
-                    order_detail = OrderDetail.objects.create(
-                        order=order,
-                        ticket=ticket,
-                        qr_code=qr_code
-                    )
-
-                    try:
-                        qr_image = generate_qr_image(qr_code)  # Trả về BytesIO
-                        upload_result = cloudinary.uploader.upload(
-                            qr_image,
-                            folder='tickets',
-                            public_id=qr_code,
-                            resource_type='image',
-                            format='png'
-                        )
-                        order_detail.qr_image = upload_result['public_id']
-                        order_detail.save()
-                        qr_url = upload_result['secure_url']
-                        logger.info(f"QR image uploaded: public_id={upload_result['public_id']}, url={qr_url}")
-                        qr_image_urls.append(qr_url)
-                    except Exception as e:
-                        logger.error(f"Lỗi khi tải ảnh QR {qr_code} lên Cloudinary: {str(e)}")
-                        order_detail.qr_image = None
-                        order_detail.save()
-                        qr_image_urls.append(None)
-
-                ticket.quantity -= quantity
-                ticket.save()
-
-                send_mail(
-                    subject=f"Xác nhận đặt vé thành công - Đơn hàng #{order.id}",
-                    message=f"Chào {order.user.username},\n\nĐơn hàng của bạn đã được thanh toán thành công. Dưới đây là các mã QR cho vé của bạn:\n" +
-                            "\n".join([f"Vé {i + 1}: {url}" for i, url in enumerate(qr_image_urls)]) +
-                            f"\n\nBạn cũng có thể xem mã QR tại: /orders/{order.id}/",
-                    from_email=settings.DEFAULT_FROM_EMAIL or settings.EMAIL_HOST_USER,
-                    recipient_list=[order.user.email],
-                    fail_silently=True
-                )
-
-                return Response({
-                    "message": "Thanh toán thành công! Kiểm tra email của bạn để xem mã QR hoặc gọi GET /orders/{id}/",
-                    "order_id": order.id,
-                    "redirect_url": f"/payment-success?order_id={order.id}"
-                }, status=status.HTTP_200_OK)
+        if result_code == '0':
+            if inventory.mark_order_paid(order):
+                fulfillment.enqueue_fulfillment(order)
             else:
-                ticket = order.ticket
-                ticket.quantity += order.quantity
-                ticket.save()
-                order.active = False
-                order.payment_status = Order.PaymentStatus.FAILED
-                order.save()
-                return Response({
-                    "message": f"Thanh toán thất bại: {message}",
-                    "order_id": order.id,
-                    "redirect_url": "/payment-failure"
-                }, status=status.HTTP_400_BAD_REQUEST)
+                conflict = _paid_conflict(order, 'MoMo redirect')
+                if conflict:
+                    return conflict
+
+            return Response({
+                "message": "Thanh toán thành công! Kiểm tra email của bạn để xem mã QR hoặc gọi GET /orders/{id}/",
+                "order_id": order.id,
+                "redirect_url": f"/payment-success?order_id={order.id}"
+            }, status=status.HTTP_200_OK)
+        else:
+            inventory.mark_order_failed(order)
+            return Response({
+                "message": f"Thanh toán thất bại: {message}",
+                "order_id": order.id,
+                "redirect_url": "/payment-failure"
+            }, status=status.HTTP_400_BAD_REQUEST)
 
 class ReviewViewSet(viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
@@ -1551,26 +1380,29 @@ class ReviewViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='by-event/(?P<event_id>[^/.]+)')
     def by_event(self, request, event_id=None):
         """Lấy tất cả đánh giá cho một sự kiện cụ thể"""
-        event = get_object_or_404(Event, id=event_id)
-        reviews = self.get_queryset().filter(event=event)
-        avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
+        return response_cache.cached_response(
+            request, f'reviews:by-event:{event_id}', [response_cache.event_scope(event_id)],
+            lambda: self._by_event(request, event_id)
+        )
 
-        page = self.paginate_queryset(reviews)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            response_data = {
-                'reviews': serializer.data,
-                'average_rating': round(avg_rating, 1),
-                'total_reviews': reviews.count(),
-            }
-            return self.get_paginated_response(response_data)
-        
+    def _by_event(self, request, event_id):
+        event = get_object_or_404(Event, id=event_id)
+        reviews = self.get_queryset().filter(event=event).select_related('user', 'event', 'replied_by')
+
+        # Ứng dụng hiện tại tải toàn bộ đánh giá trong một lần gọi nên chỉ phân trang khi client gửi
+        # cursor/page_size; khi đó giữ các khóa ở cấp ngoài cùng như trước và thêm "next" để tải trang tiếp theo
+        paginator = paginators.RecentFirstPaginator()
+        paginated = {paginator.cursor_query_param, paginator.page_size_query_param} & set(request.query_params)
+        if paginated:
+            reviews = paginator.paginate_queryset(reviews, request, view=self)
         serializer = self.get_serializer(reviews, many=True)
         response_data = {
             'reviews': serializer.data,
-            'average_rating': round(avg_rating, 1),
-            'total_reviews': reviews.count(),
+            'average_rating': round(event.average_rating, 1),
+            'total_reviews': event.review_count,
         }
+        if paginated:
+            response_data['next'] = paginator.get_next_link()
         return Response(response_data)
     
     @action(detail=False, methods=['get'], url_path='my-reviews', permission_classes=[permissions.IsAuthenticated])
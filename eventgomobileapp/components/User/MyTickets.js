@@ -99,7 +99,7 @@ const MyTickets = () => {
 
   const renderTicketItem = useCallback(
     ({ item }) => {
-      const qrImage = item.qr_image ? `http://res.cloudinary.com/dqpkxxzaf/${item.qr_image}` : 'https://via.placeholder.com/300?text=No+QR+Image';      
+      const qrImage = item.qr_image_url || (item.qr_image ? `http://res.cloudinary.com/dqpkxxzaf/${item.qr_image}` : 'https://via.placeholder.com/300?text=No+QR+Image');
       const eventName = item.order?.ticket?.event?.name || 'Chưa xác định';
       const ticketType = item.order?.ticket?.type || 'Chưa xác định';
 